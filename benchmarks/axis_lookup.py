@@ -0,0 +1,83 @@
+"""
+Benchmark bin lookup throughput of the reference axes in ``uhi.axis``.
+
+Arrays of values are looked up on regular, variable, integer and string
+category, and boolean axes, and the throughput is reported in millions of
+lookups per second. The scalar lookup time (used by ``uhi.tag.loc`` for a
+single value) is also reported.
+
+Run with ``python benchmarks/axis_lookup.py`` or ``nox -s benchmarks``.
+"""
+
+from __future__ import annotations
+
+import timeit
+from typing import Any
+
+import numpy as np
+
+from uhi.axis import Axis, from_ir
+
+
+def best_time(func: Any, number: int = 1) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def regular(circular: bool) -> Axis:
+    return from_ir(
+        {
+            "type": "regular",
+            "lower": 0,
+            "upper": 1,
+            "bins": 100,
+            "underflow": True,
+            "overflow": True,
+            "circular": circular,
+        }
+    )
+
+
+def cases(n: int) -> list[tuple[str, Axis, Any]]:
+    rng = np.random.default_rng(42)
+    x = rng.normal(0.5, 0.5, n)
+    edges = np.sort(rng.uniform(-1, 2, 101))
+    words = [f"cat{i}" for i in range(100)]
+    variable = from_ir(
+        {
+            "type": "variable",
+            "edges": edges,
+            "underflow": True,
+            "overflow": True,
+            "circular": False,
+        }
+    )
+    category_int = from_ir(
+        {"type": "category_int", "categories": list(range(0, 2000, 2)), "flow": True}
+    )
+    category_str = from_ir({"type": "category_str", "categories": words, "flow": True})
+    return [
+        ("regular", regular(False), x),
+        ("regular circular", regular(True), x),
+        ("variable", variable, x),
+        ("category_int", category_int, rng.integers(0, 2100, n)),
+        (
+            "category_str",
+            category_str,
+            np.array([*words, "other"])[rng.integers(0, 101, n)],
+        ),
+        ("boolean", from_ir({"type": "boolean"}), rng.random(n) < 0.5),
+    ]
+
+
+def main() -> None:
+    n = 1_000_000
+    print(f"{'axis':>18} {'array (M/s)':>12} {'scalar (us)':>12}")
+    for name, axis, values in cases(n):
+        t_array = best_time(lambda a=axis, v=values: a.index(v))
+        scalar = values[0].item()
+        t_scalar = best_time(lambda a=axis, s=scalar: a.index(s), number=1000)
+        print(f"{name:>18} {n / t_array / 1e6:>12.1f} {t_scalar * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark the scaling of multithreaded filling with ``uhi.fill``.
+
+Ten million entries are filled into a 2D histogram with a regular and a
+variable axis, for the double and weighted storages, with 1 to 64 threads.
+Each thread fills its own copy of the storage, and the copies are reduced
+pairwise at the end. The throughput is reported in millions of entries per
+second, with the speedup over a single thread; it is bounded by the number
+of cores (and by memory bandwidth).
+
+Run with ``python benchmarks/fill.py`` or ``nox -s benchmarks``.
+"""
+
+from __future__ import annotations
+
+import os
+import timeit
+from typing import Any
+
+import numpy as np
+
+from uhi.fill import Filler, StorageType
+
+
+def best_time(func: Any) -> float:
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def make_axes() -> Any:
+    return [
+        {
+            "type": "regular",
+            "lower": 0,
+            "upper": 1,
+            "bins": 100,
+            "underflow": True,
+            "overflow": True,
+            "circular": False,
+        },
+        {
+            "type": "variable",
+            "edges": np.geomspace(1, 1000, 51),
+            "underflow": True,
+            "overflow": True,
+            "circular": False,
+        },
+    ]
+
+
+def main() -> None:
+    size = 10_000_000
+    rng = np.random.default_rng(42)
+    x = rng.normal(0.5, 0.2, size)
+    y = rng.exponential(50, size)
+    weight = rng.uniform(0.5, 1.5, size)
+
+    print(f"{os.cpu_count()} CPUs")
+    print(f"{'storage':>9} {'threads':>8} {'time':>10} {'M/s':>8} {'speedup':>8}")
+    storages: tuple[StorageType, ...] = ("double", "weighted")
+    for storage in storages:
+        single = 0.0
+        for threads in (1, 2, 4, 8, 16, 32, 64):
+            t = best_time(
+                lambda n=threads, s=storage: Filler(make_axes(), s).fill(
+                    x, y, weight=weight, threads=n
+                )
+            )
+            single = single or t
+            print(
+                f"{storage:>9} {threads:>8} {t:>9.4f}s "
+                f"{size / t / 1e6:>8.1f} {single / t:>7.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark reading and writing HDF5 histograms with many string categories.
+
+Compares the bulk fixed-length string path used by ``uhi.io.hdf5.write`` with
+reading variable-length string datasets (as written by older versions of
+uhi).
+
+Run with ``python benchmarks/hdf5_categories.py`` or ``nox -s benchmarks``.
+"""
+
+from __future__ import annotations
+
+import tempfile
+import timeit
+from pathlib import Path
+from typing import Any
+
+import h5py
+
+import uhi.io.hdf5
+
+
+def make_histogram(n: int) -> dict[str, Any]:
+    return {
+        "uhi_schema": 1,
+        "axes": [
+            {
+                "type": "category_str",
+                "categories": [f"dataset_{i:07d}" for i in range(n)],
+                "flow": False,
+            }
+        ],
+        "storage": {"type": "int"},
+    }
+
+
+def main() -> None:
+    print(
+        f"{'categories':>12} {'write':>10} {'read':>10} {'read vlen':>10} {'loop':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = Path(tmp) / "bench.h5"
+        for n in (10**3, 10**4, 10**5, 10**6):
+            hist = make_histogram(n)
+
+            def write(hist: dict[str, Any] = hist) -> None:
+                with h5py.File(filename, "w") as h5_file:
+                    uhi.io.hdf5.write(h5_file.create_group("h"), hist)
+
+            t_write = min(timeit.repeat(write, number=1, repeat=3))
+
+            # Variable-length strings, as written by older versions of uhi
+            with h5py.File(filename, "a") as h5_file:
+                legacy = h5_file.create_group("legacy")
+                uhi.io.hdf5.write(legacy, make_histogram(0))
+                del legacy["ref_axes/axis_0/categories"]
+                legacy["ref_axes/axis_0"].create_dataset(
+                    "categories", data=hist["axes"][0]["categories"]
+                )
+
+            def read(name: str) -> None:
+                with h5py.File(filename, "r") as h5_file:
+                    uhi.io.hdf5.read(h5_file[name])
+
+            def loop() -> None:
+                # The previous per-element decoding, for comparison
+                with h5py.File(filename, "r") as h5_file:
+                    dataset = h5_file["legacy/ref_axes/axis_0/categories"]
+                    [c.decode("utf-8") for c in dataset]
+
+            t_read = min(timeit.repeat(lambda: read("h"), number=1, repeat=3))
+            t_vlen = min(timeit.repeat(lambda: read("legacy"), number=1, repeat=3))
+            # The loop takes about a minute for 10^6 categories
+            t_loop = f"{timeit.timeit(loop, number=1):>9.4f}s" if n <= 10**5 else ""
+            print(f"{n:>12} {t_write:>9.4f}s {t_read:>9.4f}s {t_vlen:>9.4f}s {t_loop}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark evaluating a histogram as a correction lookup table.
+
+A scale factor table binned in pT (variable) and eta (regular) is evaluated on
+ten million candidates with ``uhi.lookup.LookupTable``, single-threaded and in
+the chunked multithreaded mode, and the throughput is reported in millions of
+lookups per second.
+
+Run with ``python benchmarks/lookup.py`` or ``nox -s benchmarks``.
+"""
+
+from __future__ import annotations
+
+import os
+import timeit
+from typing import Any
+
+import numpy as np
+
+from uhi.lookup import FlowMode, LookupTable
+
+
+def best_time(func: Any) -> float:
+    return min(timeit.repeat(func, number=1, repeat=5))
+
+
+def make_table() -> Any:
+    edges = np.array([20, 25, 30, 40, 50, 70, 100, 150, 250, 500], dtype=float)
+    rng = np.random.default_rng(42)
+    values = rng.uniform(0.9, 1.1, (len(edges) + 1, 50 + 2))
+    return {
+        "uhi_schema": 1,
+        "axes": [
+            {
+                "type": "variable",
+                "edges": edges,
+                "underflow": True,
+                "overflow": True,
+                "circular": False,
+            },
+            {
+                "type": "regular",
+                "lower": -2.5,
+                "upper": 2.5,
+                "bins": 50,
+                "underflow": True,
+                "overflow": True,
+                "circular": False,
+            },
+        ],
+        "storage": {"type": "weighted", "values": values, "variances": values / 100},
+    }
+
+
+def main() -> None:
+    size = 10_000_000
+    rng = np.random.default_rng(0)
+    pt = rng.exponential(50, size) + 15
+    eta = rng.normal(0, 1.5, size)
+
+    print(f"{'mode':>6} {'threads':>8} {'time':>10} {'M/s':>8}")
+    modes: tuple[FlowMode, ...] = ("clamp", "nan")
+    for mode in modes:
+        table = LookupTable(make_table(), flow=mode)
+        for threads in sorted({1, 2, 4, 8, os.cpu_count() or 1}):
+            t = best_time(lambda n=threads, tb=table: tb(pt, eta, threads=n))
+            print(f"{mode:>6} {threads:>8} {t:>9.4f}s {size / t / 1e6:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark rebinning large histograms into variable-width bins.
+
+A 1D histogram with a million bins and a falling spectrum is rebinned with
+``uhi.tag.rebin(groups=...)``, merging the low-statistics tail bins so each new
+bin has at least a minimum count, and with ``rebin(edges=...)`` to the same
+edges. Compiling the slice plan and applying it are timed separately, for the
+weighted and mean storages.
+
+Run with ``python benchmarks/rebin.py`` or ``nox -s benchmarks``.
+"""
+
+from __future__ import annotations
+
+import timeit
+from typing import Any
+
+import numpy as np
+
+from uhi.slicing import SlicePlan
+from uhi.tag import rebin
+
+
+def make_histogram(bins: int, storage: str) -> dict[str, Any]:
+    rng = np.random.default_rng(42)
+    counts = rng.poisson(1e4 * np.exp(-np.linspace(0, 12, bins + 2))).astype(float)
+    arrays: dict[str, Any]
+    if storage == "weighted":
+        arrays = {"values": counts, "variances": counts.copy()}
+    else:
+        arrays = {
+            "counts": counts,
+            "values": rng.random(bins + 2),
+            "variances": rng.random(bins + 2),
+        }
+    return {
+        "uhi_schema": 1,
+        "axes": [
+            {
+                "type": "regular",
+                "lower": 0,
+                "upper": 1,
+                "bins": bins,
+                "underflow": True,
+                "overflow": True,
+                "circular": False,
+            }
+        ],
+        "storage": {"type": storage, **arrays},
+    }
+
+
+def min_count_groups(counts: np.ndarray, minimum: float) -> np.ndarray:
+    """
+    Group sizes so each group has at least ``minimum`` counts (greedy, from
+    the left); the remainder is left for the overflow bin.
+    """
+    cumulative = np.cumsum(counts)
+    boundaries = [0]
+    while True:
+        target = cumulative[boundaries[-1] - 1] if boundaries[-1] else 0.0
+        end = int(np.searchsorted(cumulative, target + minimum)) + 1
+        if end > len(counts):
+            break
+        boundaries.append(end)
+    return np.diff(boundaries)
+
+
+def best_time(func: Any) -> float:
+    return min(timeit.repeat(func, number=1, repeat=5))
+
+
+def main() -> None:
+    bins = 1_000_000
+    print(f"{'storage':>10} {'step':>8} {'new bins':>9} {'compile':>10} {'apply':>10}")
+    for storage in ("weighted", "mean"):
+        hist = make_histogram(bins, storage)
+        counts = hist["storage"]["values" if storage == "weighted" else "counts"]
+        groups = min_count_groups(counts[1:-1], 1000)
+        axis = hist["axes"][0]
+        edges = np.linspace(0, 1, bins + 1)[np.concatenate([[0], np.cumsum(groups)])]
+        for name, step in (
+            ("groups", rebin(groups=groups)),
+            ("edges", rebin(edges=edges)),
+        ):
+            key = np.s_[::step]
+            t_compile = best_time(lambda k=key, a=axis: SlicePlan([a], k))
+            plan = SlicePlan([axis], key)
+            t_apply = best_time(lambda p=plan, h=hist: p.apply(h))
+            print(
+                f"{storage:>10} {name:>8} {len(groups):>9} "
+                f"{t_compile:>9.4f}s {t_apply:>9.4f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark the latency of importing ``uhi.schema`` and validating a first
+histogram in a new process, as in short-lived CLI runs and process pool
+workers.
+
+Compares compiling the schema in memory with ``fastjsonschema.compile`` (the
+previous behavior), the first run with an empty validator cache (which also
+writes it), and later runs that load the cached validator.
+
+Run with ``python benchmarks/schema_startup.py`` or ``nox -s benchmarks``.
+"""
+
+from __future__ import annotations
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+VALID = Path(__file__).parent.parent / "tests/resources/valid/2d.json"
+
+CHILD = """
+import time
+start = time.perf_counter()
+import json
+import uhi.schema
+if {compile_in_memory}:
+    import fastjsonschema
+    with uhi.schema.histogram_file.open(encoding="utf-8") as f:
+        validate = fastjsonschema.compile(json.load(f))
+else:
+    validate = uhi.schema.validate
+with open({file!r}, encoding="utf-8") as f:
+    validate(json.load(f))
+print(time.perf_counter() - start)
+"""
+
+
+def run(cache_dir: str, *, compile_in_memory: bool = False) -> float:
+    code = CHILD.format(compile_in_memory=compile_in_memory, file=str(VALID))
+    env = {**os.environ, "UHI_CACHE_DIR": cache_dir}
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return float(result.stdout)
+
+
+def main() -> None:
+    repeat = 10
+    cold = []
+    with tempfile.TemporaryDirectory() as tmp:
+        in_memory = [run(tmp, compile_in_memory=True) for _ in range(repeat)]
+        for i in range(repeat):
+            cold.append(run(str(Path(tmp) / str(i))))
+        warm = [run(str(Path(tmp) / "0")) for _ in range(repeat)]
+
+    print(f"{'mode':>12} {'median':>10} {'min':>10}")
+    for name, times in (
+        ("in memory", in_memory),
+        ("cold cache", cold),
+        ("warm cache", warm),
+    ):
+        print(
+            f"{name:>12} {statistics.median(times) * 1e3:>8.1f}ms "
+            f"{min(times) * 1e3:>8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
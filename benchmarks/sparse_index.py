@@ -0,0 +1,98 @@
+"""
+Benchmark the memory and IO cost of the 2D and linear sparse index formats.
+
+A 5D histogram with about 1% occupancy is converted with
+``uhi.io.to_sparse(h)`` and ``uhi.io.to_sparse(h, linear=True)``, and written
+to and read back from zip and HDF5.
+
+Run with ``python benchmarks/sparse_index.py`` or ``nox -s benchmarks``.
+"""
+
+from __future__ import annotations
+
+import tempfile
+import timeit
+import zipfile
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+import uhi.io.zip
+from uhi.io import from_sparse, to_sparse
+
+try:
+    import h5py
+
+    import uhi.io.hdf5
+except ModuleNotFoundError:
+    h5py = None
+
+
+def make_histogram(bins: int, ndim: int, occupancy: float) -> dict[str, Any]:
+    rng = np.random.default_rng(42)
+    shape = (bins + 2,) * ndim
+    values = np.where(rng.random(shape) < occupancy, rng.random(shape), 0.0)
+    axis = {
+        "type": "regular",
+        "lower": 0.0,
+        "upper": 1.0,
+        "bins": bins,
+        "underflow": True,
+        "overflow": True,
+        "circular": False,
+    }
+    return {
+        "uhi_schema": 1,
+        "axes": [axis] * ndim,
+        "storage": {"type": "double", "values": values},
+    }
+
+
+def main() -> None:
+    hist = make_histogram(bins=20, ndim=5, occupancy=0.01)
+    print(f"dense values: {hist['storage']['values'].nbytes / 1e6:.2f} MB")
+    print(
+        f"{'format':>8} {'index':>10} {'data':>10} {'to_sparse':>10} "
+        f"{'from_sparse':>12} {'zip':>10} {'hdf5':>10}"
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for linear in (False, True):
+            shist = to_sparse(hist, linear=linear)
+            index = shist["storage"]["index"]
+            data = shist["storage"]["values"]
+
+            t_to = min(
+                timeit.repeat(lambda lin=linear: to_sparse(hist, linear=lin), number=1)
+            )
+            t_from = min(timeit.repeat(lambda s=shist: from_sparse(s), number=1))
+
+            def zip_roundtrip(shist: dict[str, Any] = shist) -> None:
+                with zipfile.ZipFile(Path(tmp) / "bench.zip", "w") as zip_file:
+                    uhi.io.zip.write(zip_file, "h", shist)
+                with zipfile.ZipFile(Path(tmp) / "bench.zip", "r") as zip_file:
+                    uhi.io.zip.read(zip_file, "h")
+
+            t_zip = min(timeit.repeat(zip_roundtrip, number=1))
+
+            t_hdf5 = float("nan")
+            if h5py is not None:
+
+                def hdf5_roundtrip(shist: dict[str, Any] = shist) -> None:
+                    with h5py.File(Path(tmp) / "bench.h5", "w") as h5_file:
+                        uhi.io.hdf5.write(h5_file.create_group("h"), shist)
+                    with h5py.File(Path(tmp) / "bench.h5", "r") as h5_file:
+                        uhi.io.hdf5.read(h5_file["h"])
+
+                t_hdf5 = min(timeit.repeat(hdf5_roundtrip, number=1))
+
+            name = "linear" if linear else "2D"
+            print(
+                f"{name:>8} {index.nbytes / 1e6:>8.2f}MB {data.nbytes / 1e6:>8.2f}MB "
+                f"{t_to:>9.4f}s {t_from:>11.4f}s {t_zip:>9.4f}s {t_hdf5:>9.4f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark block-sparse (tiled) storage on clustered occupancy.
+
+Clustered 2D and 3D histograms (dense patches of filled bins, like detector
+occupancy maps) are stored dense, sparse with a 2D and a linear index, and
+tiled with ``uhi.sparse.to_tiled`` for a few tile shapes. The sizes and the
+conversion times are reported.
+
+Run with ``python benchmarks/tiled_storage.py`` or ``nox -s benchmarks``.
+"""
+
+from __future__ import annotations
+
+import timeit
+from typing import Any
+
+import numpy as np
+
+from uhi.io import from_sparse, to_sparse
+from uhi.sparse import from_tiled, to_tiled
+
+
+def make_histogram(shape: tuple[int, ...], clusters: int, size: int) -> dict[str, Any]:
+    rng = np.random.default_rng(42)
+    values = np.zeros(shape)
+    for _ in range(clusters):
+        corner = [rng.integers(0, n - size) for n in shape]
+        patch = tuple(slice(c, c + size) for c in corner)
+        values[patch] += rng.random((size,) * len(shape))
+    axes = [
+        {"type": "category_int", "categories": list(range(n)), "flow": False}
+        for n in shape
+    ]
+    return {
+        "uhi_schema": 1,
+        "axes": axes,
+        "storage": {"type": "weighted", "values": values, "variances": values},
+    }
+
+
+def nbytes(hist: dict[str, Any]) -> int:
+    return sum(
+        np.asarray(v).nbytes
+        for k, v in hist["storage"].items()
+        if k not in {"type", "tile_shape"}
+    )
+
+
+def best_time(func: Any) -> float:
+    return min(timeit.repeat(func, number=1, repeat=3))
+
+
+def main() -> None:
+    cases = [
+        ("2D", (2000, 2000), 40, 32, [(8, 8), (16, 16), (32, 32)]),
+        ("3D", (200, 200, 200), 30, 16, [(4, 4, 4), (8, 8, 8), (16, 16, 16)]),
+    ]
+    print(f"{'case':>6} {'layout':>14} {'size':>10} {'to':>10} {'from':>10}")
+    for name, shape, clusters, size, tile_shapes in cases:
+        hist = make_histogram(shape, clusters, size)
+        occupancy = np.count_nonzero(hist["storage"]["values"]) / np.prod(shape)
+        print(f"{name:>6} {'occupancy':>14} {occupancy:>9.2%}")
+        print(f"{name:>6} {'dense':>14} {nbytes(hist) / 1e6:>8.2f}MB")
+
+        for linear in (False, True):
+            sparse = to_sparse(hist, linear=linear)
+            t_to = best_time(lambda h=hist, lin=linear: to_sparse(h, linear=lin))
+            t_from = best_time(lambda s=sparse: from_sparse(s))
+            layout = "linear" if linear else "sparse 2D"
+            print(
+                f"{name:>6} {layout:>14} {nbytes(sparse) / 1e6:>8.2f}MB "
+                f"{t_to:>9.4f}s {t_from:>9.4f}s"
+            )
+
+        for tile_shape in tile_shapes:
+            tiled = to_tiled(hist, tile_shape)
+            t_to = best_time(lambda h=hist, t=tile_shape: to_tiled(h, t))
+            t_from = best_time(lambda t=tiled: from_tiled(t))
+            layout = "tiled " + "x".join(map(str, tile_shape))
+            print(
+                f"{name:>6} {layout:>14} {nbytes(tiled) / 1e6:>8.2f}MB "
+                f"{t_to:>9.4f}s {t_from:>9.4f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
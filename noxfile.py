@@ -38,6 +38,17 @@ def tests(session):
     session.run("pytest", *session.posargs)
 
 
+@nox.session(default=False)
+def benchmarks(session: nox.Session) -> None:
+    """
+    Run the benchmarks. Pass benchmark names to run a subset.
+    """
+    session.install("-e.[schema,hdf5]")
+    names = session.posargs or sorted(p.stem for p in DIR.glob("benchmarks/*.py"))
+    for name in names:
+        session.run("python", f"benchmarks/{name}.py")
+
+
 @nox.session(reuse_venv=True, default=False)
 def docs(session: nox.Session) -> None:
     """
@@ -0,0 +1,220 @@
+"""
+Validation of in-memory histograms (the intermediate representation), used by
+:func:`uhi.schema.validate_ir`. This is separate so ``uhi.schema`` does not
+need to import NumPy.
+"""
+
+from __future__ import annotations
+
+import math
+from collections.abc import Mapping
+from typing import Any
+
+import numpy as np
+
+__all__ = ["validate_ir"]
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+_HIST_KEYS = frozenset(["uhi_schema", "writer_info", "metadata", "axes", "storage"])
+
+# Required keys of each axis type; "metadata" and "writer_info" are optional
+_AXIS_KEYS: dict[str, frozenset[str]] = {
+    "regular": frozenset(
+        ["type", "lower", "upper", "bins", "underflow", "overflow", "circular"]
+    ),
+    "variable": frozenset(["type", "edges", "underflow", "overflow", "circular"]),
+    "category_str": frozenset(["type", "categories", "flow"]),
+    "category_int": frozenset(["type", "categories", "flow"]),
+    "boolean": frozenset(["type"]),
+}
+_AXIS_ALLOWED = {k: v | {"metadata", "writer_info"} for k, v in _AXIS_KEYS.items()}
+_AXIS_FLAGS = {
+    k: tuple(sorted(v & {"underflow", "overflow", "circular", "flow"}))
+    for k, v in _AXIS_KEYS.items()
+}
+
+# Data fields of each storage type
+_STORAGE_KEYS: dict[str, frozenset[str]] = {
+    "int": frozenset(["values"]),
+    "double": frozenset(["values"]),
+    "weighted": frozenset(["values", "variances"]),
+    "mean": frozenset(["counts", "values", "variances"]),
+    "weighted_mean": frozenset(
+        ["sum_of_weights", "sum_of_weights_squared", "values", "variances"]
+    ),
+}
+
+
+def _fail(path: str, message: str) -> None:
+    msg = f"{path} {message}"
+    raise ValueError(msg)
+
+
+def _is_int(value: Any) -> bool:
+    return isinstance(value, (int, np.integer)) and not isinstance(value, bool)
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float, np.integer, np.floating)) and not isinstance(
+        value, bool
+    )
+
+
+def _validate_metadata(path: str, metadata: Any, /) -> None:
+    if not isinstance(metadata, (dict, Mapping)):
+        _fail(path, "must be a dict")
+    for key, value in metadata.items():
+        if not isinstance(value, (str, int, float, bool, np.number, np.bool_)):
+            _fail(f"{path}.{key}", "must be a string, number, or boolean")
+
+
+def _validate_writer_info(path: str, writer_info: Any, /) -> None:
+    if not isinstance(writer_info, (dict, Mapping)):
+        _fail(path, "must be a dict")
+    for library, info in writer_info.items():
+        _validate_metadata(f"{path}.{library}", info)
+
+
+def _validate_axis(path: str, axis: Any, /) -> int:
+    """
+    Validate an axis, returning its length (including flow bins).
+    """
+    if not isinstance(axis, (dict, Mapping)):
+        _fail(path, "must be a dict")
+    axis_type = axis.get("type")
+    if axis_type not in _AXIS_KEYS:
+        _fail(f"{path}.type", f"must be one of {sorted(_AXIS_KEYS)}, not {axis_type!r}")
+    keys = axis.keys()
+    if not _AXIS_KEYS[axis_type] <= keys:
+        _fail(path, f"is missing {sorted(_AXIS_KEYS[axis_type] - keys)}")
+    if not keys <= _AXIS_ALLOWED[axis_type]:
+        _fail(path, f"has unexpected keys {sorted(keys - _AXIS_ALLOWED[axis_type])}")
+    for flag in _AXIS_FLAGS[axis_type]:
+        if not isinstance(axis[flag], (bool, np.bool_)):
+            _fail(f"{path}.{flag}", "must be a boolean")
+    if "metadata" in keys:
+        _validate_metadata(f"{path}.metadata", axis["metadata"])
+    if "writer_info" in keys:
+        _validate_writer_info(f"{path}.writer_info", axis["writer_info"])
+
+    match axis_type:
+        case "regular":
+            if not _is_int(axis["bins"]) or axis["bins"] < 0:
+                _fail(f"{path}.bins", "must be a non-negative integer")
+            if not _is_number(axis["lower"]) or not _is_number(axis["upper"]):
+                _fail(path, "must have numeric lower and upper edges")
+            return int(axis["bins"] + axis["underflow"] + axis["overflow"])
+        case "variable":
+            edges = np.asarray(axis["edges"])
+            if edges.ndim != 1 or edges.dtype.kind not in "iuf" or len(edges) < 2:
+                _fail(f"{path}.edges", "must be a 1D numeric array of at least 2 edges")
+            if not np.all(edges[1:] > edges[:-1]):
+                _fail(f"{path}.edges", "must be strictly increasing")
+            return int(len(edges) - 1 + axis["underflow"] + axis["overflow"])
+        case "category_str" | "category_int":
+            categories = axis["categories"]
+            kind = "strings" if axis_type == "category_str" else "integers"
+            if isinstance(categories, np.ndarray):
+                kinds = "US" if axis_type == "category_str" else "iu"
+                if categories.ndim != 1 or (
+                    len(categories) and categories.dtype.kind not in kinds
+                ):
+                    _fail(f"{path}.categories", f"must be a list of {kind}")
+                unique = len(np.unique(categories))
+            else:
+                if isinstance(categories, str) or not all(
+                    isinstance(c, str) if kind == "strings" else _is_int(c)
+                    for c in categories
+                ):
+                    _fail(f"{path}.categories", f"must be a list of {kind}")
+                unique = len(set(categories))
+            if unique != len(categories):
+                _fail(f"{path}.categories", "must be unique")
+            return int(len(categories) + axis["flow"])
+        case _:
+            return 2
+
+
+def _validate_storage(path: str, storage: Any, shape: tuple[int, ...], /) -> None:
+    if not isinstance(storage, (dict, Mapping)):
+        _fail(path, "must be a dict")
+    storage_type = storage.get("type")
+    if storage_type not in _STORAGE_KEYS:
+        _fail(
+            f"{path}.type",
+            f"must be one of {sorted(_STORAGE_KEYS)}, not {storage_type!r}",
+        )
+    fields = _STORAGE_KEYS[storage_type]
+    keys = storage.keys() - {"type", "index"}
+
+    # Empty (metadata-only) storage
+    if not keys and "index" not in storage:
+        return
+    if keys != fields:
+        _fail(
+            path,
+            f"of type {storage_type!r} must have {sorted(fields)}, not {sorted(keys)}",
+        )
+
+    data_shape = shape
+    if "index" in storage:
+        index = np.asarray(storage["index"])
+        if not shape:
+            _fail(f"{path}.index", "is not allowed for histograms without axes")
+        if index.dtype.kind not in "iu" and index.size:
+            _fail(f"{path}.index", f"must be integers, not {index.dtype}")
+        if index.ndim == 1:
+            if index.size and (index.min() < 0 or index.max() >= math.prod(shape)):
+                _fail(f"{path}.index", f"has linear indices out of range for {shape}")
+        elif index.ndim == 2 and index.shape[0] == len(shape):
+            if index.size and (
+                np.any(index.min(axis=1) < 0) or np.any(index.max(axis=1) >= shape)
+            ):
+                _fail(f"{path}.index", f"has indices out of range for {shape}")
+        else:
+            _fail(
+                f"{path}.index",
+                f"must be 1D or have shape ({len(shape)}, n), not {index.shape}",
+            )
+        data_shape = index.shape[-1:]
+
+    kinds = "iu" if storage_type == "int" else "iuf"
+    for key in sorted(fields):
+        array = storage[key]
+        if not hasattr(array, "dtype"):
+            array = np.asarray(array)
+        if array.dtype.kind not in kinds:
+            _fail(f"{path}.{key}", f"has an unsupported dtype {array.dtype}")
+        # Scalar histograms can store a single value as () or (1,)
+        if np.shape(array) != data_shape and (shape or np.shape(array) != (1,)):
+            _fail(
+                f"{path}.{key}", f"must have shape {data_shape}, not {np.shape(array)}"
+            )
+
+
+def validate_ir(hist: Mapping[str, Any], /) -> None:
+    """
+    See :func:`uhi.schema.validate_ir`.
+    """
+    if not isinstance(hist, (dict, Mapping)):
+        _fail("histogram", "must be a dict")  # type: ignore[unreachable]
+    if missing := {"axes", "storage"} - hist.keys():
+        _fail("histogram", f"is missing {sorted(missing)}")
+    if extra := hist.keys() - _HIST_KEYS:
+        _fail("histogram", f"has unexpected keys {sorted(extra)}")
+    if hist.get("uhi_schema", 1) != 1:
+        _fail("histogram.uhi_schema", "must be 1")
+    if "metadata" in hist:
+        _validate_metadata("histogram.metadata", hist["metadata"])
+    if "writer_info" in hist:
+        _validate_writer_info("histogram.writer_info", hist["writer_info"])
+
+    axes = hist["axes"]
+    if isinstance(axes, (str, Mapping)):
+        _fail("histogram.axes", "must be a list")
+    shape = tuple(_validate_axis(f"histogram.axes[{i}]", a) for i, a in enumerate(axes))
+    _validate_storage("histogram.storage", hist["storage"], shape)
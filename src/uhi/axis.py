@@ -0,0 +1,232 @@
+"""
+Reference bin lookup for the axes of the intermediate representation.
+
+The classes here follow the usual ``index`` convention, so they can be passed
+to ``uhi.tag`` locators: ``-1`` is the underflow bin and ``len(axis)`` is the
+overflow bin, whether or not the axis stores these flow bins. Both scalars and
+arrays are supported; arrays are looked up in a few vectorized NumPy calls.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any, overload
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .typing.serialization import AnyAxisIR
+
+__all__ = ["Axis", "Boolean", "Category", "Regular", "Variable", "from_ir"]
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+class Axis:
+    """
+    Base class for the lookup axes. ``size`` is the number of bins (without
+    flow bins), and ``underflow`` and ``overflow`` tell if the flow bins are
+    stored.
+    """
+
+    __slots__ = ("circular", "overflow", "size", "underflow")
+
+    size: int
+    underflow: bool
+    overflow: bool
+    circular: bool
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(size={self.size})"
+
+    @property
+    def extent(self) -> int:
+        """
+        The length of the axis in the storage, including the flow bins.
+        """
+        return self.size + self.underflow + self.overflow
+
+    def _index(self, values: NDArray[Any]) -> NDArray[np.intp]:
+        raise NotImplementedError
+
+    @overload
+    def index(self, value: str | float) -> int: ...
+
+    @overload
+    def index(self, value: NDArray[Any] | list[Any]) -> NDArray[np.intp]: ...
+
+    def index(self, value: ArrayLike) -> int | NDArray[np.intp]:
+        """
+        The bin index of a value or an array of values: ``-1`` for underflow
+        and ``len(axis)`` for overflow. Values that are not in a category
+        axis give ``len(axis)`` too, rather than raising, since that is the
+        bin they would be filled into.
+        """
+        values = np.asarray(value)
+        indices = self._index(values.reshape(-1)).reshape(values.shape)
+        return int(indices) if indices.ndim == 0 else indices
+
+    @overload
+    def storage_index(self, value: str | float) -> int: ...
+
+    @overload
+    def storage_index(self, value: NDArray[Any] | list[Any]) -> NDArray[np.intp]: ...
+
+    def storage_index(self, value: ArrayLike) -> int | NDArray[np.intp]:
+        """
+        The position of a value or an array of values in the storage, which
+        includes the flow bins, or ``-1`` for values in a flow bin that is not
+        stored.
+        """
+        values = np.asarray(value)
+        indices = self._index(values.reshape(-1)) + self.underflow
+        indices[indices >= self.extent] = -1
+        indices = indices.reshape(values.shape)
+        return int(indices) if indices.ndim == 0 else indices
+
+
+class Regular(Axis):
+    """
+    A regular axis. Bins are computed arithmetically; circular axes wrap
+    around, and NaN goes into the overflow bin. Like in boost-histogram, the
+    upper edge is included in the last bin if there is no overflow bin.
+    """
+
+    __slots__ = ("_scale", "lower", "upper")
+
+    def __init__(self, axis: Mapping[str, Any]) -> None:
+        self.lower = float(axis["lower"])
+        self.upper = float(axis["upper"])
+        self.size = int(axis["bins"])
+        self.underflow = bool(axis["underflow"])
+        self.overflow = bool(axis["overflow"])
+        self.circular = bool(axis["circular"])
+        self._scale = self.size / (self.upper - self.lower)
+
+    def _index(self, values: NDArray[Any]) -> NDArray[np.intp]:
+        pos = (values - self.lower) * self._scale
+        if self.circular:
+            with np.errstate(invalid="ignore"):
+                pos = np.mod(pos, self.size)
+        np.floor(pos, out=pos)
+        np.clip(pos, -1, self.size, out=pos)
+        pos[np.isnan(pos)] = self.size
+        if not self.overflow and not self.circular:
+            # Without an overflow bin, the upper edge is part of the last bin
+            pos[values == self.upper] = self.size - 1
+        return pos.astype(np.intp)
+
+
+class Variable(Axis):
+    """
+    A variable axis. Bins are found by binary search on the edges; circular
+    axes wrap around, and NaN goes into the overflow bin. Like in
+    boost-histogram, the upper edge is included in the last bin if there is
+    no overflow bin.
+    """
+
+    __slots__ = ("edges",)
+
+    def __init__(self, axis: Mapping[str, Any]) -> None:
+        self.edges = np.asarray(axis["edges"], dtype=np.float64)
+        self.size = len(self.edges) - 1
+        self.underflow = bool(axis["underflow"])
+        self.overflow = bool(axis["overflow"])
+        self.circular = bool(axis["circular"])
+
+    def _index(self, values: NDArray[Any]) -> NDArray[np.intp]:
+        if self.circular:
+            lower = self.edges[0]
+            with np.errstate(invalid="ignore"):
+                values = lower + np.mod(values - lower, self.edges[-1] - lower)
+        indices = np.searchsorted(self.edges, values, side="right") - 1
+        if not self.overflow and not self.circular:
+            # Without an overflow bin, the upper edge is part of the last bin
+            indices[values == self.edges[-1]] = self.size - 1
+        return indices.astype(np.intp, copy=False)
+
+
+class Category(Axis):
+    """
+    A string or integer category axis. Categories are looked up in a
+    precomputed hash map; values that are not a category go into the
+    overflow bin.
+    """
+
+    __slots__ = ("_map", "_order", "_sorted", "categories")
+
+    def __init__(self, axis: Mapping[str, Any]) -> None:
+        self.categories = list(axis["categories"])
+        self.size = len(self.categories)
+        self.underflow = False
+        self.overflow = bool(axis["flow"])
+        self.circular = False
+        self._map = {c: i for i, c in enumerate(self.categories)}
+        # Integer arrays are looked up by binary search, avoiding a dict
+        # lookup per value
+        self._sorted: NDArray[Any] | None = None
+        self._order: NDArray[np.intp] | None = None
+        if axis["type"] == "category_int":
+            categories = np.asarray(self.categories, dtype=np.int64)
+            self._order = np.argsort(categories, kind="stable")
+            self._sorted = categories[self._order]
+
+    def _index(self, values: NDArray[Any]) -> NDArray[np.intp]:
+        if self._sorted is not None and self._order is not None:
+            if values.dtype.kind not in "iub" or not self.size:
+                # Other dtypes (like floats) use the hash map directly
+                return np.array(
+                    [self._map.get(v, self.size) for v in values.tolist()],
+                    dtype=np.intp,
+                )
+            pos = np.searchsorted(self._sorted, values)
+            np.minimum(pos, self.size - 1, out=pos)
+            found = self._sorted[pos] == values
+            return np.where(found, self._order[pos], self.size)
+
+        # Look up each distinct value once
+        unique, inverse = np.unique(values, return_inverse=True)
+        mapped = np.array(
+            [self._map.get(v, self.size) for v in unique.tolist()], dtype=np.intp
+        )
+        return mapped[inverse.reshape(-1)]
+
+
+class Boolean(Axis):
+    """
+    A boolean axis, with bin 0 for False and 1 for True.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, axis: Mapping[str, Any] | None = None) -> None:  # noqa: ARG002
+        self.size = 2
+        self.underflow = False
+        self.overflow = False
+        self.circular = False
+
+    def _index(self, values: NDArray[Any]) -> NDArray[np.intp]:
+        return values.astype(bool).astype(np.intp)
+
+
+def from_ir(axis: AnyAxisIR | Mapping[str, Any], /) -> Axis:
+    """
+    Make the lookup axis for an axis of the intermediate representation.
+    """
+    match axis["type"]:
+        case "regular":
+            return Regular(axis)
+        case "variable":
+            return Variable(axis)
+        case "category_str" | "category_int":
+            return Category(axis)
+        case "boolean":
+            return Boolean(axis)
+        case _:
+            msg = f"Unsupported axis type {axis['type']!r}"
+            raise TypeError(msg)
@@ -0,0 +1,401 @@
+"""
+A reference fill engine, binning arrays of data directly into the intermediate
+representation without a histogram library.
+"""
+
+from __future__ import annotations
+
+import copy
+import math
+from collections.abc import Callable, Iterable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Literal
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .axis import Axis, from_ir
+from .io._combine import _from_additive
+from .typing.serialization import AnyAxisIR, HistogramIR, SupportedMetadata
+
+__all__ = ["Filler", "StorageType", "fill"]
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+StorageType = Literal["int", "double", "weighted", "mean", "weighted_mean"]
+
+# The additive moments accumulated for each storage type, see io._combine
+_MOMENTS: dict[str, tuple[str, ...]] = {
+    "int": ("values",),
+    "double": ("values",),
+    "weighted": ("values", "variances"),
+    "mean": ("counts", "sum", "sum_of_squares"),
+    "weighted_mean": (
+        "sum_of_weights",
+        "sum_of_weights_squared",
+        "sum",
+        "sum_of_squares",
+    ),
+}
+
+
+def _add_moments(
+    pair: tuple[dict[str, NDArray[Any]], dict[str, NDArray[Any]]],
+) -> dict[str, NDArray[Any]]:
+    """
+    Add the second set of moments into the first, returning the first.
+    """
+    total, other = pair
+    for key, moment in other.items():
+        total[key] += moment
+    return total
+
+
+class Filler:
+    """
+    Accumulate data into a histogram with the given IR axes and storage type,
+    and produce the intermediate representation with :meth:`to_ir`.
+
+    Bins are found with the vectorized lookup of :mod:`uhi.axis`, so flow
+    bins and circular axes behave like in boost-histogram: values in a flow
+    bin that is not stored, and values that are not in a category axis
+    without a flow bin, are dropped. Category axes do not grow.
+
+    The storage is accumulated as additive moments (sums of weights, of
+    squared weights, of weighted samples, ...) with ``np.bincount``, so
+    fillers with the same binning can be combined with ``+=``. Integer
+    storages truncate weights to integers.
+    """
+
+    __slots__ = (
+        "_axes",
+        "_moments",
+        "_strides",
+        "axes",
+        "metadata",
+        "shape",
+        "storage_type",
+    )
+
+    def __init__(
+        self,
+        axes: Sequence[AnyAxisIR],
+        storage: StorageType = "double",
+        *,
+        metadata: dict[str, SupportedMetadata] | None = None,
+    ) -> None:
+        if storage not in _MOMENTS:
+            msg = f"Unsupported storage type: {storage}"
+            raise TypeError(msg)
+        #: The IR axes of the histogram
+        self.axes = [copy.deepcopy(axis) for axis in axes]
+        #: The storage type of the histogram
+        self.storage_type = storage
+        #: The histogram metadata
+        self.metadata = metadata
+        self._axes: list[Axis] = [from_ir(axis) for axis in self.axes]
+        #: The shape of the storage, including the flow bins
+        self.shape = tuple(axis.extent for axis in self._axes)
+        self._strides = [math.prod(self.shape[i + 1 :]) for i in range(len(self.shape))]
+        self._moments = self._zeros()
+
+    def _zeros(self) -> dict[str, NDArray[Any]]:
+        size = math.prod(self.shape)
+        dtype = np.int64 if self.storage_type == "int" else np.float64
+        return {k: np.zeros(size, dtype=dtype) for k in _MOMENTS[self.storage_type]}
+
+    def __repr__(self) -> str:
+        return f"Filler({self.storage_type!r}, shape={self.shape})"
+
+    def empty_like(self) -> Filler:
+        """
+        A new, empty filler with the same axes, storage type and metadata.
+        """
+        other = copy.copy(self)
+        other._moments = self._zeros()
+        return other
+
+    def reset(self) -> None:
+        """
+        Set all the bins back to zero.
+        """
+        for moment in self._moments.values():
+            moment[...] = 0
+
+    def _prepare(
+        self,
+        data: Sequence[ArrayLike],
+        weight: ArrayLike | None,
+        sample: ArrayLike | None,
+    ) -> tuple[list[NDArray[Any]], NDArray[Any] | None, NDArray[Any] | None]:
+        """
+        Check and broadcast the arguments to fill, flattening them.
+        """
+        if len(data) != len(self._axes):
+            msg = f"Expected {len(self._axes)} data arrays, got {len(data)}"
+            raise ValueError(msg)
+        is_mean = self.storage_type in {"mean", "weighted_mean"}
+        if is_mean and sample is None:
+            msg = f"A sample is required for the {self.storage_type} storage"
+            raise ValueError(msg)
+        if not is_mean and sample is not None:
+            msg = f"A sample is not supported for the {self.storage_type} storage"
+            raise ValueError(msg)
+
+        arrays = [np.asarray(d) for d in data]
+        extra = [np.asarray(a) for a in (weight, sample) if a is not None]
+        broadcast = np.broadcast_arrays(*arrays, *extra)
+        flat = [a.reshape(-1) for a in broadcast]
+        weights = flat[len(arrays)] if weight is not None else None
+        samples = flat[-1] if sample is not None else None
+        return flat[: len(arrays)], weights, samples
+
+    def _bins(self, data: Sequence[NDArray[Any]]) -> NDArray[np.intp]:
+        """
+        The flat storage positions of the data, with ``-1`` for the values
+        that are dropped.
+        """
+        flat = np.zeros(len(data[0]) if data else 1, dtype=np.intp)
+        dropped: NDArray[np.bool_] | None = None
+        for axis, stride, values in zip(self._axes, self._strides, data, strict=True):
+            pos = axis.storage_index(values)
+            missing = pos < 0
+            if missing.any():
+                dropped = missing if dropped is None else dropped | missing
+            if stride != 1:
+                pos *= stride
+            flat += pos
+        if dropped is not None:
+            flat[dropped] = -1
+        return flat
+
+    def _accumulate(
+        self,
+        moments: dict[str, NDArray[Any]],
+        bins: NDArray[np.intp],
+        weight: NDArray[Any] | None,
+        sample: NDArray[Any] | None,
+    ) -> None:
+        """
+        Add the bincounts of one batch of data to ``moments``.
+        """
+        keep = bins >= 0
+        if not keep.all():
+            bins = bins[keep]
+            weight = None if weight is None else weight[keep]
+            sample = None if sample is None else sample[keep]
+        size = len(next(iter(moments.values())))
+
+        def count(w: NDArray[Any] | None) -> NDArray[Any]:
+            return np.bincount(bins, weights=w, minlength=size)
+
+        match self.storage_type:
+            case "int":
+                w = None if weight is None else weight.astype(np.int64)
+                moments["values"] += count(w).astype(np.int64)
+            case "double":
+                moments["values"] += count(weight)
+            case "weighted":
+                moments["values"] += count(weight)
+                moments["variances"] += count(None if weight is None else weight**2)
+            case "mean":
+                assert sample is not None
+                ws = sample if weight is None else weight * sample
+                moments["counts"] += count(weight)
+                moments["sum"] += count(ws)
+                moments["sum_of_squares"] += count(ws * sample)
+            case "weighted_mean":
+                assert sample is not None
+                ws = sample if weight is None else weight * sample
+                moments["sum_of_weights"] += count(weight)
+                moments["sum_of_weights_squared"] += count(
+                    None if weight is None else weight**2
+                )
+                moments["sum"] += count(ws)
+                moments["sum_of_squares"] += count(ws * sample)
+
+    def _fill_chunks(
+        self,
+        starts: Sequence[int],
+        chunk_size: int,
+        arrays: Sequence[NDArray[Any]],
+        weight: NDArray[Any] | None,
+        sample: NDArray[Any] | None,
+    ) -> dict[str, NDArray[Any]]:
+        """
+        Fill the chunks at ``starts`` into a new set of moments, owned by the
+        calling thread.
+        """
+        moments = self._zeros()
+        for start in starts:
+            chunk = slice(start, start + chunk_size)
+            self._accumulate(
+                moments,
+                self._bins([a[chunk] for a in arrays]),
+                None if weight is None else weight[chunk],
+                None if sample is None else sample[chunk],
+            )
+        return moments
+
+    def fill(
+        self,
+        *data: ArrayLike,
+        weight: ArrayLike | None = None,
+        sample: ArrayLike | None = None,
+        threads: int = 1,
+        chunk_size: int = 1 << 18,
+    ) -> Filler:
+        """
+        Fill the histogram with one array of values per axis, broadcast
+        together with the optional ``weight`` and ``sample`` (required for
+        the mean storages). Returns the filler.
+
+        With ``threads`` above one, the data is split into chunks of
+        ``chunk_size`` entries, spread over a thread pool. Each thread fills
+        its own copy of the storage, so nothing is shared while filling, and
+        the copies are added pairwise on the pool at the end. NumPy releases
+        the GIL for most of the work, and no other locking is needed, so this
+        also works on free-threaded Python. Each thread needs memory for a
+        full copy of the storage.
+        """
+        arrays, weights, samples = self._prepare(data, weight, sample)
+        size = len(arrays[0]) if arrays else 1
+        starts = range(0, size, chunk_size)
+        workers = min(threads, len(starts))
+        if workers <= 1:
+            self._accumulate(self._moments, self._bins(arrays), weights, samples)
+            return self
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(
+                    self._fill_chunks,
+                    starts[i::workers],
+                    chunk_size,
+                    arrays,
+                    weights,
+                    samples,
+                )
+                for i in range(workers)
+            ]
+            buffers = [future.result() for future in futures]
+            # Tree reduction, halving the number of buffers at each level
+            while len(buffers) > 1:
+                pairs = list(zip(buffers[::2], buffers[1::2], strict=False))
+                merged = list(pool.map(_add_moments, pairs))
+                buffers = merged + buffers[2 * len(pairs) :]
+
+        _add_moments((self._moments, buffers[0]))
+        return self
+
+    def fill_stream(
+        self,
+        chunks: Iterable[Any],
+        *,
+        columns: Sequence[str] | None = None,
+        weight: str | None = None,
+        sample: str | None = None,
+        snapshot: Callable[[HistogramIR], object] | None = None,
+        snapshot_every: int = 1,
+        threads: int = 1,
+        chunk_size: int = 1 << 18,
+    ) -> Filler:
+        """
+        Fill the histogram from an iterable of chunks of data, such as record
+        batches read from a file. Only one chunk is held at a time, so memory
+        use is bounded by the chunk size and the storage.
+
+        Without ``columns``, each chunk is a sequence of arrays, one per axis.
+        Otherwise, each chunk is indexed by column name (a dict, a record
+        batch, a dataframe, ...): ``columns`` are the names of the columns for
+        the axes, and ``weight`` and ``sample`` name the optional weight and
+        sample columns.
+
+        ``snapshot`` is called with the histogram in the intermediate
+        representation every ``snapshot_every`` chunks, and once more at the
+        end if the last chunks were not included yet, so long jobs produce
+        partial results (for example written with :func:`uhi.io.zip.write`).
+        ``threads`` and ``chunk_size`` are passed to :meth:`fill` for each
+        chunk. Returns the filler.
+        """
+        if columns is None and (weight is not None or sample is not None):
+            msg = "weight and sample columns require columns"
+            raise ValueError(msg)
+        if snapshot_every < 1:
+            msg = "snapshot_every must be at least 1"
+            raise ValueError(msg)
+
+        pending = 0
+        for chunk in chunks:
+            if columns is None:
+                data = tuple(chunk)
+                kwargs = {}
+            else:
+                data = tuple(chunk[name] for name in columns)
+                kwargs = {
+                    key: chunk[name]
+                    for key, name in (("weight", weight), ("sample", sample))
+                    if name is not None
+                }
+            self.fill(*data, threads=threads, chunk_size=chunk_size, **kwargs)
+            pending += 1
+            if snapshot is not None and pending == snapshot_every:
+                snapshot(self.to_ir())
+                pending = 0
+
+        if snapshot is not None and pending:
+            snapshot(self.to_ir())
+        return self
+
+    def _check_compatible(self, other: Filler) -> None:
+        if self.shape != other.shape or self.storage_type != other.storage_type:
+            msg = f"Cannot combine {self!r} with {other!r}"
+            raise ValueError(msg)
+
+    def __iadd__(self, other: Filler) -> Filler:
+        self._check_compatible(other)
+        _add_moments((self._moments, other._moments))
+        return self
+
+    def to_ir(self) -> HistogramIR:
+        """
+        The histogram in the intermediate representation. The arrays are
+        copies, so filling can continue.
+        """
+        storage = _from_additive(
+            self.storage_type,
+            {k: v.reshape(self.shape).copy() for k, v in self._moments.items()},
+        )
+        hist: dict[str, Any] = {
+            "uhi_schema": 1,
+            "axes": copy.deepcopy(self.axes),
+            "storage": {"type": self.storage_type, **storage},
+        }
+        if self.metadata:
+            hist["metadata"] = copy.deepcopy(self.metadata)
+        return hist  # type: ignore[return-value]
+
+
+def fill(
+    axes: Sequence[AnyAxisIR],
+    *data: ArrayLike,
+    storage: StorageType = "double",
+    weight: ArrayLike | None = None,
+    sample: ArrayLike | None = None,
+    metadata: dict[str, SupportedMetadata] | None = None,
+    threads: int = 1,
+    chunk_size: int = 1 << 18,
+) -> HistogramIR:
+    """
+    Fill a histogram with the given IR axes and storage type in one call,
+    returning the intermediate representation. See :class:`Filler` and
+    :meth:`Filler.fill`.
+    """
+    filler = Filler(axes, storage, metadata=metadata)
+    filler.fill(
+        *data, weight=weight, sample=sample, threads=threads, chunk_size=chunk_size
+    )
+    return filler.to_ir()
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import copy
+import math
 import sys
-from typing import Any, TypeVar
+from collections.abc import Iterator, Mapping, Sequence
+from typing import Any, Literal, TypedDict, TypeVar
 
 import numpy as np
 
 from ..typing.serialization import AnyHistogramIR, AxisIR, HistogramIR
+from ._combine import _from_additive, _to_additive
 
 if sys.version_info < (3, 11):
     from typing_extensions import assert_never
@@ -14,7 +17,16 @@ else:
     from typing import assert_never
 
 
-__all__ = ["ARRAY_KEYS", "LIST_KEYS", "from_sparse", "remove_writer_info", "to_sparse"]
+__all__ = [
+    "ARRAY_KEYS",
+    "LIST_KEYS",
+    "LayoutCost",
+    "from_sparse",
+    "layout_cost",
+    "merge_sparse",
+    "remove_writer_info",
+    "to_sparse",
+]
 
 ARRAY_KEYS = frozenset(
     [
@@ -34,6 +46,9 @@ LIST_KEYS = frozenset(
     ]
 )
 
+# Default number of bins per slab in to_sparse for out-of-memory arrays
+_BLOCK_ELEMENTS = 2**22
+
 T = TypeVar("T", bound="dict[str, Any]")
 H = TypeVar("H", bound="dict[str, Any] | HistogramIR | AnyHistogramIR")
 
@@ -86,10 +101,173 @@ def _empty_is_zero(storage_type: str, key: str) -> bool:
     return storage_type != "weighted_mean" or key != "variances"
 
 
-def to_sparse(hist: H, /) -> H:
+def _linear_index_dtype(shape: Sequence[int], /) -> np.dtype[Any]:
+    """
+    The smallest unsigned integer dtype that can hold a linear (raveled) index
+    into an array of the given shape.
+    """
+    dtype = np.min_scalar_type(max(math.prod(shape) - 1, 0))
+    if dtype.kind != "u":
+        msg = f"Shape {tuple(shape)} is too large for a linear index"
+        raise ValueError(msg)
+    return dtype
+
+
+def _iter_slabs(
+    storage: Mapping[str, Any], block_size: int | None, /
+) -> Iterator[tuple[int, int, dict[str, np.ndarray]]]:
+    """
+    Iterate over a dense storage in slabs along the first axis, yielding the
+    start of the slab, the number of bins per entry along the first axis, and
+    the slab arrays. The storage arrays can be anything that supports slicing
+    along the first axis; only one slab is read at a time. At least one
+    (possibly empty) slab is always produced, so outputs get the right dtypes.
+    """
+
+    # Get the arrays inside storage, ignoring "type"; array-likes are not
+    # read until sliced
+    arrays: dict[str, Any] = {
+        k: v if hasattr(v, "shape") else np.asarray(v)
+        for k, v in storage.items()
+        if k != "type"
+    }
+    shape = tuple(next(iter(arrays.values())).shape)
+    row_size = math.prod(shape[1:])
+    if block_size is None:
+        in_memory = all(type(arr) is np.ndarray for arr in arrays.values())
+        block_size = shape[0] if in_memory else max(1, _BLOCK_ELEMENTS // row_size)
+    elif block_size < 1:
+        msg = f"block_size must be positive, not {block_size}"
+        raise ValueError(msg)
+
+    for start in range(0, max(shape[0], 1), max(block_size, 1)):
+        yield (
+            start,
+            row_size,
+            {
+                k: np.asarray(arr[start : start + block_size])
+                for k, arr in arrays.items()
+            },
+        )
+
+
+def _filled_mask(storage_type: str, arrays: dict[str, np.ndarray], /) -> np.ndarray:
+    """
+    Mask of the bins that are not empty in *any* of the storage arrays. The
+    mask is accumulated in place, so only two boolean arrays are alive at once.
+    """
+    mask: np.ndarray | None = None
+    for k, arr in arrays.items():
+        filled = arr != 0 if _empty_is_zero(storage_type, k) else ~np.isnan(arr)
+        mask = filled if mask is None else np.logical_or(mask, filled, out=mask)
+    assert mask is not None
+    return mask
+
+
+class LayoutCost(TypedDict):
+    """
+    Storage sizes in bytes, as reported by :func:`layout_cost`.
+    """
+
+    #: Number of filled bins
+    nnz: int
+    #: Bytes of each storage array when dense
+    dense: dict[str, int]
+    #: Bytes of each storage array when sparse, without the index
+    sparse: dict[str, int]
+    #: Bytes of the sparse index, for the 2D (``"2d"``) and linear
+    #: (``"linear"``) encodings; the linear encoding is missing if the
+    #: histogram has too many bins for it
+    index: dict[str, int]
+    #: The smallest layout
+    best: Literal["dense", "2d", "linear"]
+
+
+def layout_cost(hist: dict[str, Any] | HistogramIR | AnyHistogramIR, /) -> LayoutCost:
+    """
+    Compute the exact sizes of the storage arrays of a histogram in the dense
+    and sparse layouts, and find the smallest layout. Works for dense and
+    sparse histograms; dense histograms are scanned (in slabs, like
+    :func:`to_sparse`) to count the filled bins.
+
+    Scalar and empty (metadata-only) histograms cannot be sparse, so only the
+    dense sizes are reported.
+    """
+
+    storage = hist["storage"]
+    arrays = {k: v for k, v in storage.items() if k not in {"type", "index"}}
+    shape = [_compute_axis_length(a) for a in hist["axes"]]  # type: ignore[arg-type]
+    size = int(math.prod(shape))
+
+    if not shape or not arrays:
+        dense = {k: int(np.asarray(v).nbytes) for k, v in arrays.items()}
+        return {"nnz": size, "dense": dense, "sparse": {}, "index": {}, "best": "dense"}
+
+    # Array-likes (like h5py datasets) have a dtype without being arrays
+    dtypes = {
+        k: v.dtype if hasattr(v, "dtype") else np.asarray(v).dtype
+        for k, v in arrays.items()
+    }
+    # Plain ints (not NumPy scalars), so the result can be serialized to JSON
+    if "index" in storage:
+        nnz = int(np.shape(storage["index"])[-1])
+    else:
+        nnz = sum(
+            int(np.count_nonzero(_filled_mask(storage["type"], slab)))
+            for _, _, slab in _iter_slabs(storage, None)
+        )
+
+    index = {"2d": len(shape) * nnz * np.dtype(np.int64).itemsize}
+    if size == 0 or np.min_scalar_type(size - 1).kind == "u":
+        index["linear"] = nnz * _linear_index_dtype(shape).itemsize
+
+    sparse = {k: nnz * dt.itemsize for k, dt in dtypes.items()}
+    totals: dict[Literal["dense", "2d", "linear"], int] = {
+        "dense": size * sum(dt.itemsize for dt in dtypes.values())
+    }
+    # The linear index is never larger, so it is preferred on ties
+    for encoding in ("linear", "2d"):
+        if encoding in index:
+            totals[encoding] = sum(sparse.values()) + index[encoding]
+
+    return {
+        "nnz": nnz,
+        "dense": {k: size * dt.itemsize for k, dt in dtypes.items()},
+        "sparse": sparse,
+        "index": index,
+        "best": min(totals, key=totals.__getitem__),
+    }
+
+
+def to_sparse(
+    hist: H,
+    /,
+    *,
+    linear: bool = False,
+    block_size: int | None = None,
+    min_savings: float | None = None,
+) -> H:
     """
     Convert a dense histogram to a sparse one. Leaves a sparse histogram alone.
     Leaves empty (metadata-only) histograms alone.
+
+    If ``linear`` is True, the index is a 1D array of indices into the
+    flattened (C order) dense storage, using the smallest unsigned integer
+    type that fits, instead of a 2D ``(ndim, n_nonzero)`` array.
+
+    The storage is processed in slabs of ``block_size`` entries along the
+    first axis, so peak memory is bounded by the size of a slab plus the
+    sparse output. The storage arrays can be anything that supports slicing
+    along the first axis, like ``np.memmap`` or ``h5py.Dataset``, so
+    histograms larger than memory can be converted. By default, in-memory
+    arrays are processed in one slab and other arrays in slabs of about
+    ``2**22`` bins.
+
+    If ``min_savings`` is given, the histogram is only converted if the sparse
+    layout (with the chosen index encoding) is at least that fraction smaller
+    than the dense one, as computed by :func:`layout_cost`; otherwise it is
+    returned unchanged. For example, ``min_savings=0.5`` requires the sparse
+    histogram to be at most half the size.
     """
 
     storage = hist["storage"]
@@ -99,28 +277,46 @@ def to_sparse(hist: H, /) -> H:
     if "index" in storage or not hist["axes"] or len(storage) == 1:
         return hist
 
-    # Get the arrays inside storage, ignoring "type"
-    arrays = {k: np.asarray(v) for k, v in storage.items() if k != "type"}
-
-    # Build mask of nonzero bins across *all* present keys
-    mask = np.any(
-        [
-            arr != 0 if _empty_is_zero(storage_type, k) else ~np.isnan(arr)
-            for k, arr in arrays.items()
-        ],
-        axis=0,
-    )
-
-    # Get the flat indices (or unravel them)
-    nonzero_indices = np.nonzero(mask)
+    if linear:
+        index_dtype = _linear_index_dtype(
+            [_compute_axis_length(a) for a in hist["axes"]]  # type: ignore[arg-type]
+        )
 
-    # Pack indices into a single (ndim, n_nonzero) array
-    index = np.vstack(nonzero_indices)
+    # Counting the filled bins first avoids building a sparse histogram that
+    # would be thrown away
+    if min_savings is not None:
+        cost = layout_cost(hist)
+        dense_bytes = sum(cost["dense"].values())
+        sparse_bytes = sum(cost["sparse"].values())
+        sparse_bytes += cost["index"]["linear" if linear else "2d"]
+        if not dense_bytes or 1 - sparse_bytes / dense_bytes < min_savings:
+            return hist
+
+    indices = []
+    selected: dict[str, list[np.ndarray]] = {}
+    for start, row_size, slab in _iter_slabs(storage, block_size):
+        mask = _filled_mask(storage_type, slab)
+
+        if linear:
+            # Flat indices, in the smallest type that fits
+            flat = np.flatnonzero(mask) + start * row_size
+            indices.append(flat.astype(index_dtype))
+        else:
+            # Pack indices into a single (ndim, n_nonzero) array
+            index = np.vstack(np.nonzero(mask))
+            index[0] += start
+            indices.append(index)
+
+        for k, arr in slab.items():
+            selected.setdefault(k, []).append(arr[mask])
 
     # Build sparse storage dict
-    sparse_storage = {"type": storage_type, "index": index}
-    for k, arr in arrays.items():
-        sparse_storage[k] = arr[mask]
+    sparse_storage = {
+        "type": storage_type,
+        "index": np.concatenate(indices, axis=-1),
+    }
+    for k, parts in selected.items():
+        sparse_storage[k] = np.concatenate(parts)
 
     # Return new histogram dict with modified storage
     sparse_hist = copy.copy(hist)
@@ -128,41 +324,203 @@ def to_sparse(hist: H, /) -> H:
     return sparse_hist
 
 
-def from_sparse(sparse: H, /) -> H:
+def _scatter_target(full: np.ndarray, index: np.ndarray | None, /) -> tuple[Any, Any]:
+    """
+    Returns ``(target, key)`` such that ``target[key]`` addresses the bins
+    listed in a sparse index (2D or linear) of the dense array ``full``, or
+    all bins if there is no index. ``target`` is a view of ``full``.
+    """
+    if index is None:
+        return full, ...
+    if index.ndim == 2:
+        return full, tuple(index)
+    if full.flags.c_contiguous:
+        return full.reshape(-1), index
+    return full, np.unravel_index(index, full.shape)
+
+
+def from_sparse(
+    sparse: H,
+    /,
+    *,
+    out: Mapping[str, np.ndarray] | None = None,
+    accumulate: bool = False,
+) -> H:
     """
     Convert sparse histogram data back to dense format. If the histogram is already
-    dense, just return it.
+    dense, just return it. Both 2D and linear (1D) indices are supported.
+
+    If ``out`` is given, it must be a dict with a preallocated array (for
+    example, an ``np.memmap``) of the dense shape for each storage key. The
+    arrays are filled with zeros (or NaN for ``weighted_mean`` variances),
+    then the sparse values are scattered into them in place, and the
+    returned histogram refers to them. A dense histogram is copied into
+    ``out``. With ``accumulate=True``, the arrays are not cleared and the
+    histogram is added to their current contents instead (mean storages are
+    combined as weighted means).
     """
 
     storage = sparse["storage"]
     storage_type = storage["type"]
 
     index = storage.get("index")
-    if index is None:
-        return sparse
-
-    ndim, _n_nonzero = index.shape
+    if out is None:
+        if accumulate:
+            msg = "accumulate=True requires out"
+            raise ValueError(msg)
+        if index is None:
+            return sparse
+
+    if index is not None:
+        index = np.asarray(index)
     shape = [_compute_axis_length(a) for a in sparse["axes"]]  # type: ignore[arg-type]
 
-    if len(shape) != ndim:
-        msg = f"Shape {shape} does not match sparse index dimension {ndim}"
+    if index is not None and index.ndim == 2 and len(shape) != index.shape[0]:
+        msg = f"Shape {shape} does not match sparse index dimension {index.shape[0]}"
         raise ValueError(msg)
 
-    dense_storage = {"type": storage["type"]}
-    for k, arr1d in storage.items():
-        if k in {"index", "type"}:
-            continue
-        arr1dnp = np.asarray(arr1d)
+    data = {
+        k: np.asarray(arr1d)
+        for k, arr1d in storage.items()
+        if k not in {"index", "type"}
+    }
 
+    if out is None:
         # Allocate a zeros (or nan) array of the original shape
-        full = np.full(
-            shape, 0 if _empty_is_zero(storage_type, k) else np.nan, dtype=arr1dnp.dtype
+        out = {
+            k: np.full(
+                shape,
+                0 if _empty_is_zero(storage_type, k) else np.nan,
+                dtype=arr1dnp.dtype,
+            )
+            for k, arr1dnp in data.items()
+        }
+    else:
+        if out.keys() != data.keys():
+            msg = f"out has keys {sorted(out)}, expected {sorted(data)}"
+            raise ValueError(msg)
+        for k, arr in out.items():
+            if arr.shape != tuple(shape):
+                msg = f"out[{k!r}] has shape {arr.shape}, expected {tuple(shape)}"
+                raise ValueError(msg)
+            if not accumulate:
+                arr.fill(0 if _empty_is_zero(storage_type, k) else np.nan)
+
+    targets = {k: _scatter_target(out[k], index) for k in data}
+
+    if accumulate and storage_type in {"mean", "weighted_mean"}:
+        current = _to_additive(
+            storage_type, {k: target[key] for k, (target, key) in targets.items()}
         )
+        new = _to_additive(storage_type, data)
+        data = _from_additive(storage_type, {k: current[k] + new[k] for k in new})
 
-        # Scatter sparse values back into dense array
-        full[tuple(index)] = arr1dnp
-        dense_storage[k] = full
+    # Scatter sparse values back into dense array
+    for k, (target, key) in targets.items():
+        if accumulate and storage_type not in {"mean", "weighted_mean"}:
+            target[key] += data[k]
+        else:
+            target[key] = data[k]
+
+    dense_storage = {"type": storage["type"]}
+    dense_storage.update(out)
 
     retval = copy.copy(sparse)
     retval["storage"] = dense_storage  # type: ignore[arg-type]
     return retval
+
+
+def _linear_index(index: np.ndarray, shape: Sequence[int], /) -> np.ndarray:
+    """
+    Convert a sparse index (2D or linear) to an ``int64`` linear index.
+    """
+    if index.ndim == 1:
+        return index.astype(np.int64)
+    return np.ravel_multi_index(tuple(index), shape)  # type: ignore[no-any-return]
+
+
+def merge_sparse(*hists: H, linear: bool | None = None) -> H:
+    """
+    Sum histograms with the same axes and storage type, keeping the result
+    sparse. Dense inputs are converted with :func:`to_sparse` first. Bins
+    filled in several inputs are combined with a segmented sum over the
+    sorted indices, so the cost is O(nnz log nnz) in the total number of
+    filled bins, independent of the number of bins in the histograms.
+    ``"mean"`` and ``"weighted_mean"`` storages are combined as weighted
+    means, like adding the histograms in boost-histogram.
+
+    The index of the result is linear if ``linear`` is True, 2D if it is
+    False, and matches the first input if it is None. Axes and metadata are
+    taken from the first input.
+    """
+
+    if not hists:
+        msg = "At least one histogram is required"
+        raise ValueError(msg)
+
+    first = hists[0]
+    storage_type = first["storage"]["type"]
+    shape = [_compute_axis_length(a) for a in first["axes"]]  # type: ignore[arg-type]
+    for hist in hists[1:]:
+        other_shape = [_compute_axis_length(a) for a in hist["axes"]]  # type: ignore[arg-type]
+        if other_shape != shape:
+            msg = f"Histogram shapes {shape} and {other_shape} do not match"
+            raise ValueError(msg)
+        if hist["storage"]["type"] != storage_type:
+            msg = f"Storage types {storage_type!r} and {hist['storage']['type']!r} do not match"
+            raise ValueError(msg)
+
+    # Empty (metadata-only) storages do not contribute anything
+    storages = [to_sparse(h)["storage"] for h in hists if len(h["storage"]) > 1]
+    if not storages:
+        return first
+
+    keys = [k for k in storages[0] if k not in {"type", "index"}]
+    additive = [
+        _to_additive(storage_type, {k: st[k] for k in keys})  # type: ignore[literal-required]
+        for st in storages
+    ]
+
+    # Scalar histograms are always dense
+    if not shape:
+        scalar_storage = {"type": storage_type}
+        scalar_storage.update(
+            _from_additive(
+                storage_type, {k: sum(a[k] for a in additive) for k in additive[0]}
+            )
+        )
+        scalar = copy.copy(first)
+        scalar["storage"] = scalar_storage  # type: ignore[arg-type]
+        return scalar
+
+    if linear is None:
+        first_index = first["storage"].get("index")
+        linear = first_index is not None and np.ndim(first_index) == 1
+
+    # Sort the combined indices, and find the start of each run of equal bins
+    flat = np.concatenate(
+        [_linear_index(np.asarray(st["index"]), shape) for st in storages]
+    )
+    order = np.argsort(flat, kind="stable")
+    flat = flat[order]
+    starts = np.flatnonzero(np.diff(flat, prepend=-1))
+    flat = flat[starts]
+
+    summed = {
+        k: np.add.reduceat(np.concatenate([a[k] for a in additive])[order], starts)
+        if len(starts)
+        else np.concatenate([a[k] for a in additive])
+        for k in additive[0]
+    }
+
+    index = (
+        flat.astype(_linear_index_dtype(shape))
+        if linear
+        else np.vstack(np.unravel_index(flat, shape))
+    )
+    merged_storage = {"type": storage_type, "index": index}
+    merged_storage.update(_from_additive(storage_type, summed))
+
+    merged = copy.copy(first)
+    merged["storage"] = merged_storage  # type: ignore[arg-type]
+    return merged
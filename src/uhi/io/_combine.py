@@ -0,0 +1,98 @@
+"""
+Helpers to combine storages. Every storage type is converted to a set of
+additive arrays ("moments"), which can be combined with any summing
+reduction (``np.sum``, ``np.add.reduceat``, etc.), and then converted back.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Mapping
+from typing import Any
+
+import numpy as np
+
+__all__ = ["_from_additive", "_to_additive"]
+
+
+def _to_additive(storage_type: str, arrays: Mapping[str, Any], /) -> dict[str, Any]:
+    """
+    Convert storage arrays (without ``"type"`` or ``"index"``) into additive
+    arrays. Counts and sums of weights are already additive; means and
+    variances are converted into weighted sums and sums of squares.
+    """
+    match storage_type:
+        case "int" | "double" | "weighted":
+            return {k: np.asarray(v) for k, v in arrays.items()}
+        case "mean":
+            counts = np.asarray(arrays["counts"], dtype=np.float64)
+            values = np.asarray(arrays["values"], dtype=np.float64)
+            variances = np.asarray(arrays["variances"], dtype=np.float64)
+            with np.errstate(invalid="ignore"):
+                deltas_squared = variances * (counts - 1)
+            deltas_squared = np.where(np.isfinite(deltas_squared), deltas_squared, 0.0)
+            return {
+                "counts": counts,
+                "sum": counts * values,
+                "sum_of_squares": deltas_squared + counts * values**2,
+            }
+        case "weighted_mean":
+            sum_of_weights = np.asarray(arrays["sum_of_weights"], dtype=np.float64)
+            sum_of_weights_squared = np.asarray(
+                arrays["sum_of_weights_squared"], dtype=np.float64
+            )
+            values = np.asarray(arrays["values"], dtype=np.float64)
+            variances = np.asarray(arrays["variances"], dtype=np.float64)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                effective = sum_of_weights - sum_of_weights_squared / sum_of_weights
+                deltas_squared = variances * effective
+            deltas_squared = np.where(np.isfinite(deltas_squared), deltas_squared, 0.0)
+            return {
+                "sum_of_weights": sum_of_weights,
+                "sum_of_weights_squared": sum_of_weights_squared,
+                "sum": sum_of_weights * values,
+                "sum_of_squares": deltas_squared + sum_of_weights * values**2,
+            }
+        case _:
+            msg = f"Unsupported storage type: {storage_type}"
+            raise TypeError(msg)
+
+
+def _from_additive(storage_type: str, arrays: Mapping[str, Any], /) -> dict[str, Any]:
+    """
+    Inverse of ``_to_additive``. Empty bins follow boost-histogram: means are
+    zero, and variances are zero for ``mean`` and NaN for ``weighted_mean``.
+    """
+    match storage_type:
+        case "int" | "double" | "weighted":
+            return dict(arrays)
+        case "mean":
+            counts = np.asarray(arrays["counts"])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = np.where(counts != 0, arrays["sum"] / counts, 0.0)
+                deltas_squared = arrays["sum_of_squares"] - counts * values**2
+                variances = np.where(counts == 1, np.nan, deltas_squared / (counts - 1))
+            return {
+                "counts": counts,
+                "values": values,
+                "variances": np.where(counts != 0, variances, 0.0),
+            }
+        case "weighted_mean":
+            sum_of_weights = np.asarray(arrays["sum_of_weights"])
+            sum_of_weights_squared = np.asarray(arrays["sum_of_weights_squared"])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                values = np.where(
+                    sum_of_weights != 0, arrays["sum"] / sum_of_weights, 0.0
+                )
+                deltas_squared = arrays["sum_of_squares"] - sum_of_weights * values**2
+                variances = deltas_squared / (
+                    sum_of_weights - sum_of_weights_squared / sum_of_weights
+                )
+            return {
+                "sum_of_weights": sum_of_weights,
+                "sum_of_weights_squared": sum_of_weights_squared,
+                "values": values,
+                "variances": variances,
+            }
+        case _:
+            msg = f"Unsupported storage type: {storage_type}"
+            raise TypeError(msg)
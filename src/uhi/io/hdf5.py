@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+import math
+import os
 import typing
-from typing import Any
+from collections.abc import Iterable
+from typing import TYPE_CHECKING, Any, Literal
 
 import h5py
 import numpy as np
@@ -15,9 +18,21 @@ from ..typing.serialization import (
     ToUHIHistogram,
 )
 from . import ARRAY_KEYS
+from ._combine import _from_additive, _to_additive
 from ._common import _check_uhi_schema_version, _convert_input
 
-__all__ = ["read", "write"]
+if TYPE_CHECKING:
+    from ..prefix_sum import PrefixSum
+
+__all__ = [
+    "Checkpoint",
+    "read",
+    "read_prefix_sum",
+    "read_stacked",
+    "write",
+    "write_prefix_sum",
+    "write_stacked",
+]
 
 
 def __dir__() -> list[str]:
@@ -57,9 +72,9 @@ def _create_dataset(
     Create an HDF5 dataset, applying compression only when the element count
     meets the minimum threshold.
 
-    ``data`` may be a NumPy array or a plain Python list (e.g. string
-    categories). The size check uses ``len()`` for lists and ``.size`` for
-    arrays so that the original type is passed through to h5py unchanged.
+    ``data`` may be a NumPy array or a plain Python list. The size check uses
+    ``len()`` for lists and ``.size`` for arrays so that the original type is
+    passed through to h5py unchanged.
     """
     size = data.size if isinstance(data, np.ndarray) else len(data)
     if size < min_compress_elements:
@@ -73,6 +88,63 @@ def _create_dataset(
         )
 
 
+def _storage_datasets(
+    storage: AnyStorageIR, layout: Literal["split", "compound"], /
+) -> dict[str, Any]:
+    """
+    The datasets to write for a storage, by name. The compound layout packs
+    all the data fields into one structured array named ``"compound"``.
+    """
+    arrays = {k: v for k, v in storage.items() if k != "type"}
+    if layout == "split":
+        return arrays
+    if layout != "compound":
+        msg = f"Unknown layout {layout!r}, must be 'split' or 'compound'"  # type: ignore[unreachable]
+        raise ValueError(msg)
+
+    datasets = {"index": arrays.pop("index")} if "index" in arrays else {}
+    if arrays:
+        fields = {k: np.asarray(v) for k, v in arrays.items()}
+        shape = next(iter(fields.values())).shape
+        compound = np.empty(shape, dtype=[(k, v.dtype) for k, v in fields.items()])
+        for k, v in fields.items():
+            compound[k] = v
+        datasets["compound"] = compound
+    return datasets
+
+
+def _storage_fields(name: str, data: np.ndarray, /) -> dict[str, np.ndarray]:
+    """
+    Inverse of ``_storage_datasets`` for one dataset. Compound datasets are
+    returned as field views into the single array that was read.
+    """
+    if data.dtype.names is None:
+        return {name: data}
+    return {field: data[field] for field in data.dtype.names}
+
+
+def _encode_categories(categories: list[int] | list[str], /) -> np.ndarray:
+    """
+    Convert categories to an array in one step. Strings are stored as a
+    single fixed-length UTF-8 dataset rather than one object per category;
+    the dtype carries the UTF-8 charset, so h5py does not label it ASCII.
+    """
+    if categories and isinstance(categories[0], str):
+        encoded = np.char.encode(np.asarray(categories, dtype=np.str_), "utf-8")
+        return encoded.astype(h5py.string_dtype("utf-8", encoded.dtype.itemsize))
+    return np.asarray(categories)
+
+
+def _decode_categories(data: np.ndarray, /) -> list[int] | list[str]:
+    """
+    Inverse of ``_encode_categories``. Fixed-length and variable-length
+    (written by older versions of uhi) strings are both decoded in bulk.
+    """
+    if data.dtype.kind in "SO":
+        return np.char.decode(data.astype(np.bytes_), "utf-8").tolist()  # type: ignore[no-any-return]
+    return data.tolist()  # type: ignore[no-any-return]
+
+
 def write(
     grp: h5py.Group,
     /,
@@ -81,12 +153,16 @@ def write(
     compression: str = "gzip",
     compression_opts: int = 4,
     min_compress_elements: int = 1_000,
+    layout: Literal["split", "compound"] = "split",
 ) -> None:
     """
     Write a histogram to an HDF5 group. Arrays larger than
     `min_compress_elements` will be compressed; set to 0 to compress all
     arrays. The `compression` and `compression_opts` arguments are passed
-    through.
+    through. The default `layout="split"` writes one dataset per storage
+    field; `layout="compound"` writes all the fields (except the sparse
+    index) as a single compound-dtype dataset, which is faster to read for
+    the multi-field storages.
     """
     histogram = _convert_input(histogram)
     # All referenced objects will be stored inside of /{name}/ref_axes
@@ -129,7 +205,7 @@ def write(
             _create_dataset(
                 ax_group,
                 "categories",
-                ax_cats,
+                _encode_categories(ax_cats),
                 compression=compression,
                 compression_opts=compression_opts,
                 min_compress_elements=min_compress_elements,
@@ -142,9 +218,7 @@ def write(
 
     storage_grp.attrs["type"] = storage_type
 
-    for key, val3 in histogram["storage"].items():
-        if key == "type":
-            continue
+    for key, val3 in _storage_datasets(histogram["storage"], layout).items():
         _create_dataset(
             storage_grp,
             key,
@@ -155,6 +229,135 @@ def write(
         )
 
 
+def _changed_elements(old: np.ndarray, new: np.ndarray, /) -> np.ndarray:
+    """
+    Elementwise "has this changed" mask. The comparison is done on the raw
+    bytes, so NaNs (used for empty ``weighted_mean`` variances) compare equal
+    to themselves and compound dtypes are handled too.
+    """
+    old_bytes = np.ascontiguousarray(old).reshape(-1).view(np.uint8)
+    new_bytes = np.ascontiguousarray(new).reshape(-1).view(np.uint8)
+    itemsize = new.dtype.itemsize
+    changed = (old_bytes != new_bytes).reshape(-1, itemsize).any(axis=1)
+    return changed.reshape(new.shape)  # type: ignore[no-any-return]
+
+
+def _dirty_chunks(
+    changed: np.ndarray, chunks: tuple[int, ...] | None, /
+) -> list[tuple[slice, ...]]:
+    """
+    Reduce an elementwise changed mask to the list of chunks (as tuples of
+    slices) that contain at least one change. A contiguous dataset
+    (``chunks=None``) is a single chunk.
+    """
+    if chunks is None or changed.ndim == 0:
+        return [tuple(slice(None) for _ in changed.shape)] if changed.any() else []
+
+    grid = [
+        -(-size // chunk) for size, chunk in zip(changed.shape, chunks, strict=True)
+    ]
+    padded_shape = [g * c for g, c in zip(grid, chunks, strict=True)]
+    if list(changed.shape) != padded_shape:
+        padded = np.zeros(padded_shape, dtype=bool)
+        padded[tuple(slice(0, s) for s in changed.shape)] = changed
+        changed = padded
+
+    # Interleave (grid, chunk) dimensions and reduce over the chunk ones
+    blocked = changed.reshape(
+        [n for pair in zip(grid, chunks, strict=True) for n in pair]
+    )
+    dirty = blocked.any(axis=tuple(range(1, 2 * len(chunks), 2)))
+
+    return [
+        tuple(slice(i * c, (i + 1) * c) for i, c in zip(pos, chunks, strict=True))
+        for pos in np.argwhere(dirty)
+    ]
+
+
+def _count_chunks(shape: tuple[int, ...], chunks: tuple[int, ...] | None, /) -> int:
+    if chunks is None:
+        return 1
+    return math.prod(
+        -(-size // chunk) for size, chunk in zip(shape, chunks, strict=True)
+    )
+
+
+class Checkpoint:
+    """
+    Write a histogram to an HDF5 group repeatedly, only rewriting what changed.
+
+    The first call to :meth:`write` writes the full histogram (with
+    :func:`write`, using the keyword arguments given here), unless the group
+    already contains a histogram, in which case that is used as the last
+    written state. Later calls compare each dense storage array with the last
+    written state chunk by chunk (using the HDF5 chunking of the dataset), and
+    only the chunks that changed are written. Axes and metadata are assumed to
+    be unchanged between checkpoints; the storage type, keys, and shapes must
+    match.
+    """
+
+    __slots__ = ("_grp", "_last", "_write_kwargs")
+
+    def __init__(self, grp: h5py.Group, /, **write_kwargs: Any) -> None:
+        self._grp = grp
+        self._write_kwargs = write_kwargs
+        self._last: dict[str, np.ndarray] | None = None
+
+        if "storage" in grp:
+            storage_grp = grp["storage"]
+            assert isinstance(storage_grp, h5py.Group)
+            self._last = {key: np.array(storage_grp[key]) for key in storage_grp}
+
+    def write(self, histogram: AnyHistogramIR | ToUHIHistogram, /) -> int:
+        """
+        Checkpoint the histogram. Returns the number of chunks written; a full
+        write counts every chunk.
+        """
+        histogram = _convert_input(histogram)
+        storage = histogram["storage"]
+        if "index" in storage:
+            msg = "Checkpointing requires a dense histogram"
+            raise ValueError(msg)
+
+        if self._last is None:
+            write(self._grp, histogram, **self._write_kwargs)
+            storage_grp = self._grp["storage"]
+            assert isinstance(storage_grp, h5py.Group)
+            self._last = {key: np.array(storage_grp[key]) for key in storage_grp}
+            return sum(
+                _count_chunks(ds.shape, ds.chunks) for ds in storage_grp.values()
+            )
+
+        storage_grp = self._grp["storage"]
+        assert isinstance(storage_grp, h5py.Group)
+        if storage_grp.attrs["type"] != storage["type"]:
+            msg = f"Storage type changed from {storage_grp.attrs['type']!r} to {storage['type']!r}"
+            raise ValueError(msg)
+        layout: Literal["split", "compound"] = (
+            "compound" if "compound" in self._last else "split"
+        )
+        datasets = _storage_datasets(storage, layout)
+        if datasets.keys() != self._last.keys():
+            msg = f"Storage datasets {sorted(datasets)} do not match checkpoint {sorted(self._last)}"
+            raise ValueError(msg)
+
+        written = 0
+        for key in sorted(datasets):
+            dataset = storage_grp[key]
+            new = np.asarray(datasets[key], dtype=dataset.dtype)
+            old = self._last[key]
+            if new.shape != old.shape:
+                msg = f"Shape of {key!r} changed from {old.shape} to {new.shape}"
+                raise ValueError(msg)
+
+            for chunk in _dirty_chunks(_changed_elements(old, new), dataset.chunks):
+                dataset[chunk] = new[chunk]
+                old[chunk] = new[chunk]
+                written += 1
+
+        return written
+
+
 def _convert_item(name: str, item: Any, /) -> Any:
     """
     Convert an HDF5 item to a native Python type.
@@ -198,16 +401,17 @@ def _convert_axes(group: h5py.Group | h5py.Dataset | h5py.Datatype) -> AnyAxisIR
     if "categories" in group:
         categories = group["categories"]
         assert isinstance(categories, h5py.Dataset)
-        axis["categories"] = [_convert_item("", c) for c in categories]
+        axis["categories"] = _decode_categories(categories[()])
 
     _read_metadata_writer_info(axis, group)
 
     return axis
 
 
-def read(grp: h5py.Group, /) -> HistogramIR:
+def _read_structure(grp: h5py.Group, /) -> AnyHistogramIR:
     """
-    Read a histogram from an HDF5 group.
+    Read everything except the storage arrays from an HDF5 group; the storage
+    only has its ``"type"``.
     """
     uhi_schema = _convert_item("", grp.attrs["uhi_schema"])
     _check_uhi_schema_version(uhi_schema)
@@ -224,10 +428,174 @@ def read(grp: h5py.Group, /) -> HistogramIR:
     storage_grp = grp["storage"]
     assert isinstance(storage_grp, h5py.Group)
     storage = AnyStorageIR(type=storage_grp.attrs["type"])
-    for key in storage_grp:
-        storage[key] = np.asarray(storage_grp[key])  # type: ignore[literal-required]
 
     histogram_dict = AnyHistogramIR(uhi_schema=uhi_schema, axes=axes, storage=storage)
     _read_metadata_writer_info(histogram_dict, grp)
 
+    return histogram_dict
+
+
+def read(grp: h5py.Group, /) -> HistogramIR:
+    """
+    Read a histogram from an HDF5 group.
+    """
+    histogram_dict = _read_structure(grp)
+
+    storage_grp = grp["storage"]
+    assert isinstance(storage_grp, h5py.Group)
+    if "stacked" in storage_grp.attrs:
+        msg = "This group holds stacked histograms, use read_stacked instead"
+        raise ValueError(msg)
+
+    storage = histogram_dict["storage"]
+    for key, dataset in storage_grp.items():
+        storage.update(_storage_fields(key, np.asarray(dataset)))  # type: ignore[typeddict-item]
+
     return histogram_dict  # type: ignore[return-value]
+
+
+def write_stacked(
+    grp: h5py.Group,
+    /,
+    sources: Iterable[tuple[str | os.PathLike[str], str]],
+) -> None:
+    """
+    Write an index of histograms stored in other files to an HDF5 group. Each
+    source is a ``(filename, group_path)`` pair pointing at a histogram
+    written by :func:`write`; all of them must be dense and have the same
+    axes and storage type. The axes and metadata are copied from the first
+    source, and each storage array becomes an HDF5 virtual dataset with an
+    extra leading dimension, one entry per source. No bin data is copied.
+    Use :func:`read_stacked` to combine them.
+    """
+    sources = [(os.fspath(filename), path) for filename, path in sources]
+    if not sources:
+        msg = "At least one source is required"
+        raise ValueError(msg)
+
+    layouts: dict[str, h5py.VirtualLayout] = {}
+    for i, (filename, path) in enumerate(sources):
+        with h5py.File(filename, "r") as h5_file:
+            src_grp = h5_file[path]
+            assert isinstance(src_grp, h5py.Group)
+            src_storage = src_grp["storage"]
+            assert isinstance(src_storage, h5py.Group)
+            if "index" in src_storage:
+                msg = (
+                    f"{filename}:{path} is sparse; only dense histograms can be stacked"
+                )
+                raise ValueError(msg)
+
+            if i == 0:
+                structure = _read_structure(src_grp)
+                layouts = {
+                    key: h5py.VirtualLayout(
+                        shape=(len(sources), *ds.shape), dtype=ds.dtype
+                    )
+                    for key, ds in src_storage.items()
+                }
+            elif src_storage.attrs["type"] != structure["storage"]["type"]:
+                msg = f"{filename}:{path} has storage type {src_storage.attrs['type']!r}, expected {structure['storage']['type']!r}"
+                raise ValueError(msg)
+            elif src_storage.keys() != layouts.keys():
+                msg = f"{filename}:{path} has storage keys {sorted(src_storage)}, expected {sorted(layouts)}"
+                raise ValueError(msg)
+
+            for key, layout in layouts.items():
+                dataset = src_storage[key]
+                if (dataset.shape, dataset.dtype) != (layout.shape[1:], layout.dtype):
+                    msg = f"{filename}:{path} storage {key!r} is {dataset.dtype}{dataset.shape}, expected {layout.dtype}{layout.shape[1:]}"
+                    raise ValueError(msg)
+                layout[i] = h5py.VirtualSource(
+                    filename, f"{src_grp.name}/storage/{key}", shape=dataset.shape
+                )
+
+    write(grp, structure)
+    storage_grp = grp["storage"]
+    assert isinstance(storage_grp, h5py.Group)
+    storage_grp.attrs["stacked"] = len(sources)
+    for key, layout in layouts.items():
+        storage_grp.create_virtual_dataset(key, layout)
+
+
+def read_stacked(grp: h5py.Group, /, *, block_size: int = 1) -> HistogramIR:
+    """
+    Read a group written by :func:`write_stacked`, combining all the stacked
+    histograms into one. ``block_size`` sources are read and reduced at a
+    time, so memory use is bounded by ``block_size + 1`` histograms. Mean
+    storages are combined correctly (not just summed).
+    """
+    histogram_dict = _read_structure(grp)
+
+    storage_grp = grp["storage"]
+    assert isinstance(storage_grp, h5py.Group)
+    storage_type = histogram_dict["storage"]["type"]
+    n_sources = int(storage_grp.attrs["stacked"])
+
+    total: dict[str, Any] | None = None
+    for start in range(0, n_sources, block_size):
+        block = {
+            field: arr
+            for key, ds in storage_grp.items()
+            for field, arr in _storage_fields(
+                key, ds[start : start + block_size]
+            ).items()
+        }
+        reduced = {
+            key: arr.sum(axis=0)
+            for key, arr in _to_additive(storage_type, block).items()
+        }
+        if total is None:
+            total = reduced
+        else:
+            for key, arr in reduced.items():
+                total[key] += arr
+
+    if total is not None:
+        histogram_dict["storage"].update(_from_additive(storage_type, total))  # type: ignore[typeddict-item]
+
+    return histogram_dict  # type: ignore[return-value]
+
+
+def write_prefix_sum(
+    grp: h5py.Group,
+    /,
+    prefix_sum: PrefixSum,
+    *,
+    compression: str = "gzip",
+    compression_opts: int = 4,
+    min_compress_elements: int = 1_000,
+) -> None:
+    """
+    Write a :class:`uhi.prefix_sum.PrefixSum` into the group of a histogram
+    written by :func:`write`, as a ``prefix_sum`` subgroup, so it does not
+    need to be rebuilt after reading. Compression works as in :func:`write`.
+    """
+    prefix_grp = grp.create_group("prefix_sum")
+    prefix_grp.attrs["type"] = prefix_sum.storage_type
+    for key, table in prefix_sum.tables.items():
+        _create_dataset(
+            prefix_grp,
+            key,
+            table,
+            compression=compression,
+            compression_opts=compression_opts,
+            min_compress_elements=min_compress_elements,
+        )
+
+
+def read_prefix_sum(grp: h5py.Group, /) -> PrefixSum:
+    """
+    Read a :class:`uhi.prefix_sum.PrefixSum` written by
+    :func:`write_prefix_sum`. Only the axes of the histogram are read, not its
+    storage.
+    """
+    from ..prefix_sum import PrefixSum  # noqa: PLC0415
+
+    structure = _read_structure(grp)
+    prefix_grp = grp["prefix_sum"]
+    assert isinstance(prefix_grp, h5py.Group)
+    tables = {key: np.asarray(dataset) for key, dataset in prefix_grp.items()}
+    return PrefixSum.from_tables(
+        structure["axes"], str(prefix_grp.attrs["type"]), tables
+    )
@@ -3,7 +3,7 @@ from __future__ import annotations
 import functools
 import json
 import zipfile
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import numpy as np
 
@@ -11,7 +11,10 @@ from ..typing.serialization import AnyHistogramIR, ToUHIHistogram
 from . import ARRAY_KEYS
 from ._common import _check_uhi_schema_version, _convert_input
 
-__all__ = ["read", "write"]
+if TYPE_CHECKING:
+    from ..prefix_sum import PrefixSum
+
+__all__ = ["read", "read_prefix_sum", "write", "write_prefix_sum"]
 
 
 def __dir__() -> list[str]:
@@ -73,3 +76,40 @@ def read(zip_file: zipfile.ZipFile, /, name: str) -> dict[str, Any]:
         output: dict[str, Any] = json.load(f, object_hook=object_hook)
         _check_uhi_schema_version(output["uhi_schema"])
         return output
+
+
+def write_prefix_sum(
+    zip_file: zipfile.ZipFile, /, name: str, prefix_sum: PrefixSum
+) -> None:
+    """
+    Write a :class:`uhi.prefix_sum.PrefixSum` next to the histogram ``name``
+    written by :func:`write`, so it does not need to be rebuilt after reading.
+    """
+    tables = {}
+    for key, table in prefix_sum.tables.items():
+        path = f"{name}_prefix_sum_{key}.npy"
+        with zip_file.open(path, "w") as f:
+            np.save(f, table)
+        tables[key] = path
+
+    info = {"type": prefix_sum.storage_type, "tables": tables}
+    zip_file.writestr(f"{name}_prefix_sum.json", json.dumps(info))
+
+
+def read_prefix_sum(zip_file: zipfile.ZipFile, /, name: str) -> PrefixSum:
+    """
+    Read a :class:`uhi.prefix_sum.PrefixSum` written by
+    :func:`write_prefix_sum`. Only the axes of the histogram are read, not its
+    storage.
+    """
+    from ..prefix_sum import PrefixSum  # noqa: PLC0415
+
+    with zip_file.open(f"{name}.json") as f:
+        histogram = json.load(f)
+    _check_uhi_schema_version(histogram["uhi_schema"])
+    axes = [_object_hook(axis, zip_file=zip_file) for axis in histogram["axes"]]
+
+    with zip_file.open(f"{name}_prefix_sum.json") as f:
+        info = json.load(f)
+    tables = {key: np.load(zip_file.open(path)) for key, path in info["tables"].items()}
+    return PrefixSum.from_tables(axes, info["type"], tables)  # type: ignore[arg-type]
@@ -0,0 +1,181 @@
+"""
+Evaluate histograms of the intermediate representation as lookup tables, such
+as scale factors binned in the kinematics of a candidate.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Literal
+
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
+from .axis import Axis, Category, from_ir
+from .io import from_sparse
+from .io._common import _convert_input
+from .typing.serialization import AnyHistogramIR, HistogramIR, ToUHIHistogram
+
+__all__ = ["FlowMode", "LookupTable"]
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+FlowMode = Literal["clamp", "flow", "nan"]
+
+
+class LookupTable:
+    """
+    Look up the bin contents of a histogram for arrays of coordinates, one
+    array per axis, broadcast together. Each axis finds its bins with the
+    vectorized lookup of :mod:`uhi.axis`, then the storage is read with a
+    single flat ``take``.
+
+    ``flow`` sets what happens to coordinates outside of the bins, for all the
+    axes or per axis:
+
+    * ``"clamp"`` (the default) uses the first or last bin;
+    * ``"flow"`` uses the flow bins where they are stored, and clamps
+      otherwise;
+    * ``"nan"`` gives NaN.
+
+    Values that are not a category of a category axis use the overflow bin
+    unless ``flow="nan"``; if there is no overflow bin, they give NaN.
+    Results are always ``float64``.
+    """
+
+    __slots__ = ("_strides", "_tables", "axes", "flow", "storage")
+
+    def __init__(
+        self,
+        hist: HistogramIR | AnyHistogramIR | ToUHIHistogram,
+        /,
+        *,
+        flow: FlowMode | Sequence[FlowMode] = "clamp",
+    ) -> None:
+        any_hist = _convert_input(hist)  # type: ignore[arg-type]
+        if "index" in any_hist["storage"]:
+            any_hist = from_sparse(any_hist)
+
+        #: The lookup axes
+        self.axes: list[Axis] = [from_ir(axis) for axis in any_hist["axes"]]
+        #: The flow mode of each axis
+        self.flow: tuple[FlowMode, ...] = (
+            (flow,) * len(self.axes) if isinstance(flow, str) else tuple(flow)
+        )
+        if len(self.flow) != len(self.axes):
+            msg = f"Expected {len(self.axes)} flow modes, got {len(self.flow)}"
+            raise ValueError(msg)
+        for mode in self.flow:
+            if mode not in {"clamp", "flow", "nan"}:
+                msg = f"Unknown flow mode {mode!r}, expected 'clamp', 'flow', or 'nan'"
+                raise ValueError(msg)
+
+        #: The storage of the histogram
+        self.storage = any_hist["storage"]
+        extents = [axis.extent for axis in self.axes]
+        self._strides = [int(np.prod(extents[i + 1 :])) for i in range(len(extents))]
+        self._tables: dict[str, NDArray[np.float64]] = {}
+
+    def __repr__(self) -> str:
+        return f"LookupTable({self.storage['type']!r}, axes={self.axes})"
+
+    def _table(self, field: str) -> NDArray[np.float64]:
+        table = self._tables.get(field)
+        if table is None:
+            if field == "type" or field not in self.storage:
+                msg = f"Storage {self.storage['type']!r} has no field {field!r}"
+                raise ValueError(msg)
+            values = self.storage[field]  # type: ignore[literal-required]
+            table = np.ascontiguousarray(values, dtype=np.float64).reshape(-1)
+            self._tables[field] = table
+        return table
+
+    def _positions(
+        self, axis: Axis, mode: FlowMode, values: NDArray[Any]
+    ) -> tuple[NDArray[np.intp], NDArray[np.bool_] | None]:
+        """
+        The storage positions of the values on one axis, and the mask of the
+        values that have no bin (or ``None`` if all have one).
+        """
+        index = axis.index(values)
+        missing = (
+            index == axis.size
+            if isinstance(axis, Category) and (mode == "nan" or not axis.overflow)
+            else None
+        )
+        if mode == "flow":
+            pos = np.clip(index + axis.underflow, 0, axis.extent - 1)
+        elif isinstance(axis, Category) and axis.overflow and mode == "clamp":
+            pos = index
+        else:
+            pos = np.clip(index, 0, axis.size - 1) + axis.underflow
+        if mode == "nan":
+            missing = (index < 0) | (index >= axis.size)
+        return pos, missing
+
+    def _evaluate(
+        self, table: NDArray[np.float64], coords: Sequence[NDArray[Any]]
+    ) -> NDArray[np.float64]:
+        flat = np.zeros(len(coords[0]) if coords else 1, dtype=np.intp)
+        invalid: NDArray[np.bool_] | None = None
+        for axis, mode, stride, values in zip(
+            self.axes, self.flow, self._strides, coords, strict=True
+        ):
+            pos, missing = self._positions(axis, mode, values)
+            if stride != 1:
+                pos *= stride
+            flat += pos
+            if missing is not None:
+                invalid = missing if invalid is None else invalid | missing
+        result = table.take(flat)
+        if invalid is not None:
+            result[invalid] = np.nan
+        return result
+
+    def __call__(
+        self,
+        *coords: ArrayLike,
+        field: str = "values",
+        threads: int = 1,
+        chunk_size: int = 1 << 18,
+    ) -> NDArray[np.float64]:
+        """
+        Look up ``field`` of the storage (``"values"`` by default; mean
+        storages give the mean) for the coordinates. With ``threads`` above
+        one, the coordinates are split into chunks of ``chunk_size`` that are
+        looked up on a thread pool; NumPy releases the GIL for most of the
+        work.
+        """
+        if len(coords) != len(self.axes):
+            msg = f"Expected {len(self.axes)} coordinate arrays, got {len(coords)}"
+            raise ValueError(msg)
+        table = self._table(field)
+        arrays = np.broadcast_arrays(*(np.asarray(c) for c in coords))
+        shape = arrays[0].shape if arrays else ()
+        flat = [a.reshape(-1) for a in arrays]
+        size = int(np.prod(shape))
+
+        if threads <= 1 or size <= chunk_size:
+            return self._evaluate(table, flat).reshape(shape)
+
+        out = np.empty(size, dtype=np.float64)
+
+        def work(start: int) -> None:
+            chunk = [a[start : start + chunk_size] for a in flat]
+            out[start : start + chunk_size] = self._evaluate(table, chunk)
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            # Consume the iterator to surface any exception
+            list(pool.map(work, range(0, size, chunk_size)))
+        return out.reshape(shape)
+
+    def variances(self, *coords: ArrayLike, **kwargs: Any) -> NDArray[np.float64]:
+        """
+        Look up the variances, for storages that have them. Takes the same
+        arguments as calling the table.
+        """
+        return self(*coords, field="variances", **kwargs)
@@ -1,28 +1,118 @@
 from __future__ import annotations
 
+import contextlib
 import functools
+import hashlib
+import itertools
 import json
+import marshal
+import os
+import re
 import sys
-from collections.abc import Callable
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
 from importlib import resources
 from pathlib import Path
-from typing import Any
+from typing import IO, Any
 
 histogram_file = resources.files("uhi") / "resources/histogram.schema.json"
 
-__all__ = ["histogram_file", "validate"]
+__all__ = ["histogram_file", "iter_validate", "validate", "validate_ir"]
 
 
 def __dir__() -> list[str]:
     return __all__
 
 
+def _cache_dir() -> Path | None:
+    """
+    The directory for the compiled validator, ``$UHI_CACHE_DIR``, or ``None``
+    if it is not set: executable code is only cached on disk on request.
+    """
+    if os.environ.get("UHI_CACHE_DIR"):
+        return Path(os.environ["UHI_CACHE_DIR"])
+    return None
+
+
+def _default_cache_dir() -> Path:
+    """
+    The cache directory used by the command line with ``--cache``: ``uhi``
+    inside ``$XDG_CACHE_HOME`` (default ``~/.cache``).
+    """
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "uhi"
+
+
+@contextlib.contextmanager
+def _enable_cache_dir() -> Iterator[None]:
+    """
+    Set ``$UHI_CACHE_DIR`` to the default cache directory if it is not set,
+    for this process and the worker processes it starts.
+    """
+    if os.environ.get("UHI_CACHE_DIR"):
+        yield
+        return
+    os.environ["UHI_CACHE_DIR"] = str(_default_cache_dir())
+    try:
+        yield
+    finally:
+        del os.environ["UHI_CACHE_DIR"]
+
+
+def _load_code(path: Path, /) -> Any:
+    """
+    Load cached compiled code, or return ``None`` if it is missing or unusable.
+    """
+    try:
+        with path.open("rb") as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _store_code(path: Path, code: Any, /) -> None:
+    """
+    Write compiled code to the cache atomically, ignoring failures.
+    """
+    with contextlib.suppress(OSError):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            marshal.dump(code, f)
+        tmp.replace(path)
+
+
 @functools.cache
 def _histogram_schema() -> Callable[[dict[str, Any]], None]:
+    """
+    The compiled schema validator. Generating the validator takes much longer
+    than loading it, so if ``$UHI_CACHE_DIR`` is set, the compiled code is
+    cached there, keyed by the schema, the fastjsonschema version, and the
+    Python version. Otherwise, or if the cache is not usable, the schema is
+    compiled in memory.
+    """
     import fastjsonschema  # noqa: PLC0415
 
-    with histogram_file.open(encoding="utf-8") as f:
-        return fastjsonschema.compile(json.load(f))  # type: ignore[no-any-return]
+    schema = histogram_file.read_bytes()
+    cache_dir = _cache_dir()
+    path = None
+    if cache_dir is not None:
+        digest = hashlib.sha256(schema).hexdigest()[:16]
+        tag = sys.implementation.cache_tag
+        path = cache_dir / f"histogram_schema_{digest}_{fastjsonschema.VERSION}.{tag}"
+
+    code = _load_code(path) if path is not None else None
+    if code is None:
+        source = fastjsonschema.compile_to_code(json.loads(schema))
+        # The first function generated validates the whole document
+        match = re.search(r"^def (\w+)\(", source, flags=re.MULTILINE)
+        assert match is not None
+        source += f"\n\nvalidate = {match.group(1)}\n"
+        code = compile(source, "<uhi histogram schema>", "exec")
+        if path is not None:
+            _store_code(path, code)
+
+    namespace: dict[str, Any] = {}
+    exec(code, namespace)
+    return namespace["validate"]  # type: ignore[no-any-return]
 
 
 def validate(data: dict[str, Any]) -> None:
@@ -31,25 +121,357 @@ def validate(data: dict[str, Any]) -> None:
     validator(data)
 
 
-def main(*files: str) -> None:
-    """Validate histogram files."""
-    import fastjsonschema  # noqa: PLC0415
+def validate_ir(hist: Mapping[str, Any], /) -> None:
+    """
+    Validate a single in-memory histogram (the intermediate representation,
+    possibly containing NumPy arrays), without converting it to JSON. Unlike
+    :func:`validate`, this also checks the storage dtypes and that the shapes
+    of the storage arrays match the axes, including the bounds of sparse
+    indices. Raises ``ValueError`` on the first problem found. Does not
+    require ``fastjsonschema``.
+    """
+    from ._validate_ir import validate_ir as _validate_ir  # noqa: PLC0415
+
+    _validate_ir(hist)
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Constants, and the ends of numbers ("1." or "1e-") and of \uXXXX escapes,
+# that can be cut off by the end of the buffer
+_CONSTANTS = ("true", "false", "null", "NaN", "Infinity", "-Infinity")
+_PARTIAL_TOKEN = re.compile(r"[.eE][-+]?|u[0-9a-fA-F]{0,4}")
+
+
+def _cut_off(error: json.JSONDecodeError, /) -> bool:
+    """
+    Whether a decoding error might be due to the text ending too early, so
+    that it could parse with more text: strings that are not closed, and
+    errors at the end of the text or in an incomplete token at the end.
+    """
+    if error.msg.startswith("Unterminated string"):
+        return True
+    if len(error.doc) - error.pos > len("-Infinity"):
+        return False
+    tail = error.doc[error.pos :]
+    return any(c.startswith(tail) for c in _CONSTANTS) or bool(
+        _PARTIAL_TOKEN.fullmatch(tail)
+    )
+
+
+class _ObjectStream:
+    """
+    Incrementally parse the entries of a top-level JSON object from a text
+    file, holding only about one entry in memory at a time.
+    """
+
+    def __init__(self, f: IO[str], chunk_size: int) -> None:
+        self._file = f
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+        # Position of the start of the buffer in the file, for error messages
+        self._offset = 0
+        self._line = 1
+        self._column = 1
+
+    def _read(self, size: int = 0) -> bool:
+        """
+        Read at least one chunk, and at least ``size`` characters if the file
+        has them, dropping the part of the buffer that has been parsed. The
+        chunks are joined once, so the pending text is copied once per call,
+        not once per chunk. Returns False if nothing was read.
+        """
+        if self._eof:
+            return False
+        chunks = []
+        total = 0
+        while True:
+            data = self._file.read(self._chunk_size)
+            if not data:
+                self._eof = True
+                break
+            chunks.append(data)
+            total += len(data)
+            if total >= size:
+                break
+        if not chunks:
+            return False
+        # Drop the part that has already been parsed
+        dropped = self._buffer[: self._pos]
+        self._offset += len(dropped)
+        if (newlines := dropped.count("\n")) > 0:
+            self._line += newlines
+            self._column = len(dropped) - dropped.rfind("\n")
+        else:
+            self._column += len(dropped)
+        self._buffer = "".join([self._buffer[self._pos :], *chunks])
+        self._pos = 0
+        return True
+
+    def _error(self, msg: str, pos: int) -> json.JSONDecodeError:
+        error = json.JSONDecodeError(msg, self._buffer, pos)
+        error.pos += self._offset
+        if error.lineno == 1:
+            error.colno += self._column - 1
+        error.lineno += self._line - 1
+        error.args = (
+            f"{msg}: line {error.lineno} column {error.colno} (char {error.pos})",
+        )
+        return error
+
+    def _peek(self) -> str:
+        while True:
+            match = _WHITESPACE.match(self._buffer, self._pos)
+            assert match is not None
+            self._pos = match.end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read():
+                return ""
+
+    def _expect(self, chars: str) -> str:
+        char = self._peek()
+        if not char or char not in chars:
+            expected = " or ".join(repr(c) for c in chars)
+            msg = f"Expecting {expected}, got {char or 'end of file'!r}"
+            raise self._error(msg, self._pos)
+        self._pos += 1
+        return char
 
-    retval = 0
+    def _decode(self) -> Any:
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                # Only read more if the entry might just be incomplete, so a
+                # syntax error does not read the rest of a large file
+                if self._eof or not _cut_off(e):
+                    raise self._error(e.msg, e.pos) from None
+            else:
+                # A number at the end of the buffer might continue
+                if end < len(self._buffer) or self._eof:
+                    self._pos = end
+                    return value
+            # Double the buffered text before trying again, so large entries
+            # are only parsed and copied a few times
+            self._read(len(self._buffer) - self._pos)
 
-    for file in files:
-        with Path(file).open(encoding="utf-8") as f:
-            data = json.load(f)
-        try:
-            validate(data)
-        except fastjsonschema.JsonSchemaValueException as e:
-            print(f"ERROR {file}: {e.message}")  # noqa: T201
-            retval = 1
+    def __iter__(self) -> Iterator[tuple[str, Any]]:
+        self._expect("{")
+        if self._peek() == "}":
+            self._pos += 1
         else:
-            print(f"OK {file}")  # noqa: T201
+            while True:
+                if self._peek() != '"':
+                    self._expect('"')
+                key = self._decode()
+                self._expect(":")
+                yield key, self._decode()
+                if self._expect(",}") == "}":
+                    break
+        if self._peek():
+            msg = "Extra data after the end of the object"
+            raise self._error(msg, self._pos)
+
+
+def iter_validate(
+    file: str | os.PathLike[str] | IO[str], /, *, chunk_size: int = 2**20
+) -> Iterator[tuple[str, str | None]]:
+    """
+    Validate a histogram JSON file one histogram at a time, yielding the name
+    of each histogram and the error message (``None`` if valid). Each
+    histogram is parsed, validated, and discarded before the next one is read,
+    so memory use is bounded by the largest histogram rather than the file.
+    ``file`` can be a path or a text file object. Raises
+    ``json.JSONDecodeError`` if the file is not valid JSON; histograms before
+    the problem have already been yielded.
+    """
+    import fastjsonschema  # noqa: PLC0415
+
+    with contextlib.ExitStack() as stack:
+        f = (
+            stack.enter_context(Path(file).open(encoding="utf-8"))
+            if isinstance(file, (str, os.PathLike))
+            else file
+        )
+        for name, hist in _ObjectStream(f, chunk_size):
+            try:
+                validate({name: hist})
+            except fastjsonschema.JsonSchemaValueException as e:
+                yield name, e.message
+            else:
+                yield name, None
+
+
+def _file_hash(file: str) -> str:
+    digest = hashlib.sha256()
+    with Path(file).open("rb") as f:
+        while chunk := f.read(2**20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _check_file(
+    file: str, known: frozenset[str] = frozenset(), stream: bool = False
+) -> tuple[str, list[str], bool]:
+    """
+    Validate a file, returning the hash of its contents, the error messages
+    (empty if valid), and whether the validation was skipped because the
+    hash is in ``known``. If ``stream`` is True, the histograms in the file
+    are validated one at a time, and errors are prefixed by the histogram
+    name.
+    """
+    import fastjsonschema  # noqa: PLC0415
+
+    try:
+        digest = _file_hash(file)
+        if digest in known:
+            return digest, [], True
+        if stream:
+            return (
+                digest,
+                [f"{name}: {error}" for name, error in iter_validate(file) if error],
+                False,
+            )
+        validate(json.loads(Path(file).read_bytes()))
+    except OSError as e:
+        return "", [f"cannot read file: {e.strerror}"], False
+    except json.JSONDecodeError as e:
+        return digest, [f"invalid JSON: {e}"], False
+    except fastjsonschema.JsonSchemaValueException as e:
+        return digest, [e.message], False
+    except UnicodeDecodeError as e:
+        return digest, [f"invalid encoding: {e}"], False
+    except ValueError as e:
+        # Such as integers too long to convert
+        return digest, [f"invalid JSON: {e}"], False
+    return digest, [], False
+
+
+def _check_files(
+    files: Sequence[str], jobs: int, known: frozenset[str], stream: bool
+) -> list[tuple[str, list[str], bool]]:
+    if jobs == 1 or len(files) < 2:
+        return [_check_file(f, known, stream) for f in files]
+
+    from concurrent.futures import ProcessPoolExecutor  # noqa: PLC0415
+
+    with ProcessPoolExecutor(jobs) as executor:
+        # Large chunks keep the per-file overhead small for many small files
+        chunksize = max(1, len(files) // (4 * jobs))
+        return list(
+            executor.map(
+                _check_file,
+                files,
+                itertools.repeat(known),
+                itertools.repeat(stream),
+                chunksize=chunksize,
+            )
+        )
+
+
+def _schema_hash() -> str:
+    return hashlib.sha256(histogram_file.read_bytes()).hexdigest()
+
+
+def _read_cache(path: Path) -> frozenset[str]:
+    """
+    The hashes of the files known to be valid, if the cache was written with
+    the current schema.
+    """
+    try:
+        with path.open(encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return frozenset()
+    if not isinstance(cache, dict) or cache.get("schema") != _schema_hash():
+        return frozenset()
+    return frozenset(cache.get("valid", []))
+
+
+def _write_cache(path: Path, valid: Iterable[str]) -> None:
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump({"schema": _schema_hash(), "valid": sorted(valid)}, f)
+    tmp.replace(path)
+
+
+def main(*args: str) -> None:
+    """
+    Validate histogram files. Run with ``--help`` for the options.
+    """
+    import argparse  # noqa: PLC0415
+
+    parser = argparse.ArgumentParser(
+        prog="python -m uhi.schema",
+        description="Validate histogram JSON files against the UHI schema.",
+    )
+    parser.add_argument("files", nargs="*", help="JSON files to validate")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of processes to use (0 for one per CPU, default: 1)",
+    )
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        help="cache file; files with the contents of a valid file seen before are skipped, and the compiled validator is cached in $UHI_CACHE_DIR (default: ~/.cache/uhi)",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print a JSON summary instead of text"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="validate one histogram at a time, for files too large to load at once",
+    )
+    opts = parser.parse_args(args)
+    if opts.jobs < 0:
+        parser.error("--jobs must be non-negative")
+
+    known = _read_cache(opts.cache) if opts.cache else frozenset()
+    jobs = opts.jobs or os.cpu_count() or 1
+    if opts.cache:
+        # Asking for a cache also caches the compiled validator
+        with _enable_cache_dir():
+            results = _check_files(opts.files, jobs, known, opts.stream)
+    else:
+        results = _check_files(opts.files, jobs, known, opts.stream)
+
+    if opts.cache:
+        # Keep earlier entries, so runs on different subsets of files share it
+        _write_cache(
+            opts.cache,
+            known | {digest for digest, errors, _ in results if digest and not errors},
+        )
+
+    failed = sum(bool(errors) for _, errors, _ in results)
+    if opts.json:
+        summary = {
+            "total": len(results),
+            "valid": len(results) - failed,
+            "invalid": failed,
+            "cached": sum(cached for _, _, cached in results),
+            "files": [
+                {"file": file, "valid": not errors, "errors": errors, "cached": cached}
+                for file, (_, errors, cached) in zip(opts.files, results, strict=True)
+            ],
+        }
+        print(json.dumps(summary, indent=2))  # noqa: T201
+    else:
+        for file, (_, errors, _) in zip(opts.files, results, strict=True):
+            if not errors:
+                print(f"OK {file}")  # noqa: T201
+            for error in errors:
+                print(f"ERROR {file}: {error}")  # noqa: T201
 
-    if retval:
-        raise SystemExit(retval)
+    if failed:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,539 @@
+"""
+Slice, rebin, integrate, and project histograms in the intermediate
+representation with ``uhi.tag`` indexing, without a histogram library.
+
+An indexing expression is first compiled against the axes into a
+:class:`SlicePlan`, which holds the resolved integer ranges, the flow handling
+and the rebin groupings. Compiled plans are cached, so indexing many
+identically binned histograms with the same expression only costs the array
+operations after the first one.
+"""
+
+from __future__ import annotations
+
+import functools
+from collections.abc import Mapping, Sequence
+from typing import Any, Literal, NamedTuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from . import axis as _axis
+from .io import from_sparse
+from .io._combine import _from_additive, _to_additive
+from .io._common import _convert_input
+from .typing.serialization import (
+    AnyAxisIR,
+    AnyHistogramIR,
+    HistogramIR,
+    ToUHIHistogram,
+)
+
+__all__ = ["AxisPlan", "SlicePlan", "compile_plan", "getitem", "project"]
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+# Fields of the axes that do not change the binning
+_NON_BINNING = frozenset({"metadata", "writer_info"})
+
+
+class AxisPlan(NamedTuple):
+    """
+    How one axis is indexed, in storage positions (including flow bins).
+    ``kind`` is ``"pick"`` (select the bin at ``start``, removing the axis),
+    ``"sum"`` (sum ``start:stop``, removing the axis), or ``"keep"``. Kept
+    axes are cut to ``start:stop``; if ``segments`` is not None, the output
+    bins are then the sums between these positions (relative to ``start``),
+    as in ``np.add.reduceat``, which folds the removed bins into the flow bins
+    and rebins. A nonzero ``roll`` first rotates the cut bins left by that
+    many positions (as ``np.roll`` with a negative shift), so the bins before
+    the range of a category axis, which has no underflow bin, come after the
+    overflow bin and are folded into it.
+    """
+
+    kind: Literal["pick", "sum", "keep"]
+    start: int
+    stop: int
+    segments: tuple[int, ...] | None = None
+    roll: int = 0
+
+
+def _expand(key: Any, ndim: int, /) -> list[Any]:
+    """
+    One indexing item per axis, expanding ``...`` and ``{axis: item}`` dicts.
+    """
+    if isinstance(key, Mapping):
+        picked: list[Any] = [slice(None)] * ndim
+        for i, item in key.items():
+            picked[i] = item
+        return picked
+    items: list[Any] = list(key) if isinstance(key, tuple) else [key]
+    if items.count(Ellipsis) > 1:
+        msg = "Only one ellipsis is allowed"
+        raise IndexError(msg)
+    if Ellipsis in items:
+        i = items.index(Ellipsis)
+        items[i : i + 1] = [slice(None)] * (ndim - len(items) + 1)
+    if len(items) > ndim:
+        msg = f"Too many indices for a histogram with {ndim} axes"
+        raise IndexError(msg)
+    return items + [slice(None)] * (ndim - len(items))
+
+
+def _position(lookup: _axis.Axis, item: Any, axis: int, /, *, wrap: bool) -> int:
+    """
+    Convert an integer or locator to a position in the storage axis
+    (including flow bins).
+    """
+    if callable(item):
+        pos = int(item(lookup))
+        if (pos == -1 and lookup.underflow) or (pos == lookup.size and lookup.overflow):
+            return pos + lookup.underflow
+    else:
+        pos = int(item)
+        if wrap and pos < 0:
+            pos += lookup.size
+    if not 0 <= pos < lookup.size:
+        msg = f"Index {item} out of range for axis {axis} with {lookup.size} bins"
+        raise IndexError(msg)
+    return pos + lookup.underflow
+
+
+def _bound(lookup: _axis.Axis, item: Any, default: int, /) -> int:
+    """
+    Convert the start or stop of a summed range to a storage position. Open
+    ends (``default``) include the flow bins; ``len`` is the end of the bins.
+    """
+    if item is None:
+        return default
+    if item is len:
+        return lookup.size + lookup.underflow
+    if callable(item):
+        pos = int(item(lookup)) + lookup.underflow
+    else:
+        pos = int(item)
+        pos = (pos + lookup.size if pos < 0 else pos) + lookup.underflow
+    return min(max(pos, 0), lookup.extent)
+
+
+def _bin_bound(lookup: _axis.Axis, item: Any, default: int, /) -> int:
+    """
+    Convert the start or stop of a kept range to a bin number.
+    """
+    if item is None:
+        return default
+    if item is len:
+        return lookup.size
+    if callable(item):
+        pos = int(item(lookup))
+    else:
+        pos = int(item)
+        pos = pos + lookup.size if pos < 0 else pos
+    return min(max(pos, 0), lookup.size)
+
+
+def _axis_edges(axis: Mapping[str, Any], /) -> NDArray[np.float64]:
+    match axis["type"]:
+        case "regular":
+            return np.linspace(axis["lower"], axis["upper"], axis["bins"] + 1)
+        case "variable":
+            return np.asarray(axis["edges"], dtype=np.float64)
+        case _:
+            msg = f"A {axis['type']} axis has no edges"
+            raise ValueError(msg)
+
+
+def _groups(step: Any, nbins: int, /) -> NDArray[np.intp]:
+    """
+    The sizes of the output bins for a rebinning step over ``nbins`` bins.
+    Bins left over at the end are not in any group; there must be at least
+    one group, since axes cannot have zero bins.
+    """
+    if step is None:
+        groups = np.ones(nbins, dtype=np.intp)
+    elif getattr(step, "groups", None) is not None:
+        groups = np.asarray(step.groups, dtype=np.intp)
+        if groups.sum() > nbins:
+            msg = f"The groups cover {groups.sum()} bins, but there are only {nbins}"
+            raise ValueError(msg)
+    else:
+        factor = getattr(step, "factor", None)
+        if not isinstance(factor, int) or factor < 1:
+            msg = f"Unsupported slice step {step!r}, use rebin or sum"
+            raise ValueError(msg)
+        groups = np.full(nbins // factor, factor, dtype=np.intp)
+    if len(groups) == 0:
+        msg = f"The slice step {step!r} over {nbins} bins selects no bins"
+        raise ValueError(msg)
+    return groups
+
+
+def _edge_groups(
+    axis: Mapping[str, Any], target: Any, /
+) -> tuple[int, NDArray[np.intp]]:
+    """
+    The first bin and the group sizes that give the ``target`` edges, which
+    must be (up to rounding) a subset of the edges of the axis.
+    """
+    edges = _axis_edges(axis)
+    target = np.asarray(target, dtype=np.float64)
+    # The nearest existing edge for each target edge
+    right = np.clip(np.searchsorted(edges, target), 1, len(edges) - 1)
+    nearest = np.where(
+        edges[right] - target < target - edges[right - 1], right, right - 1
+    )
+    tolerance = 1e-9 * (edges[-1] - edges[0])
+    if not np.allclose(edges[nearest], target, rtol=0, atol=tolerance):
+        msg = f"The edges {target.tolist()} are not a subset of the axis edges"
+        raise ValueError(msg)
+    return int(nearest[0]), np.diff(nearest)
+
+
+def _kept_axis(
+    axis: Mapping[str, Any], start: int, groups: NDArray[np.intp], /
+) -> dict[str, Any]:
+    """
+    The binning fields of the output axis for the bins starting at ``start``,
+    combined in ``groups``.
+    """
+    size = _axis.from_ir(axis).size
+    stop = start + int(groups.sum())
+    whole = start == 0 and stop == size
+    ungrouped = bool(np.all(groups == 1))
+    binning = {k: v for k, v in axis.items() if k not in _NON_BINNING}
+    match axis["type"]:
+        case "regular" | "variable" if whole and ungrouped:
+            return binning
+        case "regular" if np.all(groups == groups[:1]):
+            lower, upper = axis["lower"], axis["upper"]
+            return {
+                **binning,
+                "lower": lower + (upper - lower) * start / size,
+                "upper": lower + (upper - lower) * stop / size,
+                "bins": len(groups),
+                "circular": axis["circular"] and whole,
+            }
+        case "regular" | "variable":
+            # Unequal groups turn a regular axis into a variable one
+            boundaries = np.concatenate([[start], start + np.cumsum(groups)])
+            return {
+                "type": "variable",
+                "edges": _axis_edges(axis)[boundaries],
+                "underflow": axis["underflow"],
+                "overflow": axis["overflow"],
+                "circular": axis["circular"] and whole,
+            }
+        case "category_str" | "category_int" if ungrouped:
+            return {**binning, "categories": list(axis["categories"][start:stop])}
+        case "boolean" if whole and ungrouped:
+            return binning
+        case _:
+            msg = f"Cannot rebin or cut a {axis['type']} axis"
+            raise ValueError(msg)
+
+
+def _plan_axis(
+    axis: Mapping[str, Any], item: Any, index: int, /
+) -> tuple[AxisPlan, dict[str, Any] | None]:
+    lookup = _axis.from_ir(axis)
+    if item is sum:
+        item = slice(None, None, sum)
+    elif hasattr(item, "factor"):
+        item = slice(None, None, item)
+
+    if not isinstance(item, slice):
+        pos = _position(lookup, item, index, wrap=not callable(item))
+        return AxisPlan("pick", pos, pos + 1), None
+
+    if item.step is sum:
+        lo = _bound(lookup, item.start, 0)
+        hi = _bound(lookup, item.stop, lookup.extent)
+        return AxisPlan("sum", lo, max(lo, hi)), None
+
+    if getattr(item.step, "edges", None) is not None:
+        if item.start is not None or item.stop is not None:
+            msg = "Rebinning to edges cannot be combined with a start or stop"
+            raise ValueError(msg)
+        start, groups = _edge_groups(axis, item.step.edges)
+    else:
+        start = _bin_bound(lookup, item.start, 0)
+        stop = max(start, _bin_bound(lookup, item.stop, lookup.size))
+        groups = _groups(item.step, stop - start)
+    # Bins left over by the rebinning go to the overflow bin
+    stop = start + int(groups.sum())
+    out_axis = _kept_axis(axis, start, groups)
+
+    underflow, overflow = int(lookup.underflow), int(lookup.overflow)
+    if overflow and start > 0 and axis["type"].startswith("category"):
+        # The overflow bin of a category axis also collects the bins before
+        # the range, which are rotated to the end
+        segments = tuple(range(stop - start + 1))
+        return AxisPlan("keep", 0, lookup.extent, segments, start), out_axis
+
+    lo = 0 if underflow else start
+    hi = lookup.extent if overflow else underflow + stop
+    fold = (underflow and start > 0) or (overflow and stop < lookup.size)
+    if not fold and np.all(groups == 1):
+        # A plain slice, which gives a view
+        return AxisPlan("keep", lo, hi), out_axis
+
+    # The underflow bin collects the bins before the range, and the overflow
+    # bin the bins after it
+    positions = np.concatenate(
+        [
+            [0] * underflow,
+            underflow + start + np.cumsum(groups) - groups,
+            [underflow + stop] * overflow,
+        ]
+    )
+    return AxisPlan("keep", lo, hi, tuple((positions - lo).tolist())), out_axis
+
+
+class SlicePlan:
+    """
+    A compiled indexing expression for histograms with a given binning. Use
+    :func:`compile_plan` to make one, and call :meth:`apply` on each
+    histogram. Plans are immutable and hashable.
+    """
+
+    __slots__ = ("_axes", "_frozen", "_segments", "axes", "shape")
+
+    def __init__(self, axes: Sequence[AnyAxisIR | Mapping[str, Any]], key: Any) -> None:
+        plans = []
+        out_axes = []
+        for i, (axis, item) in enumerate(
+            zip(axes, _expand(key, len(axes)), strict=True)
+        ):
+            plan, out_axis = _plan_axis(axis, item, i)
+            plans.append(plan)
+            out_axes.append(out_axis)
+        #: The plan for each input axis
+        self.axes: tuple[AxisPlan, ...] = tuple(plans)
+        #: The storage shape of the input histograms
+        self.shape = tuple(_axis.from_ir(a).extent for a in axes)
+        self._axes = tuple(out_axes)
+        self._frozen: Any = None
+        # The kept axes that are combined, their rotation, and their
+        # np.add.reduceat indices
+        self._segments = [
+            (dim, p.roll, np.asarray(p.segments, dtype=np.intp))
+            for dim, p in enumerate(p for p in plans if p.kind != "pick")
+            if p.segments is not None
+        ]
+
+    def __repr__(self) -> str:
+        return f"SlicePlan({', '.join(map(repr, self.axes))})"
+
+    def _key(self) -> Any:
+        if self._frozen is None:
+            self._frozen = (self.axes, self.shape, tuple(map(_freeze, self._axes)))
+        return self._frozen
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, SlicePlan):
+            return NotImplemented
+        return self._key() == other._key()  # type: ignore[no-any-return]
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def apply(
+        self, hist: HistogramIR | AnyHistogramIR | ToUHIHistogram, /
+    ) -> HistogramIR | dict[str, Any]:
+        """
+        Index a dense histogram with the same binning as the plan was compiled
+        for. If any axes are kept, the result is a new histogram (plain
+        slices are views of the input arrays); otherwise, it is a dict with
+        one value per storage field.
+
+        The storage arrays can also be array-likes that support basic slicing,
+        like ``h5py.Dataset`` or ``np.memmap``; all picks and cuts are done in
+        a single slicing operation first, so only the selected region is read.
+        """
+        any_hist = _convert_input(hist)  # type: ignore[arg-type]
+        storage: Mapping[str, Any] = any_hist["storage"]
+        if "index" in storage:
+            msg = "SlicePlan only supports dense storage, see uhi.slicing.getitem"
+            raise ValueError(msg)
+        storage_type = storage["type"]
+        lazy = {
+            k: v if hasattr(v, "shape") else np.asarray(v)
+            for k, v in storage.items()
+            if k != "type"
+        }
+        for k, v in lazy.items():
+            if tuple(v.shape) != self.shape and not (self.shape == () and v.size == 1):
+                msg = f"Storage {k!r} has shape {v.shape}, the plan is for {self.shape}"
+                raise ValueError(msg)
+
+        cut = tuple(
+            p.start if p.kind == "pick" else slice(p.start, p.stop) for p in self.axes
+        )
+        arrays = {k: np.asarray(v[cut]) for k, v in lazy.items()}
+
+        remaining = [p for p in self.axes if p.kind != "pick"]
+        summed = tuple(i for i, p in enumerate(remaining) if p.kind == "sum")
+        reduce = bool(summed or self._segments)
+        if reduce:
+            arrays = _to_additive(storage_type, arrays)
+        for dim, roll, segments in self._segments:
+            if roll:
+                arrays = {k: np.roll(v, -roll, axis=dim) for k, v in arrays.items()}
+            arrays = {
+                k: np.add.reduceat(v, segments, axis=dim) for k, v in arrays.items()
+            }
+        if summed:
+            arrays = {k: v.sum(axis=summed) for k, v in arrays.items()}
+        dim = len(remaining) - len(summed)
+
+        if reduce:
+            arrays = _from_additive(storage_type, arrays)
+
+        if dim == 0:
+            return {k: v[()] for k, v in arrays.items()}
+
+        out_axes = [
+            {**binning, **{k: v for k, v in axis.items() if k in _NON_BINNING}}
+            for binning, axis in zip(self._axes, any_hist["axes"], strict=True)
+            if binning is not None
+        ]
+        out: dict[str, Any] = {
+            "uhi_schema": 1,
+            "axes": out_axes,
+            "storage": {"type": storage_type, **arrays},
+        }
+        if "metadata" in any_hist:
+            out["metadata"] = any_hist["metadata"]
+        return out
+
+
+@functools.cache
+def _slots(cls: Any, /) -> tuple[str, ...]:
+    return tuple(s for c in cls.__mro__ for s in getattr(c, "__slots__", ()))
+
+
+def _freeze(obj: Any, /) -> Any:
+    """
+    A hashable version of an axis or indexing item, for the plan cache.
+    """
+    if obj is None or isinstance(obj, (int, float, str)):
+        return obj
+    if isinstance(obj, dict):
+        return tuple((k, _freeze(obj[k])) for k in sorted(obj) if k not in _NON_BINNING)
+    if isinstance(obj, np.ndarray):
+        return (obj.dtype.str, obj.shape, obj.tobytes())
+    if isinstance(obj, (list, tuple)):
+        return (type(obj).__name__, *map(_freeze, obj))
+    if isinstance(obj, slice):
+        return ("slice", _freeze(obj.start), _freeze(obj.stop), _freeze(obj.step))
+    if isinstance(obj, Mapping):
+        return _freeze(dict(obj))
+    if slots := _slots(obj.__class__):
+        # Tags (loc, rebin, ...) are small slotted classes, compared by value;
+        # subclasses without __slots__ keep the rest of their state in __dict__
+        state = getattr(obj, "__dict__", None) or {}
+        return (
+            type(obj),
+            *(_freeze(getattr(obj, s, None)) for s in slots),
+            tuple((k, _freeze(v)) for k, v in sorted(state.items())),
+        )
+    hash(obj)
+    return obj
+
+
+class _CacheKey:
+    """
+    Key of the plan cache: compares by the frozen signature, and carries the
+    original arguments for compiling on a cache miss.
+    """
+
+    __slots__ = ("args", "signature")
+
+    def __init__(self, signature: Any, args: tuple[Any, Any]) -> None:
+        self.signature = signature
+        self.args: tuple[Any, Any] | None = args
+
+    def __hash__(self) -> int:
+        return hash(self.signature)
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _CacheKey) and self.signature == other.signature
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_plan(key: _CacheKey, /) -> SlicePlan:
+    assert key.args is not None
+    axes, item = key.args
+    # Do not keep the first histogram's axes alive in the cache
+    key.args = None
+    return SlicePlan(axes, item)
+
+
+def compile_plan(
+    axes: Sequence[AnyAxisIR | Mapping[str, Any]] | HistogramIR | AnyHistogramIR,
+    key: Any,
+    /,
+) -> SlicePlan:
+    """
+    Compile an indexing expression (anything that can go in ``h[...]``) for
+    histograms with the given axes (or the axes of a histogram). The most
+    recently used plans are cached, keyed by the binning and the expression,
+    so calling this in a loop is cheap. Locators and rebin tags are compared
+    by value; other callables by identity. The cache does not keep the axes
+    or the histograms alive.
+    """
+    if isinstance(axes, Mapping):
+        axes = axes["axes"]
+    try:
+        signature = (tuple(_freeze(a) for a in axes), _freeze(key))
+    except TypeError:
+        # Unhashable items can't be cached
+        return SlicePlan(axes, key)
+    return _cached_plan(_CacheKey(signature, (axes, key)))
+
+
+def getitem(
+    hist: HistogramIR | AnyHistogramIR | ToUHIHistogram, key: Any, /
+) -> HistogramIR | dict[str, Any]:
+    """
+    Index a histogram like ``h[key]``, following the UHI indexing rules:
+    integers and ``uhi.tag`` locators select a bin, ``a:b`` slices fold the
+    cut bins into the flow bins, ``::rebin(n)`` combines bins, and ``a:b:sum``
+    integrates (open ends include the flow bins). If any axes are kept, the
+    result is a new histogram, sharing memory with the input where possible;
+    otherwise, it is a dict with one value per storage field. Sparse
+    histograms are converted to dense first; see :class:`uhi.sparse.SparseView`
+    for indexing them directly.
+    """
+    any_hist = _convert_input(hist)  # type: ignore[arg-type]
+    if "index" in any_hist["storage"]:
+        any_hist = from_sparse(any_hist)
+    return compile_plan(any_hist, key).apply(any_hist)
+
+
+def project(
+    hist: HistogramIR | AnyHistogramIR | ToUHIHistogram, /, *axes: int
+) -> HistogramIR:
+    """
+    Sum over all axes except ``axes`` (including their flow bins), which are
+    kept in the given order.
+    """
+    any_hist = _convert_input(hist)  # type: ignore[arg-type]
+    ndim = len(any_hist["axes"])
+    if not axes or len(set(axes)) != len(axes) or not all(0 <= i < ndim for i in axes):
+        msg = f"Invalid axes {axes} for a histogram with {ndim} axes"
+        raise ValueError(msg)
+    key = {i: slice(None) if i in axes else slice(None, None, sum) for i in range(ndim)}
+    result: Any = getitem(any_hist, key)
+    order = sorted(axes)
+    if list(axes) != order:
+        permutation = [order.index(i) for i in axes]
+        result["axes"] = [result["axes"][i] for i in permutation]
+        result["storage"] = {
+            k: v if k == "type" else np.transpose(v, permutation)
+            for k, v in result["storage"].items()
+        }
+    return result  # type: ignore[no-any-return]
@@ -0,0 +1,398 @@
+"""
+Query sparse histograms without converting them to dense.
+"""
+
+from __future__ import annotations
+
+import copy
+import math
+from collections.abc import Sequence
+from typing import Any
+
+import numpy as np
+
+from .axis import from_ir
+from .io import (
+    _compute_axis_length,
+    _empty_is_zero,
+    _filled_mask,
+    _linear_index,
+    _linear_index_dtype,
+    to_sparse,
+)
+from .io._combine import _from_additive, _to_additive
+from .io._common import _convert_input
+from .slicing import _bound, _expand, _position
+from .typing.serialization import (
+    AnyAxisIR,
+    AnyHistogramIR,
+    HistogramIR,
+    ToUHIHistogram,
+)
+
+__all__ = ["SparseView", "from_tiled", "to_tiled"]
+
+
+def __dir__() -> list[str]:
+    return __all__
+
+
+class SparseView:
+    """
+    A read-only view of a sparse histogram. The entries are kept sorted by
+    their linear index, so bins can be looked up by binary search without
+    converting the histogram to dense.
+
+    Indexing follows the UHI indexing rules, one item per axis (``...`` and
+    dicts of ``{axis: item}`` are supported). Each item can be:
+
+    * An integer or a ``uhi.tag`` locator (``loc``, ``underflow``,
+      ``overflow``, ...): select a single bin, removing the axis.
+    * ``slice(start, stop, sum)``, like ``a:b:sum``: sum over a range of bins,
+      removing the axis. Open ends include the flow bins.
+    * ``:``: keep the whole axis.
+
+    If any axes are kept, the result is a new :class:`SparseView` (a
+    projection); otherwise, it is a dict with one value per storage field.
+    Empty bins give the same values as a dense histogram would hold.
+    """
+
+    __slots__ = ("_axes", "_data", "_hist", "_index", "_lookups", "_shape", "_type")
+
+    def __init__(self, hist: AnyHistogramIR | ToUHIHistogram, /) -> None:
+        any_hist = _convert_input(hist)
+        if not any_hist["axes"]:
+            msg = "Scalar histograms (without axes) cannot be sparse"
+            raise ValueError(msg)
+        shape = tuple(_compute_axis_length(a) for a in any_hist["axes"])  # type: ignore[arg-type]
+        storage = to_sparse(any_hist, linear=True)["storage"]
+
+        if "index" in storage:
+            index = _linear_index(np.asarray(storage["index"]), shape)
+            data = {
+                k: np.asarray(v)
+                for k, v in storage.items()
+                if k not in {"type", "index"}
+            }
+        else:
+            # Empty (metadata-only) storage
+            index = np.zeros(0, dtype=np.int64)
+            data = {}
+
+        order = np.argsort(index, kind="stable")
+        self._init(
+            any_hist,
+            shape,
+            index[order],
+            {k: v[order] for k, v in data.items()},
+        )
+
+    def _init(
+        self,
+        hist: AnyHistogramIR,
+        shape: tuple[int, ...],
+        index: np.ndarray,
+        data: dict[str, np.ndarray],
+    ) -> None:
+        self._hist = hist
+        self._axes = list(hist["axes"])
+        self._type = hist["storage"]["type"]
+        self._shape = shape
+        self._index = index
+        self._data = data
+        self._lookups = [from_ir(a) for a in self._axes]
+
+    @classmethod
+    def _from_sorted(
+        cls,
+        hist: AnyHistogramIR,
+        shape: tuple[int, ...],
+        index: np.ndarray,
+        data: dict[str, np.ndarray],
+    ) -> SparseView:
+        self = cls.__new__(cls)
+        self._init(hist, shape, index, data)
+        return self
+
+    @property
+    def axes(self) -> list[AnyAxisIR]:
+        return self._axes
+
+    @property
+    def shape(self) -> tuple[int, ...]:
+        """
+        The dense shape, including flow bins.
+        """
+        return self._shape
+
+    @property
+    def storage_type(self) -> str:
+        return self._type
+
+    @property
+    def nnz(self) -> int:
+        """
+        The number of filled bins.
+        """
+        return len(self._index)
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(type={self._type!r}, shape={self._shape}, nnz={self.nnz})"
+
+    def to_ir(self, *, linear: bool = True) -> HistogramIR:
+        """
+        The sparse intermediate representation of this view, with a linear
+        (default) or 2D index.
+        """
+        index = (
+            self._index.astype(_linear_index_dtype(self._shape))
+            if linear
+            else np.vstack(np.unravel_index(self._index, self._shape))
+        )
+        hist = copy.copy(self._hist)
+        hist["axes"] = self._axes
+        storage: dict[str, Any] = {"type": self._type}
+        if self._data:
+            storage["index"] = index
+            storage.update(self._data)
+        hist["storage"] = storage  # type: ignore[typeddict-item]
+        return hist  # type: ignore[return-value]
+
+    def _empty_values(self) -> dict[str, Any]:
+        return {
+            k: v.dtype.type(0 if _empty_is_zero(self._type, k) else np.nan)
+            for k, v in self._data.items()
+        }
+
+    def __getitem__(self, key: Any) -> SparseView | dict[str, Any]:
+        # Per axis, either a range [lo, hi) of storage positions or None to keep
+        ranges: list[tuple[int, int] | None] = []
+        picks_only = True
+        for axis, item in enumerate(_expand(key, len(self._shape))):
+            if isinstance(item, slice):
+                if item.step is None and item.start is None and item.stop is None:
+                    ranges.append(None)
+                elif item.step is sum:
+                    length = self._shape[axis]
+                    lo = _bound(self._lookups[axis], item.start, 0)
+                    hi = _bound(self._lookups[axis], item.stop, length)
+                    ranges.append((lo, max(lo, hi)))
+                else:
+                    msg = "SparseView only supports ':' and 'a:b:sum' slices"
+                    raise NotImplementedError(msg)
+                picks_only = False
+            else:
+                pos = _position(
+                    self._lookups[axis], item, axis, wrap=not callable(item)
+                )
+                ranges.append((pos, pos + 1))
+
+        # Binary search for the contiguous block of linear indices covered by
+        # the leading single picks and the first range
+        shape = self._shape
+        strides = [math.prod(shape[i + 1 :]) for i in range(len(shape))]
+        base = 0
+        for rng, length, stride in zip(ranges, shape, strides, strict=True):
+            start, stop = rng if rng is not None else (0, length)
+            if stop - start != 1:
+                lo, hi = base + start * stride, base + stop * stride
+                break
+            base += start * stride
+        else:
+            lo, hi = base, base + 1
+        first, last = np.searchsorted(self._index, [lo, hi])
+
+        if picks_only:
+            if first == last:
+                return self._empty_values()
+            return {k: v[first] for k, v in self._data.items()}
+
+        index = self._index[first:last]
+        data = {k: v[first:last] for k, v in self._data.items()}
+        coords = np.unravel_index(index, self._shape)
+
+        mask = np.ones(len(index), dtype=bool)
+        for rng, coord, length in zip(ranges, coords, self._shape, strict=True):
+            if rng is not None and rng != (0, length):
+                mask &= (coord >= rng[0]) & (coord < rng[1])
+
+        kept = [i for i, rng in enumerate(ranges) if rng is None]
+        data = {k: v[mask] for k, v in data.items()}
+
+        if not kept:
+            additive = _to_additive(self._type, data)
+            summed = _from_additive(
+                self._type, {k: v.sum(axis=0) for k, v in additive.items()}
+            )
+            return {k: self._data[k].dtype.type(summed[k]) for k in self._data}
+
+        shape = tuple(shape[i] for i in kept)
+        new_index = np.ravel_multi_index(tuple(coords[i][mask] for i in kept), shape)
+        order = np.argsort(new_index, kind="stable")
+        new_index = new_index[order]
+        data = {k: v[order] for k, v in data.items()}
+
+        # Segmented reduction of bins that now land in the same place
+        starts = np.flatnonzero(np.diff(new_index, prepend=-1))
+        if len(starts) != len(new_index):
+            additive = _to_additive(self._type, data)
+            data = _from_additive(
+                self._type,
+                {k: np.add.reduceat(v, starts) for k, v in additive.items()},
+            )
+            new_index = new_index[starts]
+
+        hist = copy.copy(self._hist)
+        hist["axes"] = [self._axes[i] for i in kept]
+        return self._from_sorted(hist, shape, new_index, data)
+
+
+def _empty_array(
+    storage_type: str, key: str, shape: Sequence[int], dtype: np.dtype[Any]
+) -> np.ndarray:
+    return np.full(shape, 0 if _empty_is_zero(storage_type, key) else np.nan, dtype)
+
+
+def _blocked(array: np.ndarray, tile_shape: Sequence[int], /) -> np.ndarray:
+    """
+    View of an array with a shape that is a multiple of ``tile_shape`` as
+    ``(*grid_shape, *tile_shape)``.
+    """
+    grid = [n // t for n, t in zip(array.shape, tile_shape, strict=True)]
+    split = array.reshape(
+        [x for pair in zip(grid, tile_shape, strict=True) for x in pair]
+    )
+    ndim = len(tile_shape)
+    blocked: np.ndarray = split.transpose(
+        *range(0, 2 * ndim, 2), *range(1, 2 * ndim, 2)
+    )
+    return blocked
+
+
+def to_tiled(
+    hist: dict[str, Any] | HistogramIR | AnyHistogramIR, /, tile_shape: Sequence[int]
+) -> dict[str, Any]:
+    """
+    Convert a histogram (dense or sparse) to block-sparse (tiled) storage.
+    The dense storage (with flow bins) is cut into tiles of ``tile_shape``,
+    and only tiles with at least one filled bin are kept. This is much more
+    compact than a sparse index when the filled bins are clustered.
+
+    The storage of the result has the integer ``tile_shape``, a ``"tiles"``
+    array of shape ``(ndim, n_tiles)`` with the position of each tile in the
+    grid of tiles (sorted in C order), and, for each storage array, an array
+    of shape ``(n_tiles, *tile_shape)``. Tiles at the upper edges are padded
+    with empty bins. Scalar and empty (metadata-only) histograms are returned
+    unchanged.
+
+    This is an in-memory representation, and is not part of the
+    serialization schema; use :func:`from_tiled` to convert back.
+    """
+
+    storage = hist["storage"]
+    storage_type = storage["type"]
+    if not hist["axes"] or len(storage) == 1:
+        return hist  # type: ignore[return-value]
+
+    shape = [_compute_axis_length(a) for a in hist["axes"]]  # type: ignore[arg-type]
+    tile_shape = tuple(int(t) for t in tile_shape)
+    if len(tile_shape) != len(shape) or min(tile_shape) < 1:
+        msg = f"tile_shape must have {len(shape)} positive entries, not {tile_shape}"
+        raise ValueError(msg)
+    grid_shape = [-(-n // t) for n, t in zip(shape, tile_shape, strict=True)]
+    arrays = {
+        k: np.asarray(v) for k, v in storage.items() if k not in {"type", "index"}
+    }
+
+    if "index" in storage:
+        coords = np.asarray(storage["index"])
+        if coords.ndim == 1:
+            coords = np.vstack(np.unravel_index(coords, shape))
+        tile_size = np.asarray(tile_shape)[:, np.newaxis]
+        flat_tiles = np.ravel_multi_index(tuple(coords // tile_size), grid_shape)
+        flat_tiles, inverse = np.unique(flat_tiles, return_inverse=True)
+        target = (inverse, *coords % tile_size)
+        tiled = {}
+        for k, v in arrays.items():
+            tiled[k] = _empty_array(
+                storage_type, k, (len(flat_tiles), *tile_shape), v.dtype
+            )
+            tiled[k][target] = v
+    else:
+        # Pad the upper edges to a whole number of tiles
+        padded = {}
+        for k, v in arrays.items():
+            full_shape = [g * t for g, t in zip(grid_shape, tile_shape, strict=True)]
+            if full_shape == list(v.shape):
+                padded[k] = v
+            else:
+                padded[k] = _empty_array(storage_type, k, full_shape, v.dtype)
+                padded[k][tuple(slice(n) for n in shape)] = v
+        blocks = {k: _blocked(v, tile_shape) for k, v in padded.items()}
+        mask = _filled_mask(storage_type, blocks)
+        filled = mask.reshape(*grid_shape, -1).any(axis=-1)
+        flat_tiles = np.flatnonzero(filled)
+        tiled = {k: v[filled] for k, v in blocks.items()}
+
+    tiled_storage: dict[str, Any] = {
+        "type": storage_type,
+        "tile_shape": tile_shape,
+        "tiles": np.vstack(np.unravel_index(flat_tiles, grid_shape)),
+    }
+    tiled_storage.update(tiled)
+
+    retval: dict[str, Any] = dict(hist)
+    retval["storage"] = tiled_storage
+    return retval
+
+
+def from_tiled(
+    hist: dict[str, Any], /, *, sparse: bool = False, linear: bool = False
+) -> HistogramIR:
+    """
+    Convert a tiled histogram from :func:`to_tiled` back to a dense
+    histogram, or to a sparse one if ``sparse`` is True (with a linear index
+    if ``linear`` is True, see :func:`uhi.io.to_sparse`). Histograms that are
+    not tiled are returned unchanged.
+    """
+
+    storage = hist["storage"]
+    if "tiles" not in storage:
+        return hist  # type: ignore[return-value]
+
+    storage_type = storage["type"]
+    shape = [_compute_axis_length(a) for a in hist["axes"]]
+    tile_shape = tuple(storage["tile_shape"])
+    tiles = np.asarray(storage["tiles"])
+    arrays = {
+        k: np.asarray(v)
+        for k, v in storage.items()
+        if k not in {"type", "tile_shape", "tiles"}
+    }
+
+    new_storage: dict[str, Any] = {"type": storage_type}
+    if sparse:
+        mask = _filled_mask(storage_type, arrays)
+        tile_number, *offsets = np.nonzero(mask)
+        coords = tiles[:, tile_number] * np.asarray(tile_shape)[:, np.newaxis]
+        coords += np.vstack(offsets).reshape(len(shape), -1)
+        # Filled bins are never in the padding, so the coordinates are in range
+        new_storage["index"] = (
+            np.ravel_multi_index(tuple(coords), shape).astype(
+                _linear_index_dtype(shape)
+            )
+            if linear
+            else coords
+        )
+        new_storage.update({k: v[mask] for k, v in arrays.items()})
+    else:
+        grid_shape = [-(-n // t) for n, t in zip(shape, tile_shape, strict=True)]
+        full_shape = [g * t for g, t in zip(grid_shape, tile_shape, strict=True)]
+        for k, v in arrays.items():
+            full = _empty_array(storage_type, k, full_shape, v.dtype)
+            _blocked(full, tile_shape)[tuple(tiles)] = v
+            new_storage[k] = full[tuple(slice(n) for n in shape)]
+
+    retval = copy.copy(hist)
+    retval["storage"] = new_storage
+    return retval  # type: ignore[return-value]
@@ -5,6 +5,9 @@ import sys
 import typing
 from typing import Any
 
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
+
 if sys.version_info < (3, 11):
     from typing_extensions import Self
 else:
@@ -57,18 +60,43 @@ class Locator:
             return 42
 
 
+def _index_array(axis: Any, values: NDArray[Any]) -> NDArray[np.intp]:
+    """
+    Look up an array of values with a single ``axis.index`` call, falling back
+    to one call per value for axes that only support scalars.
+    """
+    try:
+        indices = np.asarray(axis.index(values))
+    except (TypeError, ValueError):
+        indices = None
+    if indices is None or indices.shape != values.shape:
+        indices = np.array(
+            [axis.index(v) for v in values.ravel().tolist()], dtype=np.intp
+        ).reshape(values.shape)
+    return indices.astype(np.intp, copy=False)
+
+
 class loc(Locator):
+    """
+    Locate a bin by value. The value can also be an array (or list) of values,
+    which are looked up with a single ``axis.index`` call if the axis supports
+    arrays; the result is then an array of indices, with the offset added to
+    each.
+    """
+
     __slots__ = ("value",)
 
-    def __init__(self, value: str | float, offset: int = 0) -> None:
+    def __init__(self, value: str | float | ArrayLike, offset: int = 0) -> None:
         super().__init__(offset)
-        self.value = value
+        self.value = np.asarray(value) if isinstance(value, (list, tuple)) else value
 
     def _print_self_(self) -> str:
         return f"({self.value})"
 
     # TODO: clarify that .index() is required
-    def __call__(self, axis: Any) -> int:
+    def __call__(self, axis: Any) -> int | NDArray[np.intp]:
+        if isinstance(self.value, np.ndarray):
+            return _index_array(axis, self.value) + self.offset
         return axis.index(self.value) + self.offset  # type: ignore[no-any-return]
 
 
@@ -95,13 +123,22 @@ overflow = Overflow()
 
 
 class at:
+    """
+    Select a bin by index. The index can also be an array (or list) of
+    indices, which is returned as an array.
+    """
+
     __slots__ = ("value",)
 
-    def __init__(self, value: int) -> None:
-        self.value = value
+    def __init__(self, value: int | ArrayLike) -> None:
+        self.value = (
+            np.asarray(value, dtype=np.intp)
+            if isinstance(value, (list, tuple, np.ndarray))
+            else value
+        )
 
-    def __call__(self, axis: PlottableAxis) -> int:  # noqa: ARG002
-        return self.value
+    def __call__(self, axis: PlottableAxis) -> int | NDArray[np.intp]:  # noqa: ARG002
+        return self.value  # type: ignore[return-value]
 
 
 class rebin:
@@ -109,17 +146,102 @@ class rebin:
     When used in the step of a Histogram's slice, rebin(n) combines bins,
     scaling their widths by a factor of n. If the number of bins is not
     divisible by n, the remainder is added to the overflow bin.
-    """
 
-    __slots__ = ("factor",)
+    Instead of a factor, ``groups`` can give the number of bins to combine
+    into each new bin (any remaining bins are added to the overflow bin), or
+    ``edges`` the new edges, which must be a subset of the current edges (the
+    bins outside are added to the flow bins). Exactly one of these must be
+    given. Lists are stored as arrays.
+    """
 
-    def __init__(self, factor: int) -> None:
-        if not isinstance(factor, int):
+    __slots__ = ("edges", "factor", "groups")
+
+    def __init__(
+        self,
+        factor: int | None = None,
+        *,
+        groups: ArrayLike | None = None,
+        edges: ArrayLike | None = None,
+    ) -> None:
+        if sum(arg is not None for arg in (factor, groups, edges)) != 1:
+            msg = "Exactly one of factor, groups, or edges must be given"
+            raise ValueError(msg)
+        if factor is not None and not isinstance(factor, int):
             msg = "The factor must be an integer"  # type: ignore[unreachable]
             raise ValueError(msg)
         # Items with .factor are specially treated in boost-histogram,
         # performing a high performance rebinning
         self.factor = factor
+        self.groups: NDArray[np.intp] | None = None
+        self.edges: NDArray[np.float64] | None = None
+        if groups is not None:
+            self.groups = np.asarray(groups, dtype=np.intp)
+            if (
+                self.groups.ndim != 1
+                or len(self.groups) == 0
+                or np.any(self.groups < 1)
+            ):
+                msg = "The groups must be a non-empty 1D sequence of positive integers"
+                raise ValueError(msg)
+        if edges is not None:
+            self.edges = np.asarray(edges, dtype=np.float64)
+            if self.edges.ndim != 1 or len(self.edges) < 2:
+                msg = "The edges must be a 1D sequence of at least two values"
+                raise ValueError(msg)
+            if np.any(np.diff(self.edges) <= 0):
+                msg = "The edges must be strictly increasing"
+                raise ValueError(msg)
+
+    def group_mapping(self, axis: PlottableAxis) -> list[int]:
+        """
+        The number of adjacent bins of ``axis`` to merge into each new bin,
+        for histogram libraries that rebin with groups. As in
+        boost-histogram, groups must cover the whole axis, and edges must
+        start and end at the axis edges; a factor gives ``len(axis) //
+        factor`` groups, leaving the remaining bins out.
+        """
+        if self.groups is not None:
+            if int(self.groups.sum()) != len(axis):
+                msg = f"The sum of the groups ({int(self.groups.sum())}) must be equal to the number of bins in the axis ({len(axis)})"
+                raise ValueError(msg)
+            return self.groups.tolist()  # type: ignore[no-any-return]
+        if self.edges is not None:
+            axis_edges = getattr(axis, "edges", None)
+            if axis_edges is None:
+                # Plottable axes only give the bins as (lower, upper) pairs
+                bins: list[Any] = [axis[i] for i in range(len(axis))]
+                axis_edges = [bins[0][0], *(b[1] for b in bins)]
+            edges = np.asarray(axis_edges, dtype=np.float64)
+            if not np.isclose(self.edges[0], edges[0]):
+                msg = "Edges must start at first bin"
+                raise ValueError(msg)
+            if not np.isclose(self.edges[-1], edges[-1]):
+                msg = "Edges must end at last bin"
+                raise ValueError(msg)
+            matched = np.abs(edges[:, np.newaxis] - self.edges).argmin(axis=0)
+            missing = self.edges[~np.isclose(edges[matched], self.edges)]
+            if len(missing):
+                msg = (
+                    f"Edge(s) {', '.join(map(str, missing.tolist()))} not found in axis"
+                )
+                raise ValueError(msg)
+            return np.diff(matched).tolist()  # type: ignore[no-any-return]
+        assert self.factor is not None
+        return [self.factor] * (len(axis) // self.factor)
+
+    def axis_mapping(self, axis: PlottableAxis) -> tuple[list[int], None]:
+        """
+        The groups from :meth:`group_mapping`, and ``None`` for the new axis,
+        which the histogram library should make from the groups.
+        """
+        return self.group_mapping(axis), None
+
+    def __repr__(self) -> str:
+        if self.groups is not None:
+            return f"rebin(groups={self.groups.tolist()})"
+        if self.edges is not None:
+            return f"rebin(edges={self.edges.tolist()})"
+        return f"rebin({self.factor})"
 
     if typing.TYPE_CHECKING:
         # Type checkers think that this is required
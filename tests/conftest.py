@@ -20,6 +20,16 @@ VALID_FILES = DIR.glob("resources/valid/*.json")
 INVALID_FILES = DIR.glob("resources/invalid/*.json")
 
 
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    Keep the compiled schema cache out of the home directory.
+    """
+    path = tmp_path / "uhi_cache"
+    monkeypatch.setenv("UHI_CACHE_DIR", str(path))
+    return path
+
+
 @pytest.fixture(scope="session")
 def resources() -> Path:
     return DIR / "resources"
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pytest
+
+from uhi.axis import Boolean, Category, Regular, Variable, from_ir
+from uhi.tag import loc, overflow, underflow
+
+bh = pytest.importorskip("boost_histogram")
+
+VALUES = np.concatenate(
+    [
+        np.random.default_rng(42).uniform(-2, 3, 1000),
+        [0, 0.1, 0.5, 1, np.nan, np.inf, -np.inf],
+    ]
+)
+
+
+@pytest.mark.parametrize(
+    "axis",
+    [
+        bh.axis.Regular(10, 0, 1),
+        bh.axis.Regular(10, 0, 1, underflow=False, overflow=False),
+        bh.axis.Regular(7, -1, 2, circular=True),
+        bh.axis.Variable([0, 0.1, 0.5, 1]),
+        bh.axis.Variable([-1, 0, 2.5], underflow=False),
+    ],
+)
+def test_matches_boost_histogram(axis: Any) -> None:
+    lookup = from_ir(bh.Histogram(axis)._to_uhi_()["axes"][0])
+    np.testing.assert_array_equal(lookup.index(VALUES), axis.index(VALUES))
+    assert lookup.index(0.55) == axis.index(0.55)
+    assert isinstance(lookup.index(0.55), int)
+    assert len(lookup) == len(axis)
+    assert lookup.extent == axis.extent
+
+
+def test_storage_index() -> None:
+    axis = Regular(
+        {
+            "type": "regular",
+            "lower": 0,
+            "upper": 1,
+            "bins": 4,
+            "underflow": True,
+            "overflow": False,
+            "circular": False,
+        }
+    )
+    values = np.array([[-0.5, 0.1], [0.9, 1.5]])
+    np.testing.assert_array_equal(axis.index(values), [[-1, 0], [3, 4]])
+    np.testing.assert_array_equal(axis.storage_index(values), [[0, 1], [4, -1]])
+    assert axis.storage_index(1.5) == -1
+
+
+def test_variable_circular() -> None:
+    axis = Variable(
+        {
+            "type": "variable",
+            "edges": [0, 0.1, 0.5, 1],
+            "underflow": False,
+            "overflow": True,
+            "circular": True,
+        }
+    )
+    np.testing.assert_array_equal(
+        axis.index([-0.95, 0.05, 1.3, 2.0, np.nan]), [0, 0, 1, 0, 3]
+    )
+
+
+@pytest.mark.parametrize("kind", ["category_int", "category_str"])
+def test_category(kind: str) -> None:
+    categories: list[Any] = [3, 1, 7] if kind == "category_int" else ["c", "a", "g"]
+    axis = Category({"type": kind, "categories": categories, "flow": True})
+    values = np.array([categories[1], categories[2], categories[0], categories[1]])
+    np.testing.assert_array_equal(axis.index(values), [1, 2, 0, 1])
+    missing = 5 if kind == "category_int" else "z"
+    assert axis.index(missing) == 3
+    assert axis.index(categories[2]) == 2
+    np.testing.assert_array_equal(axis.storage_index([missing]), [3])
+
+    no_flow = Category({"type": kind, "categories": categories, "flow": False})
+    np.testing.assert_array_equal(no_flow.storage_index([missing]), [-1])
+
+
+def test_category_int_float_values() -> None:
+    axis = Category({"type": "category_int", "categories": [3, 1], "flow": True})
+    np.testing.assert_array_equal(axis.index(np.array([1.0, 3.0, 1.5])), [1, 0, 2])
+
+
+def test_boolean() -> None:
+    axis = Boolean({"type": "boolean"})
+    np.testing.assert_array_equal(axis.index(np.array([True, False, True])), [1, 0, 1])
+    assert axis.index(True) == 1
+    assert axis.extent == 2
+
+
+def test_tag_locators() -> None:
+    axis: Any = from_ir(
+        {
+            "type": "regular",
+            "lower": 0,
+            "upper": 10,
+            "bins": 10,
+            "underflow": True,
+            "overflow": True,
+            "circular": False,
+        }
+    )
+    assert loc(2.5)(axis) == 2
+    assert (loc(2.5) + 1)(axis) == 3
+    np.testing.assert_array_equal(loc([0.5, 9.5, 20])(axis), [0, 9, 10])
+    assert underflow(axis) == -1
+    assert overflow(axis) == 10
+
+
+def test_unknown_type() -> None:
+    with pytest.raises(TypeError, match="Unsupported axis type"):
+        from_ir({"type": "unknown"})
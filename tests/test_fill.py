@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import zipfile
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+import uhi.io.zip
+from uhi.fill import Filler, fill
+from uhi.schema import validate_ir
+
+bh = pytest.importorskip("boost_histogram")
+
+rng = np.random.default_rng(42)
+N = 2000
+X = np.concatenate([rng.uniform(-0.5, 1.5, N - 4), [np.nan, 0.0, 1.0, 0.5]])
+Y = rng.uniform(-1, 8, N)
+CAT = rng.choice(["a", "b", "c", "z"], N)
+INT = rng.choice([1, 2, 7, 9], N)
+FLAG = rng.random(N) < 0.3
+WEIGHT = rng.uniform(0.5, 2, N)
+SAMPLE = rng.normal(size=N)
+
+AXES = [
+    bh.axis.Regular(10, 0, 1),
+    bh.axis.Regular(10, 0, 1, underflow=False, overflow=False),
+    bh.axis.Regular(8, 0, 1, circular=True),
+    bh.axis.Variable([0, 1, 3, 4, 7]),
+    bh.axis.Variable([0, 1, 3, 4, 7], underflow=False),
+]
+
+STORAGES = [
+    bh.storage.Int64(),
+    bh.storage.Double(),
+    bh.storage.Weight(),
+    bh.storage.Mean(),
+    bh.storage.WeightedMean(),
+]
+
+
+def check(result: Any, expected: Any) -> None:
+    validate_ir(result)
+    np.testing.assert_equal(result["axes"], expected["axes"])
+    assert result["storage"]["type"] == expected["storage"]["type"]
+    for key, value in expected["storage"].items():
+        if key != "type":
+            np.testing.assert_allclose(result["storage"][key], value, err_msg=key)
+
+
+@pytest.mark.parametrize("axis", AXES)
+@pytest.mark.parametrize("weighted", [False, True])
+def test_axes(axis: Any, weighted: bool) -> None:
+    hist = bh.Histogram(axis, bh.axis.Variable([0, 1, 3, 4, 7]))
+    data = (X, Y)
+    weight = WEIGHT if weighted else None
+    hist.fill(*data, weight=weight)
+    expected = hist._to_uhi_()
+    check(fill(expected["axes"], *data, weight=weight), expected)
+
+
+@pytest.mark.parametrize("storage", STORAGES)
+@pytest.mark.parametrize("weighted", [False, True])
+def test_storages(storage: Any, weighted: bool) -> None:
+    hist = bh.Histogram(
+        bh.axis.Regular(5, 0, 1), bh.axis.Integer(0, 3), storage=storage
+    )
+    data = (X, INT % 4)
+    kwargs: dict[str, Any] = {"weight": WEIGHT} if weighted else {}
+    if isinstance(storage, (bh.storage.Mean, bh.storage.WeightedMean)):
+        kwargs["sample"] = SAMPLE
+    hist.fill(*data, **kwargs)
+    expected = hist._to_uhi_()
+    result = fill(
+        expected["axes"], *data, storage=expected["storage"]["type"], **kwargs
+    )
+    check(result, expected)
+
+
+@pytest.mark.parametrize("growth", [False, True])
+def test_categories(growth: bool) -> None:
+    hist = bh.Histogram(
+        bh.axis.StrCategory(["a", "b", "c"], growth=growth),
+        bh.axis.IntCategory([9, 1, 2]),
+        bh.axis.Boolean(),
+        storage=bh.storage.Weight(),
+    )
+    if growth:
+        # Growing categories would add "z"; the filler drops it instead
+        mask = CAT != "z"
+        hist.fill(CAT[mask], INT[mask], FLAG[mask], weight=WEIGHT[mask])
+    else:
+        hist.fill(CAT, INT, FLAG, weight=WEIGHT)
+    expected = hist._to_uhi_()
+    check(
+        fill(expected["axes"], CAT, INT, FLAG, storage="weighted", weight=WEIGHT),
+        expected,
+    )
+
+
+def test_int_weights_truncated() -> None:
+    hist = bh.Histogram(bh.axis.Regular(2, 0, 1), storage=bh.storage.Int64())
+    hist.fill([0.2, 0.2, 0.7], weight=[2, 1.5, 3])
+    result: Any = fill(
+        hist._to_uhi_()["axes"], [0.2, 0.2, 0.7], storage="int", weight=[2, 1.5, 3]
+    )
+    assert result["storage"]["values"].dtype == np.int64
+    np.testing.assert_array_equal(result["storage"]["values"], hist.values(flow=True))
+
+
+def test_filler() -> None:
+    axes: Any = bh.Histogram(bh.axis.Regular(10, 0, 1))._to_uhi_()["axes"]
+    filler = Filler(axes, "mean", metadata={"name": "x"})
+    assert filler.shape == (12,)
+    filler.fill(X[:1000], sample=SAMPLE[:1000])
+    other = filler.empty_like().fill(X[1000:], sample=SAMPLE[1000:])
+    first = filler.to_ir()
+    filler += other
+
+    hist = bh.Histogram(bh.axis.Regular(10, 0, 1), storage=bh.storage.Mean())
+    hist.fill(X, sample=SAMPLE)
+    result: Any = filler.to_ir()
+    assert result["metadata"] == {"name": "x"}
+    check(result, {**hist._to_uhi_(), "metadata": {"name": "x"}})
+    # Earlier results are not changed by filling
+    assert first["storage"]["counts"].sum() == 1000  # type: ignore[typeddict-item]
+
+    filler.reset()
+    assert filler.to_ir()["storage"]["counts"].sum() == 0  # type: ignore[typeddict-item]
+
+    with pytest.raises(ValueError, match="Cannot combine"):
+        filler += Filler(axes, "weighted_mean")
+
+
+@pytest.mark.parametrize(
+    "storage", ["int", "double", "weighted", "mean", "weighted_mean"]
+)
+@pytest.mark.parametrize("threads", [2, 3, 8])
+def test_threads(storage: Any, threads: int) -> None:
+    axes: Any = bh.Histogram(
+        bh.axis.Regular(10, 0, 1, underflow=False), bh.axis.StrCategory(["a", "b"])
+    )._to_uhi_()["axes"]
+    kwargs: dict[str, Any] = {"weight": WEIGHT}
+    if "mean" in storage:
+        kwargs["sample"] = SAMPLE
+    expected = fill(axes, X, CAT, storage=storage, **kwargs)
+    result = fill(
+        axes, X, CAT, storage=storage, threads=threads, chunk_size=150, **kwargs
+    )
+    check(result, expected)
+
+    # Threaded fills add to the existing contents
+    filler = Filler(axes, storage).fill(X, CAT, **kwargs)
+    filler.fill(X, CAT, threads=threads, chunk_size=150, **kwargs)
+    doubled = Filler(axes, storage).fill(X, CAT, **kwargs)
+    doubled += doubled.empty_like().fill(X, CAT, **kwargs)
+    check(filler.to_ir(), doubled.to_ir())
+
+
+def test_broadcast_scalar_weight() -> None:
+    axes: Any = bh.Histogram(bh.axis.Regular(2, 0, 1))._to_uhi_()["axes"]
+    result: Any = fill(axes, [[0.2], [0.7]], weight=2.0)
+    np.testing.assert_array_equal(result["storage"]["values"], [0, 2, 2, 0])
+
+
+def test_errors() -> None:
+    axes: Any = bh.Histogram(bh.axis.Regular(2, 0, 1))._to_uhi_()["axes"]
+    with pytest.raises(ValueError, match="Expected 1 data arrays"):
+        fill(axes, [0.5], [0.5])
+    with pytest.raises(ValueError, match="sample is required"):
+        fill(axes, [0.5], storage="mean")
+    with pytest.raises(ValueError, match="sample is not supported"):
+        fill(axes, [0.5], sample=[1.0])
+    with pytest.raises(TypeError, match="Unsupported storage"):
+        Filler(axes, "float")  # type: ignore[arg-type]
+
+
+def test_fill_stream() -> None:
+    axes: Any = bh.Histogram(bh.axis.Regular(10, 0, 1))._to_uhi_()["axes"]
+    consumed = []
+
+    def chunks() -> Any:
+        for start in range(0, N, 300):
+            consumed.append(start)
+            yield (X[start : start + 300],)
+
+    filler = Filler(axes).fill_stream(chunks(), threads=2, chunk_size=100)
+    assert len(consumed) == 7
+    check(filler.to_ir(), fill(axes, X))
+
+
+def test_fill_stream_columns(tmp_path: Path) -> None:
+    axes: Any = bh.Histogram(
+        bh.axis.Regular(10, 0, 1), bh.axis.StrCategory(["a", "b", "c"])
+    )._to_uhi_()["axes"]
+    columns = {"x": X, "c": CAT, "w": WEIGHT, "s": SAMPLE}
+    batches = (
+        {name: array[i : i + 500] for name, array in columns.items()}
+        for i in range(0, N, 500)
+    )
+    snapshots: list[Any] = []
+
+    def snapshot(hist: Any) -> None:
+        path = tmp_path / f"snapshot_{len(snapshots)}.zip"
+        with zipfile.ZipFile(path, "w") as zip_file:
+            uhi.io.zip.write(zip_file, "h", hist)
+        snapshots.append(path)
+
+    filler = Filler(axes, "weighted_mean").fill_stream(
+        batches,
+        columns=["x", "c"],
+        weight="w",
+        sample="s",
+        snapshot=snapshot,
+        snapshot_every=3,
+    )
+    expected = fill(axes, X, CAT, storage="weighted_mean", weight=WEIGHT, sample=SAMPLE)
+    check(filler.to_ir(), expected)
+
+    # Snapshots after 3 chunks, and at the end (4 chunks)
+    assert len(snapshots) == 2
+    with zipfile.ZipFile(snapshots[0]) as zip_file:
+        partial = uhi.io.zip.read(zip_file, "h")
+    first = slice(0, 1500)
+    check(
+        partial,
+        fill(
+            axes,
+            X[first],
+            CAT[first],
+            storage="weighted_mean",
+            weight=WEIGHT[first],
+            sample=SAMPLE[first],
+        ),
+    )
+    with zipfile.ZipFile(snapshots[1]) as zip_file:
+        check(uhi.io.zip.read(zip_file, "h"), expected)
+
+
+def test_fill_stream_errors() -> None:
+    axes: Any = bh.Histogram(bh.axis.Regular(2, 0, 1))._to_uhi_()["axes"]
+    with pytest.raises(ValueError, match="require columns"):
+        Filler(axes).fill_stream([], weight="w")
+    with pytest.raises(ValueError, match="snapshot_every"):
+        Filler(axes).fill_stream([], snapshot=print, snapshot_every=0)
@@ -19,7 +19,8 @@ BHVERSION = packaging.version.Version(importlib.metadata.version("boost_histogra
 HISTVERSION = packaging.version.Version(importlib.metadata.version("hist"))
 
 
-def test_valid_json(valid: Path, tmp_path: Path, sparse: bool) -> None:
+@pytest.mark.parametrize("layout", ["split", "compound"])
+def test_valid_json(valid: Path, tmp_path: Path, sparse: bool, layout: str) -> None:
     data = valid.read_text(encoding="utf-8")
     hists = json.loads(data, object_hook=uhi.io.json.object_hook)
     if sparse:
@@ -28,7 +29,7 @@ def test_valid_json(valid: Path, tmp_path: Path, sparse: bool) -> None:
     tmp_file = tmp_path / "test.h5"
     with h5py.File(tmp_file, "w") as h5_file:
         for name, hist in hists.items():
-            uhi_io_hdf5.write(h5_file.create_group(name), hist)
+            uhi_io_hdf5.write(h5_file.create_group(name), hist, layout=layout)
 
     with h5py.File(tmp_file, "r") as h5_file:
         rehists = {name: uhi_io_hdf5.read(h5_file[name]) for name in hists}
@@ -261,3 +262,267 @@ def test_convert_bh_32bit_hdf5(tmp_path: Path, storage_type: str) -> None:
     # Verify JSON representation is consistent
     redata = json.dumps(rehist_32bit, default=uhi.io.json.default, sort_keys=True)
     assert len(redata) > 0
+
+
+def _big_weighted_mean() -> dict[str, Any]:
+    import numpy as np
+
+    shape = (102, 52)
+    variances = np.full(shape, np.nan)
+    variances[3, 4] = 0.5
+    return {
+        "uhi_schema": 1,
+        "axes": [
+            {
+                "type": "regular",
+                "lower": 0.0,
+                "upper": 1.0,
+                "bins": 100,
+                "underflow": True,
+                "overflow": True,
+                "circular": False,
+            },
+            {
+                "type": "regular",
+                "lower": 0.0,
+                "upper": 1.0,
+                "bins": 50,
+                "underflow": True,
+                "overflow": True,
+                "circular": False,
+            },
+        ],
+        "storage": {
+            "type": "weighted_mean",
+            "sum_of_weights": np.zeros(shape),
+            "sum_of_weights_squared": np.zeros(shape),
+            "values": np.zeros(shape),
+            "variances": variances,
+        },
+    }
+
+
+def test_checkpoint(tmp_path: Path) -> None:
+    import numpy as np
+
+    hist = _big_weighted_mean()
+    tmp_file = tmp_path / "test.h5"
+    with h5py.File(tmp_file, "w") as h5_file:
+        grp = h5_file.create_group("h")
+        checkpoint = uhi_io_hdf5.Checkpoint(grp, min_compress_elements=0)
+        assert checkpoint.write(hist) >= 4
+
+        # Nothing changed (NaN variances must not count as changes)
+        assert checkpoint.write(hist) == 0
+
+        hist["storage"]["sum_of_weights"][50, 20] = 2.0
+        hist["storage"]["values"][50, 20] = 3.0
+        assert checkpoint.write(hist) == 2
+
+    with h5py.File(tmp_file, "r") as h5_file:
+        rehist = uhi_io_hdf5.read(h5_file["h"])
+
+    for key in ("sum_of_weights", "sum_of_weights_squared", "values"):
+        np.testing.assert_array_equal(rehist["storage"][key], hist["storage"][key])
+    np.testing.assert_array_equal(
+        rehist["storage"]["variances"], hist["storage"]["variances"]
+    )
+
+
+def test_checkpoint_resume(tmp_path: Path) -> None:
+    import numpy as np
+
+    hist = _big_weighted_mean()
+    tmp_file = tmp_path / "test.h5"
+    with h5py.File(tmp_file, "w") as h5_file:
+        uhi_io_hdf5.write(h5_file.create_group("h"), hist)
+
+    with h5py.File(tmp_file, "r+") as h5_file:
+        checkpoint = uhi_io_hdf5.Checkpoint(h5_file["h"])
+        assert checkpoint.write(hist) == 0
+        hist["storage"]["values"][0, 0] = 1.0
+        assert checkpoint.write(hist) == 1
+
+        hist["storage"]["type"] = "weighted"
+        with pytest.raises(ValueError, match="Storage type changed"):
+            checkpoint.write(hist)
+
+    with h5py.File(tmp_file, "r") as h5_file:
+        rehist = uhi_io_hdf5.read(h5_file["h"])
+    assert rehist["storage"]["values"][0, 0] == 1.0
+    assert np.count_nonzero(rehist["storage"]["values"]) == 1
+
+
+@pytest.mark.parametrize("layout", ["split", "compound"])
+@pytest.mark.parametrize("storage", ["Weight", "Mean", "WeightedMean"])
+def test_stacked(tmp_path: Path, storage: str, layout: str) -> None:
+    import boost_histogram as bh
+    import numpy as np
+
+    rng = np.random.default_rng(42)
+    hists = []
+    for i in range(5):
+        h = bh.Histogram(
+            bh.axis.Regular(10, 0, 1),
+            bh.axis.Integer(0, 3),
+            storage=getattr(bh.storage, storage)(),
+        )
+        x = rng.random(100)
+        y = rng.integers(0, 3, 100)
+        kwargs: dict[str, Any] = {"weight": rng.random(100)}
+        if storage != "Weight":
+            kwargs["sample"] = rng.normal(size=100)
+        if storage == "Mean":
+            del kwargs["weight"]
+        h.fill(x, y, **kwargs)
+        hists.append(h)
+        with h5py.File(tmp_path / f"job_{i}.h5", "w") as h5_file:
+            uhi_io_hdf5.write(h5_file.create_group("h"), h, layout=layout)
+
+    with h5py.File(tmp_path / "index.h5", "w") as h5_file:
+        uhi_io_hdf5.write_stacked(
+            h5_file.create_group("h"),
+            [(tmp_path / f"job_{i}.h5", "/h") for i in range(5)],
+        )
+
+    with h5py.File(tmp_path / "index.h5", "r") as h5_file:
+        with pytest.raises(ValueError, match="read_stacked"):
+            uhi_io_hdf5.read(h5_file["h"])
+        key = "values" if layout == "split" else "compound"
+        assert h5_file[f"h/storage/{key}"].shape == (5, 12, 5)
+        rehist = uhi_io_hdf5.read_stacked(h5_file["h"], block_size=2)
+
+    expected = sum(hists[1:], start=hists[0])._to_uhi_()
+    assert rehist["axes"] == expected["axes"]
+    for key, value in expected["storage"].items():
+        if key == "type":
+            assert rehist["storage"]["type"] == value
+        else:
+            np.testing.assert_allclose(rehist["storage"][key], value)
+
+
+def test_stacked_mismatch(tmp_path: Path) -> None:
+    import boost_histogram as bh
+
+    for i, bins in enumerate([3, 4]):
+        with h5py.File(tmp_path / f"job_{i}.h5", "w") as h5_file:
+            uhi_io_hdf5.write(
+                h5_file.create_group("h"), bh.Histogram(bh.axis.Regular(bins, 0, 1))
+            )
+
+    with (
+        h5py.File(tmp_path / "index.h5", "w") as h5_file,
+        pytest.raises(ValueError, match="expected float64"),
+    ):
+        uhi_io_hdf5.write_stacked(
+            h5_file.create_group("h"),
+            [(tmp_path / f"job_{i}.h5", "h") for i in range(2)],
+        )
+
+
+def test_compound_layout(tmp_path: Path) -> None:
+    import numpy as np
+
+    hist = _big_weighted_mean()
+    tmp_file = tmp_path / "test.h5"
+    with h5py.File(tmp_file, "w") as h5_file:
+        uhi_io_hdf5.write(h5_file.create_group("h"), hist, layout="compound")
+        assert set(h5_file["h/storage"]) == {"compound"}
+
+        checkpoint = uhi_io_hdf5.Checkpoint(h5_file["h"])
+        hist["storage"]["values"][7, 7] = 1.0
+        assert checkpoint.write(hist) == 1
+
+    with h5py.File(tmp_file, "r") as h5_file:
+        rehist = uhi_io_hdf5.read(h5_file["h"])
+
+    storage = rehist["storage"]
+    assert storage["type"] == "weighted_mean"
+    assert list(storage) == [
+        "type",
+        "sum_of_weights",
+        "sum_of_weights_squared",
+        "values",
+        "variances",
+    ]
+    # All fields are views into one array
+    assert storage["values"].base is storage["variances"].base
+    assert storage["values"][7, 7] == 1.0
+    np.testing.assert_array_equal(storage["variances"], hist["storage"]["variances"])
+
+    with (
+        h5py.File(tmp_path / "other.h5", "w") as h5_file,
+        pytest.raises(ValueError, match="Unknown layout"),
+    ):
+        uhi_io_hdf5.write(
+            h5_file.create_group("h"),
+            hist,
+            layout="interleaved",
+        )
+
+
+def test_categories_bulk(tmp_path: Path) -> None:
+    categories = [f"run_{i}" for i in range(5000)] + ["µ±", ""]
+    hist = {
+        "uhi_schema": 1,
+        "axes": [
+            {"type": "category_str", "categories": categories, "flow": False},
+            {"type": "category_int", "categories": [3, 1, 2], "flow": True},
+        ],
+        "storage": {"type": "int"},
+    }
+
+    tmp_file = tmp_path / "test.h5"
+    with h5py.File(tmp_file, "w") as h5_file:
+        uhi_io_hdf5.write(h5_file.create_group("h"), hist)
+        dataset = h5_file["h/ref_axes/axis_0/categories"]
+        assert dataset.dtype.kind == "S"
+        string_info = h5py.check_string_dtype(dataset.dtype)
+        assert string_info is not None
+        assert string_info.encoding == "utf-8"
+        assert dataset.asstr()[-2] == "µ±"
+
+        # Variable-length strings, as written by older versions of uhi
+        legacy = h5_file.create_group("legacy")
+        uhi_io_hdf5.write(legacy, hist)
+        del legacy["ref_axes/axis_0/categories"]
+        legacy["ref_axes/axis_0"].create_dataset("categories", data=categories)
+
+    with h5py.File(tmp_file, "r") as h5_file:
+        rehist = uhi_io_hdf5.read(h5_file["h"])
+        legacy_hist = uhi_io_hdf5.read(h5_file["legacy"])
+
+    for h in (rehist, legacy_hist):
+        assert h["axes"][0]["categories"] == categories
+        assert all(type(c) is str for c in h["axes"][0]["categories"])
+        assert h["axes"][1]["categories"] == [3, 1, 2]
+        assert all(type(c) is int for c in h["axes"][1]["categories"])
+
+
+def test_to_sparse_from_dataset(tmp_path: Path) -> None:
+    import numpy as np
+
+    from uhi.io import from_sparse
+
+    hist = _big_weighted_mean()
+    hist["storage"]["values"][10, 10] = 1.0
+    hist["storage"]["values"][90, 40] = 2.0
+
+    tmp_file = tmp_path / "test.h5"
+    with h5py.File(tmp_file, "w") as h5_file:
+        uhi_io_hdf5.write(h5_file.create_group("h"), hist)
+
+    # Sparsify directly from the (unread) datasets
+    with h5py.File(tmp_file, "r") as h5_file:
+        storage = dict(h5_file["h/storage"])
+        storage["type"] = "weighted_mean"
+        shist = to_sparse({**hist, "storage": storage}, block_size=5, linear=True)
+
+    assert shist["storage"]["index"].tolist() == [
+        3 * 52 + 4,
+        10 * 52 + 10,
+        90 * 52 + 40,
+    ]
+    dense = from_sparse(shist)
+    for key in ("sum_of_weights", "values", "variances"):
+        np.testing.assert_array_equal(dense["storage"][key], hist["storage"][key])
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import io
 import json
+import os
 import re
 from pathlib import Path
+from typing import Any
 
 import fastjsonschema
+import numpy as np
 import pytest
 
+import uhi.io
+import uhi.io.json
 import uhi.schema
 
 
@@ -29,3 +35,360 @@ def test_invalid_schemas(invalid: Path) -> None:
         fastjsonschema.exceptions.JsonSchemaException, match=re.escape(errmsg)
     ):
         uhi.schema.validate(data)
+
+
+def test_valid_ir(valid: Path) -> None:
+    with valid.open(encoding="utf-8") as f:
+        data = json.load(f, object_hook=uhi.io.json.object_hook)
+    for hist in data.values():
+        uhi.schema.validate_ir(hist)
+
+
+@pytest.mark.parametrize(
+    "storage", ["Int64", "Double", "Weight", "Mean", "WeightedMean"]
+)
+def test_valid_ir_boost(storage: str, sparse: bool) -> None:
+    import boost_histogram as bh
+
+    h = bh.Histogram(
+        bh.axis.Regular(10, 0, 1, metadata="x"),
+        bh.axis.Variable([0, 1, 3], overflow=False),
+        bh.axis.StrCategory(["a", "b"]),
+        bh.axis.IntCategory([3, 1], growth=True),
+        bh.axis.Boolean(),
+        storage=getattr(bh.storage, storage)(),
+    )
+    sample = [1.0] if storage in {"Mean", "WeightedMean"} else None
+    h.fill([0.5], [2], ["a"], [3], [True], sample=sample)
+    hist = uhi.io.to_sparse(h._to_uhi_()) if sparse else h._to_uhi_()
+    uhi.schema.validate_ir(hist)
+    if sparse:
+        uhi.schema.validate_ir(uhi.io.to_sparse(h._to_uhi_(), linear=True))
+
+
+def _regular_hist() -> dict[str, Any]:
+    return {
+        "uhi_schema": 1,
+        "axes": [
+            {
+                "type": "regular",
+                "lower": 0.0,
+                "upper": 1.0,
+                "bins": 3,
+                "underflow": True,
+                "overflow": False,
+                "circular": False,
+            },
+            {"type": "category_str", "categories": ["a", "b"], "flow": False},
+        ],
+        "storage": {
+            "type": "weighted",
+            "values": np.zeros((4, 2)),
+            "variances": np.zeros((4, 2)),
+        },
+    }
+
+
+@pytest.mark.parametrize(
+    ("path", "value", "match"),
+    [
+        (("uhi_schema",), 2, "uhi_schema must be 1"),
+        (("extra",), 1, "unexpected keys"),
+        (("metadata",), {"a": [1]}, "metadata.a must be"),
+        (("axes", 0, "type"), "irregular", r"axes\[0\].type must be one of"),
+        (("axes", 0, "bins"), -1, r"axes\[0\].bins must be a non-negative"),
+        (("axes", 0, "bins"), 3.0, r"axes\[0\].bins must be a non-negative"),
+        (("axes", 0, "underflow"), 1, r"axes\[0\].underflow must be a boolean"),
+        (("axes", 0, "edges"), [1, 2], r"axes\[0\] has unexpected keys"),
+        (("axes", 1, "categories"), ["a", "a"], "must be unique"),
+        (("axes", 1, "categories"), ["a", 1], "must be a list of strings"),
+        (("storage", "type"), "double", "must have"),
+        (("storage", "values"), np.zeros((3, 2)), r"must have shape \(4, 2\)"),
+        (("storage", "values"), np.zeros((4, 2), dtype=complex), "dtype"),
+        (("storage", "index"), np.array([[0], [0]]), r"values must have shape \(1,\)"),
+        (("storage", "index"), np.array([[0, 4], [1, 0]]), "out of range"),
+        (("storage", "index"), np.array([0, 8]), "out of range"),
+        (("storage", "index"), np.array([[[0]]]), "must be 1D or have shape"),
+    ],
+)
+def test_invalid_ir(path: tuple[Any, ...], value: Any, match: str) -> None:
+    hist = _regular_hist()
+    target: Any = hist
+    for key in path[:-1]:
+        target = target[key]
+    target[path[-1]] = value
+    if path[-1] == "index" and value.shape[-1] == 2:
+        # Make the data match the two entries in the index
+        hist["storage"]["values"] = np.ones(value.shape[-1])
+        hist["storage"]["variances"] = np.ones(value.shape[-1])
+
+    with pytest.raises(ValueError, match=match):
+        uhi.schema.validate_ir(hist)
+
+
+def test_invalid_ir_variable_edges() -> None:
+    hist = _regular_hist()
+    hist["axes"][0] = {
+        "type": "variable",
+        "edges": np.array([0.0, 2.0, 1.0, 3.0]),
+        "underflow": True,
+        "overflow": False,
+        "circular": False,
+    }
+    with pytest.raises(ValueError, match="strictly increasing"):
+        uhi.schema.validate_ir(hist)
+
+
+def test_main(
+    resources: Path, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    valid = sorted(str(p) for p in resources.glob("valid/*.json"))
+    invalid = str(resources / "invalid/missing_axis.json")
+    broken = tmp_path / "broken.json"
+    broken.write_text("{", encoding="utf-8")
+
+    uhi.schema.main(*valid)
+    assert capsys.readouterr().out.splitlines() == [f"OK {f}" for f in valid]
+
+    with pytest.raises(SystemExit) as excinfo:
+        uhi.schema.main(invalid, str(broken))
+    assert excinfo.value.code == 1
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith(f"ERROR {invalid}: data.one must contain")
+    assert lines[1].startswith(f"ERROR {broken}: invalid JSON")
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_main_invalid_encoding(
+    resources: Path, tmp_path: Path, capsys: pytest.CaptureFixture[str], stream: bool
+) -> None:
+    # A file that is not UTF-8 is one error, not the end of the batch
+    valid = str(resources / "valid/reg.json")
+    latin1 = tmp_path / "latin1.json"
+    latin1.write_bytes('{"h": {"axes": [], "µ": 1}}'.encode("latin-1"))
+    long_int = tmp_path / "long_int.json"
+    long_int.write_text('{"h": ' + "1" * 5000 + "}", encoding="utf-8")
+    args = ["--json", *(["--stream"] if stream else [])]
+
+    with pytest.raises(SystemExit):
+        uhi.schema.main(*args, str(latin1), str(long_int), valid)
+    summary = json.loads(capsys.readouterr().out)
+    assert [f["file"] for f in summary["files"]] == [str(latin1), str(long_int), valid]
+    assert summary["files"][0]["errors"][0].startswith("invalid encoding:")
+    assert summary["files"][1]["errors"][0].startswith("invalid JSON:")
+    assert summary["valid"] == 1
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_main_json_cache(
+    resources: Path, tmp_path: Path, capsys: pytest.CaptureFixture[str], jobs: str
+) -> None:
+    valid = sorted(str(p) for p in resources.glob("valid/*.json"))
+    invalid = str(resources / "invalid/missing_axis.json")
+    cache = tmp_path / "cache.json"
+    args = ["--json", "--jobs", jobs, "--cache", str(cache)]
+
+    with pytest.raises(SystemExit):
+        uhi.schema.main(*args, *valid, invalid)
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["total"] == len(valid) + 1
+    assert summary["valid"] == len(valid)
+    assert summary["invalid"] == 1
+    assert summary["cached"] == 0
+    assert [f["file"] for f in summary["files"]] == [*valid, invalid]
+    assert summary["files"][-1]["errors"][0].startswith("data.one must contain")
+
+    # Valid files are skipped the second time, invalid ones are checked again
+    with pytest.raises(SystemExit):
+        uhi.schema.main(*args, *valid, invalid)
+    summary = json.loads(capsys.readouterr().out)
+    assert summary["cached"] == len(valid)
+    assert not summary["files"][-1]["cached"]
+
+    # A changed file is validated again
+    changed = tmp_path / "changed.json"
+    changed.write_text(Path(valid[0]).read_text(encoding="utf-8") + "\n", "utf-8")
+    uhi.schema.main(*args, valid[1], str(changed))
+    summary = json.loads(capsys.readouterr().out)
+    assert [f["cached"] for f in summary["files"]] == [True, False]
+
+    # The cache is discarded if the schema changes
+    data = json.loads(cache.read_text(encoding="utf-8"))
+    cache.write_text(json.dumps({**data, "schema": "old"}), encoding="utf-8")
+    uhi.schema.main(*args, valid[1])
+    assert json.loads(capsys.readouterr().out)["cached"] == 0
+
+
+def test_schema_cache(
+    resources: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    with (resources / "valid/2d.json").open(encoding="utf-8") as f:
+        data = json.load(f)
+    monkeypatch.setenv("UHI_CACHE_DIR", str(tmp_path))
+    uhi.schema._histogram_schema.cache_clear()
+
+    try:
+        uhi.schema.validate(data)
+        (cached,) = tmp_path.iterdir()
+        assert fastjsonschema.VERSION in cached.name
+
+        # The second time, the validator is loaded without generating it
+        uhi.schema._histogram_schema.cache_clear()
+        monkeypatch.setattr(fastjsonschema, "compile_to_code", None)
+        uhi.schema.validate(data)
+        with pytest.raises(fastjsonschema.JsonSchemaValueException):
+            uhi.schema.validate({"one": {"axes": []}})
+
+        # A corrupted cache is regenerated
+        monkeypatch.undo()
+        monkeypatch.setenv("UHI_CACHE_DIR", str(tmp_path))
+        cached.write_bytes(b"")
+        uhi.schema._histogram_schema.cache_clear()
+        uhi.schema.validate(data)
+        assert cached.stat().st_size > 0
+
+        # An unusable cache directory falls back to compiling in memory
+        monkeypatch.setenv("UHI_CACHE_DIR", str(cached / "not_a_directory"))
+        uhi.schema._histogram_schema.cache_clear()
+        uhi.schema.validate(data)
+    finally:
+        uhi.schema._histogram_schema.cache_clear()
+
+
+def test_schema_cache_opt_in(
+    resources: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    valid = resources / "valid/2d.json"
+    xdg = tmp_path / "xdg"
+    monkeypatch.delenv("UHI_CACHE_DIR")
+    monkeypatch.setenv("XDG_CACHE_HOME", str(xdg))
+    uhi.schema._histogram_schema.cache_clear()
+
+    try:
+        # A plain validate call does not write executable code to disk
+        with valid.open(encoding="utf-8") as f:
+            uhi.schema.validate(json.load(f))
+        assert not xdg.exists()
+
+        # The command line caches it in the default directory with --cache
+        uhi.schema._histogram_schema.cache_clear()
+        uhi.schema.main("--cache", str(tmp_path / "cache.json"), str(valid))
+        capsys.readouterr()
+        (cached,) = (xdg / "uhi").glob("histogram_schema_*")
+        assert fastjsonschema.VERSION in cached.name
+        assert "UHI_CACHE_DIR" not in os.environ
+    finally:
+        uhi.schema._histogram_schema.cache_clear()
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 2**20])
+def test_iter_validate(valid: Path, chunk_size: int) -> None:
+    with valid.open(encoding="utf-8") as f:
+        names = list(json.load(f))
+    results = list(uhi.schema.iter_validate(valid, chunk_size=chunk_size))
+    assert results == [(name, None) for name in names]
+
+
+def test_iter_validate_errors() -> None:
+    hist = {"axes": [], "storage": {"type": "int", "values": [1]}}
+    data = {"a": hist, "b": {"axes": []}, "c": 3.5, "d": hist}
+    text = json.dumps(data, indent=2)
+    results = dict(uhi.schema.iter_validate(io.StringIO(text), chunk_size=5))
+    assert results == {
+        "a": None,
+        "b": "data.b must contain ['storage'] properties",
+        "c": "data.c must be object",
+        "d": None,
+    }
+
+    # Errors are reported at the position in the whole file
+    for broken in (text[:-1], text.replace('"d":', '"d"'), text + " x"):
+        with pytest.raises(json.JSONDecodeError) as excinfo:
+            list(uhi.schema.iter_validate(io.StringIO(broken), chunk_size=5))
+        with pytest.raises(json.JSONDecodeError) as expected:
+            json.loads(broken)
+        assert excinfo.value.pos == expected.value.pos
+        assert (excinfo.value.lineno, excinfo.value.colno) == (
+            expected.value.lineno,
+            expected.value.colno,
+        )
+
+
+def test_iter_validate_bounded() -> None:
+    hist = {"axes": [], "storage": {"type": "double", "values": [1.0] * 100}}
+    entry = len(json.dumps(hist))
+    text = json.dumps({f"h{i}": hist for i in range(1000)})
+
+    stream = uhi.schema._ObjectStream(io.StringIO(text), 64)
+    largest = 0
+    for _ in stream:
+        largest = max(largest, len(stream._buffer))
+    assert largest < 4 * entry
+
+
+def test_iter_validate_large_entry(monkeypatch: pytest.MonkeyPatch) -> None:
+    # A multi-MB entry read in small chunks is copied a logarithmic number of
+    # times, not once per chunk
+    hist = {"axes": [], "storage": {"type": "double", "values": [0.5] * 1_000_000}}
+    text = json.dumps({"big": hist, "small": {"axes": []}})
+    assert len(text) > 4_000_000
+
+    calls = 0
+    read = uhi.schema._ObjectStream._read
+
+    def counting_read(self: Any, size: int = 0) -> bool:
+        nonlocal calls
+        calls += 1
+        return read(self, size)
+
+    monkeypatch.setattr(uhi.schema._ObjectStream, "_read", counting_read)
+    entries = list(uhi.schema._ObjectStream(io.StringIO(text), 1024))
+    assert entries == [("big", hist), ("small", {"axes": []})]
+    assert calls < 40
+
+
+def test_iter_validate_syntax_error_stops_reading() -> None:
+    # A syntax error early in a large file is reported without reading the
+    # rest, while entries cut off at every position still parse
+    hist = {"axes": [], "storage": {"type": "double", "values": [0.5] * 100_000}}
+    text = '{"bad": [1, 2,, 3], ' + json.dumps({"big": hist})[1:]
+    assert len(text) > 500_000
+
+    class CountingIO(io.StringIO):
+        characters = 0
+
+        def read(self, size: int | None = -1) -> str:
+            data = super().read(size)
+            self.characters += len(data)
+            return data
+
+    f = CountingIO(text)
+    with pytest.raises(json.JSONDecodeError, match="Expecting value") as excinfo:
+        list(uhi.schema.iter_validate(f, chunk_size=1024))
+    assert excinfo.value.pos == text.index(",,") + 1
+    assert f.characters <= 2048
+
+    data = {"a": [1.5e-3, True, None, "x\u00b5y\n\U0001f600"], "b": {"c": -2}}
+    text = json.dumps(data, ensure_ascii=True)
+    for chunk_size in range(1, 12):
+        stream = uhi.schema._ObjectStream(io.StringIO(text), chunk_size)
+        assert dict(stream) == data
+
+
+def test_main_stream(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    hist = {"axes": [], "storage": {"type": "int", "values": [1]}}
+    good = tmp_path / "good.json"
+    good.write_text(json.dumps({"a": hist, "b": hist}), encoding="utf-8")
+    bad = tmp_path / "bad.json"
+    bad.write_text(json.dumps({"a": hist, "b": {}, "c": []}), encoding="utf-8")
+
+    with pytest.raises(SystemExit):
+        uhi.schema.main("--stream", str(good), str(bad))
+    assert capsys.readouterr().out.splitlines() == [
+        f"OK {good}",
+        f"ERROR {bad}: b: data.b must contain ['axes', 'storage'] properties",
+        f"ERROR {bad}: c: data.c must be object",
+    ]
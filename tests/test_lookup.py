@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pytest
+
+from uhi.io import to_sparse
+from uhi.lookup import LookupTable
+
+bh = pytest.importorskip("boost_histogram")
+
+
+def make_table(**kwargs: Any) -> Any:
+    hist = bh.Histogram(
+        bh.axis.Variable([20, 30, 50, 100], **kwargs),
+        bh.axis.Regular(4, -2, 2, **kwargs),
+        storage=bh.storage.Weight(),
+    )
+    view = hist.view(flow=True)
+    view.value = np.arange(view.size, dtype=float).reshape(view.shape)
+    view.variance = view.value / 10
+    return hist
+
+
+PT = np.array([25.0, 10.0, 200.0, 60.0, np.nan])
+ETA = np.array([0.5, -3.0, 1.5, 5.0, 0.0])
+
+
+def test_matches_boost_histogram() -> None:
+    hist = make_table()
+    rng = np.random.default_rng(42)
+    pt, eta = rng.uniform(20, 100, 1000), rng.uniform(-2, 2, 1000)
+    table = LookupTable(hist)
+    expected = hist.values()[hist.axes[0].index(pt), hist.axes[1].index(eta)]
+    np.testing.assert_array_equal(table(pt, eta), expected)
+    np.testing.assert_array_equal(table.variances(pt, eta), expected / 10)
+
+
+def test_flow_modes() -> None:
+    hist = make_table()
+    values = hist.values(flow=True)
+
+    clamp = LookupTable(hist)(PT, ETA)
+    np.testing.assert_array_equal(clamp, values[[1, 1, 3, 3, 3], [3, 1, 4, 4, 3]])
+
+    flow = LookupTable(hist, flow="flow")(PT, ETA)
+    np.testing.assert_array_equal(flow, values[[1, 0, 4, 3, 4], [3, 0, 4, 5, 3]])
+
+    nan = LookupTable(hist, flow="nan")(PT, ETA)
+    np.testing.assert_array_equal(nan, [values[1, 3], np.nan, np.nan, np.nan, np.nan])
+
+    mixed = LookupTable(hist, flow=["flow", "nan"])(PT, ETA)
+    np.testing.assert_array_equal(
+        mixed, [values[1, 3], np.nan, values[4, 4], np.nan, values[4, 3]]
+    )
+
+
+def test_flow_not_stored() -> None:
+    hist = make_table(underflow=False, overflow=False)
+    values = hist.values()
+    flow = LookupTable(hist, flow="flow")(PT, ETA)
+    np.testing.assert_array_equal(flow, values[[0, 0, 2, 2, 2], [2, 0, 3, 3, 2]])
+
+
+@pytest.mark.parametrize("growth", [False, True])
+def test_category(growth: bool) -> None:
+    hist = bh.Histogram(
+        bh.axis.StrCategory(["a", "b"], growth=growth),
+        bh.axis.Boolean(),
+        bh.axis.IntCategory([3, 1]),
+    )
+    view = hist.view(flow=True)
+    view[...] = np.arange(view.size).reshape(view.shape)
+    values = hist.values(flow=True)
+    table = LookupTable(hist)
+    result = table(np.array(["b", "z"]), [True, False], np.array([[1], [7]]))
+    assert result.shape == (2, 2)
+    # Missing categories go to the overflow bin, if there is one
+    for row, category in enumerate([1, 2]):
+        expected = [
+            values[1, 1, category],
+            np.nan if growth else values[2, 0, category],
+        ]
+        np.testing.assert_array_equal(result[row], expected)
+
+    nan = LookupTable(hist, flow="nan")(["b", "z"], True, 3)
+    np.testing.assert_array_equal(nan, [values[1, 1, 0], np.nan])
+
+
+def test_threads() -> None:
+    hist = make_table()
+    rng = np.random.default_rng(42)
+    pt, eta = rng.uniform(0, 150, 100_000), rng.uniform(-3, 3, 100_000)
+    table = LookupTable(to_sparse(hist._to_uhi_()), flow="nan")
+    expected = table(pt, eta)
+    result = table(pt, eta, threads=4, chunk_size=1000)
+    np.testing.assert_array_equal(result, expected)
+    np.testing.assert_array_equal(
+        table(pt.reshape(100, -1), eta.reshape(100, -1), threads=4, chunk_size=999),
+        expected.reshape(100, -1),
+    )
+
+
+def test_mean() -> None:
+    hist = bh.Histogram(bh.axis.Regular(2, 0, 1), storage=bh.storage.Mean())
+    hist.fill([0.2, 0.2, 0.7], sample=[1, 3, 5])
+    table = LookupTable(hist)
+    np.testing.assert_array_equal(table([0.1, 0.9]), [2, 5])
+    np.testing.assert_array_equal(table([0.1, 0.9], field="counts"), [2, 1])
+
+
+def test_errors() -> None:
+    hist = make_table()
+    with pytest.raises(ValueError, match="Expected 2 coordinate arrays"):
+        LookupTable(hist)([1.0])
+    with pytest.raises(ValueError, match="Unknown flow mode"):
+        LookupTable(hist, flow="wrap")  # type: ignore[arg-type]
+    with pytest.raises(ValueError, match="Expected 2 flow modes"):
+        LookupTable(hist, flow=["nan"])
+    with pytest.raises(ValueError, match="has no field 'variances'"):
+        LookupTable(bh.Histogram(bh.axis.Regular(2, 0, 1))).variances([0.5])
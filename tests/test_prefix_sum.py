@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import zipfile
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+import uhi.io.zip
+import uhi.testing.indexing
+from uhi.io import to_sparse
+from uhi.prefix_sum import PrefixSum
+from uhi.slicing import getitem
+from uhi.tag import loc, overflow, underflow
+
+bh = pytest.importorskip("boost_histogram")
+
+KEYS = [
+    np.s_[::sum, ::sum],
+    np.s_[0:len:sum, 0:len:sum],
+    np.s_[loc(0.2) : loc(0.7) : sum, 1:3:sum],
+    np.s_[: loc(0.5) : sum, underflow],
+    np.s_[3::sum, overflow],
+    np.s_[2, 1],
+    np.s_[4:2:sum, ::sum],
+]
+
+
+def make_2d(storage: Any) -> Any:
+    rng = np.random.default_rng(42)
+    hist = bh.Histogram(
+        bh.axis.Regular(10, 0, 1), bh.axis.Variable([0, 1, 3, 4, 7]), storage=storage
+    )
+    x, y = rng.uniform(-0.2, 1.2, 1000), rng.uniform(-1, 8, 1000)
+    if isinstance(storage, bh.storage.Mean):
+        hist.fill(x, y, sample=rng.normal(size=1000))
+    elif isinstance(storage, bh.storage.WeightedMean):
+        hist.fill(x, y, sample=rng.normal(size=1000), weight=rng.random(1000))
+    elif isinstance(storage, bh.storage.Weight):
+        hist.fill(x, y, weight=rng.random(1000))
+    else:
+        hist.fill(x, y)
+    return hist._to_uhi_()
+
+
+@pytest.mark.parametrize(
+    "storage",
+    [
+        bh.storage.Int64(),
+        bh.storage.Double(),
+        bh.storage.Weight(),
+        bh.storage.Mean(),
+        bh.storage.WeightedMean(),
+    ],
+)
+@pytest.mark.parametrize("key", KEYS)
+def test_matches_getitem(storage: Any, key: Any) -> None:
+    hist = make_2d(storage)
+    result = PrefixSum(hist)[key]
+    expected: Any = getitem(hist, key)
+    assert result.keys() == expected.keys()
+    for name, value in expected.items():
+        np.testing.assert_allclose(result[name], value, rtol=1e-10, atol=1e-12)
+
+
+def test_int_exact() -> None:
+    hist = make_2d(bh.storage.Int64())
+    prefix = PrefixSum(hist)
+    assert prefix.tables["values"].dtype == np.int64
+    assert prefix.tables["values"].shape == (13, 7)
+    assert prefix.shape == (12, 6)
+    assert prefix[::sum, ::sum]["values"] == 1000
+
+
+def test_integrate_vectorized() -> None:
+    hist = uhi.testing.indexing.Indexing3D.get_uhi()
+    values = hist["storage"]["values"]
+    prefix = PrefixSum(hist)
+    rng = np.random.default_rng(0)
+    shape = np.array(values.shape)
+    start = rng.integers(0, shape + 1, size=(50, 3))
+    stop = rng.integers(0, shape + 1, size=(50, 3))
+    result = prefix.integrate(start, stop)["values"]
+    assert result.shape == (50,)
+    for i in range(50):
+        box = tuple(slice(a, b) for a, b in zip(start[i], stop[i], strict=True))
+        assert result[i] == values[box].sum()
+
+    with pytest.raises(ValueError, match="must have shape"):
+        prefix.integrate([0, 0], [1, 1])
+
+
+def test_sparse_input() -> None:
+    hist = make_2d(bh.storage.Weight())
+    key = np.s_[1:4:sum, ::sum]
+    result = PrefixSum(to_sparse(hist))[key]
+    expected = PrefixSum(hist)[key]
+    np.testing.assert_allclose(result["values"], expected["values"])
+
+
+def test_keep_rejected() -> None:
+    prefix = PrefixSum(make_2d(bh.storage.Double()))
+    with pytest.raises(ValueError, match="single bins"):
+        prefix[::sum, :]
+
+
+def test_zip_round_trip(tmp_path: Path) -> None:
+    hist = make_2d(bh.storage.Mean())
+    prefix = PrefixSum(hist)
+    with zipfile.ZipFile(tmp_path / "hist.zip", "w") as zip_file:
+        uhi.io.zip.write(zip_file, "h", hist)
+        uhi.io.zip.write_prefix_sum(zip_file, "h", prefix)
+    with zipfile.ZipFile(tmp_path / "hist.zip") as zip_file:
+        read = uhi.io.zip.read_prefix_sum(zip_file, "h")
+
+    assert read.storage_type == "mean"
+    assert read.tables.keys() == prefix.tables.keys()
+    key = np.s_[loc(0.3) :: sum, : loc(3.5) : sum]
+    for name, value in prefix[key].items():
+        np.testing.assert_allclose(read[key][name], value)
+
+
+def test_hdf5_round_trip(tmp_path: Path) -> None:
+    h5py = pytest.importorskip("h5py")
+    import uhi.io.hdf5
+
+    hist = make_2d(bh.storage.WeightedMean())
+    prefix = PrefixSum(hist)
+    with h5py.File(tmp_path / "hist.h5", "w") as f:
+        grp = f.create_group("h")
+        uhi.io.hdf5.write(grp, hist)
+        uhi.io.hdf5.write_prefix_sum(grp, prefix)
+    with h5py.File(tmp_path / "hist.h5", "r") as f:
+        read = uhi.io.hdf5.read_prefix_sum(f["h"])
+        # The histogram itself is still readable
+        uhi.io.hdf5.read(f["h"])
+
+    key = np.s_[loc(0.3) :: sum, : loc(3.5) : sum]
+    for name, value in prefix[key].items():
+        np.testing.assert_allclose(read[key][name], value)
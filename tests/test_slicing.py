@@ -0,0 +1,384 @@
+from __future__ import annotations
+
+import copy
+import unittest
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+
+import uhi.testing.indexing
+from uhi.io import to_sparse
+from uhi.slicing import AxisPlan, compile_plan, getitem, project
+from uhi.tag import Locator, loc, overflow, rebin, underflow
+
+bh = pytest.importorskip("boost_histogram")
+
+
+def make_1d() -> Any:
+    return uhi.testing.indexing.Indexing1D.get_uhi()
+
+
+def test_plan_resolves_axes() -> None:
+    plan = compile_plan(make_1d(), np.s_[loc(0.2) : loc(0.4)])
+    assert plan.axes == (AxisPlan("keep", 0, 12, (0, 3, 4, 5)),)
+    assert plan.shape == (12,)
+
+    plan = compile_plan(make_1d(), np.s_[underflow])
+    assert plan.axes == (AxisPlan("pick", 0, 1),)
+    plan = compile_plan(make_1d(), np.s_[:])
+    assert plan.axes == (AxisPlan("keep", 0, 12),)
+
+
+@pytest.mark.parametrize(
+    ("key", "expected"),
+    [
+        (np.s_[2:4], [5, 4, 6, 79]),
+        (np.s_[5:], [23, 10, 12, 14, 16, 18, 1]),
+        (np.s_[:5], [3, 0, 2, 4, 6, 8, 71]),
+        (np.s_[:: rebin(2)], [3, 2, 10, 18, 26, 34, 1]),
+        (np.s_[1 : 5 : rebin(2)], [3, 6, 14, 71]),
+        (np.s_[: loc(0.55) : rebin(2)], [3, 2, 10, 79]),
+    ],
+)
+def test_apply_keep(key: Any, expected: list[int]) -> None:
+    hist = make_1d()
+    result: Any = compile_plan(hist, key).apply(hist)
+    np.testing.assert_array_equal(result["storage"]["values"], expected)
+
+
+@pytest.mark.parametrize(
+    ("key", "expected"),
+    [
+        (np.s_[loc(0.15)], 2),
+        (np.s_[underflow], 3),
+        (np.s_[overflow], 1),
+        (np.s_[-1], 18),
+        (np.s_[::sum], 94),
+        (np.s_[0:len:sum], 90),
+        (np.s_[2:5:sum], 18),
+        (np.s_[:4:sum], 15),
+        (np.s_[4::sum], 79),
+    ],
+)
+def test_apply_scalar(key: Any, expected: int) -> None:
+    hist = make_1d()
+    assert compile_plan(hist, key).apply(hist) == {"values": expected}
+
+
+def test_out_of_range() -> None:
+    with pytest.raises(IndexError):
+        compile_plan(make_1d(), 10)
+
+
+def test_plain_slices_are_views() -> None:
+    hist = uhi.testing.indexing.Indexing3D.get_uhi()
+    result: Any = compile_plan(hist, np.s_[:, 1, :]).apply(hist)
+    assert np.shares_memory(result["storage"]["values"], hist["storage"]["values"])
+
+    # Without flow bins, nothing needs to be folded
+    hist = make_1d()
+    hist["axes"][0]["underflow"] = hist["axes"][0]["overflow"] = False
+    hist["storage"]["values"] = hist["storage"]["values"][1:-1]
+    plan = compile_plan(hist, np.s_[2:4])
+    assert plan.axes == (AxisPlan("keep", 2, 4),)
+    result = plan.apply(hist)
+    np.testing.assert_array_equal(result["storage"]["values"], [4, 6])
+    assert np.shares_memory(result["storage"]["values"], hist["storage"]["values"])
+
+
+@pytest.mark.parametrize("storage", ["Weight", "Mean", "WeightedMean"])
+def test_matches_boost_histogram(storage: str) -> None:
+    h = bh.Histogram(
+        bh.axis.Regular(10, 0, 1),
+        bh.axis.Variable([0, 1, 3, 6, 10]),
+        bh.axis.StrCategory(["a", "b", "c"]),
+        storage=getattr(bh.storage, storage)(),
+    )
+    rng = np.random.default_rng(42)
+    n = 1000
+    x, y = rng.normal(0.5, 0.4, n), rng.uniform(-1, 11, n)
+    z = rng.choice(["a", "b", "c"], n)
+    if storage == "Weight":
+        h.fill(x, y, z, weight=rng.random(n))
+    elif storage == "Mean":
+        h.fill(x, y, z, sample=rng.random(n))
+    else:
+        h.fill(x, y, z, sample=rng.random(n), weight=rng.random(n))
+
+    hist = h._to_uhi_()
+    key = np.s_[loc(0.2) : loc(0.8) : rebin(2), 1:3, bh.loc("b")]
+    result: Any = compile_plan(hist, key).apply(hist)
+    expected = h[loc(0.2) : loc(0.8) : bh.rebin(2), 1:3, bh.loc("b")]._to_uhi_()
+    assert result["axes"][0]["bins"] == 3
+    np.testing.assert_allclose(result["axes"][0]["lower"], 0.2)
+    np.testing.assert_allclose(result["axes"][1]["edges"], [1, 3, 6])
+    for k, v in expected["storage"].items():
+        if k != "type":
+            np.testing.assert_allclose(result["storage"][k], v, err_msg=k)
+
+
+@pytest.mark.parametrize("growth", [False, True])
+@pytest.mark.parametrize(
+    "key", [np.s_[1:, :], np.s_[1:2, :], np.s_[:2, :], np.s_[1:, ::sum]]
+)
+def test_category_cuts_match_boost_histogram(key: Any, growth: bool) -> None:
+    h = bh.Histogram(
+        bh.axis.IntCategory([1, 2, 3], growth=growth),
+        bh.axis.Regular(2, 0, 1),
+        storage=bh.storage.Weight(),
+    )
+    h.fill([1, 2, 3, 3, 1], [0.2, 0.7, 0.2, 0.2, 0.7], weight=[1, 2, 3, 4, 5])
+    # The overflow bin collects the bins on both sides of the cut
+    result: Any = getitem(h, key)
+    expected = h[key]._to_uhi_()
+    assert result["axes"][0] == expected["axes"][0]
+    for k, v in expected["storage"].items():
+        if k != "type":
+            np.testing.assert_allclose(result["storage"][k], v, err_msg=k)
+
+
+def test_cache() -> None:
+    key = np.s_[loc(0.2) : loc(0.5) : rebin(2)]
+    plan = compile_plan(make_1d(), key)
+    # Equal binning and expression, but new objects
+    assert compile_plan(make_1d(), np.s_[loc(0.2) : loc(0.5) : rebin(2)]) is plan
+    assert compile_plan(make_1d(), np.s_[loc(0.2) : loc(0.8) : rebin(2)]) is not plan
+    assert hash(plan) == hash(copy.copy(plan))
+
+    other = make_1d()
+    other["axes"][0]["upper"] = 1.5
+    assert compile_plan(other, key) != plan
+
+    # Metadata is taken from the histogram the plan is applied to
+    other = make_1d()
+    other["axes"][0]["metadata"] = {"name": "x"}
+    assert compile_plan(other, key) is plan
+    result: Any = plan.apply(other)
+    assert result["axes"][0]["metadata"] == {"name": "x"}
+
+
+class near(Locator):
+    """
+    A locator keeping its state in ``__dict__``, as third-party ones would.
+    """
+
+    def __init__(self, value: float, offset: int = 0) -> None:
+        super().__init__(offset)
+        self.value = value
+
+    def __call__(self, axis: Any) -> int:
+        return int(axis.index(self.value)) + self.offset
+
+
+def test_cache_dict_locator() -> None:
+    hist = make_1d()
+    assert getitem(hist, near(0.25)) == getitem(hist, loc(0.25))
+    assert getitem(hist, near(0.75)) == getitem(hist, loc(0.75))
+    assert compile_plan(hist, near(0.25)) is compile_plan(hist, near(0.25))
+    assert compile_plan(hist, near(0.25)) != compile_plan(hist, near(0.75))
+    assert compile_plan(hist, near(0.25)) != compile_plan(hist, near(0.25) + 1)
+
+
+class Unhashable:
+    __hash__ = None  # type: ignore[assignment]
+
+    def __eq__(self, other: object) -> bool:
+        return self is other
+
+    def __call__(self, axis: Any) -> int:  # noqa: ARG002
+        return 2
+
+
+def test_uncacheable_key() -> None:
+    hist = make_1d()
+    plan = compile_plan(hist, Unhashable())
+    assert plan.apply(hist) == {"values": 4}
+    assert compile_plan(hist, Unhashable()) is not compile_plan(hist, Unhashable())
+
+
+def test_shape_mismatch() -> None:
+    plan = compile_plan(make_1d(), np.s_[2:4])
+    with pytest.raises(ValueError, match="shape"):
+        plan.apply(uhi.testing.indexing.Indexing2D.get_uhi())
+
+
+def _binning(hist: Any) -> str:
+    return repr([{k: v for k, v in a.items() if k != "metadata"} for a in hist["axes"]])
+
+
+class IRHistogram:
+    """
+    Minimal histogram indexed with the IR engine, for the UHI indexing tests.
+    """
+
+    def __init__(self, hist: Any) -> None:
+        self.hist = hist
+
+    def __getitem__(self, key: Any) -> Any:
+        result: Any = getitem(self.hist, key)
+        return IRHistogram(result) if "axes" in result else result["values"]
+
+    def __eq__(self, other: object) -> bool:
+        return (
+            isinstance(other, IRHistogram)
+            and _binning(self.hist) == _binning(other.hist)
+            and np.array_equal(
+                self.hist["storage"]["values"], other.hist["storage"]["values"]
+            )
+        )
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+def _skip_setting(cls: Any) -> Any:
+    # The engine is read-only
+    for name in dir(cls):
+        if name.startswith("test_setting"):
+            setattr(cls, name, unittest.skip("read-only")(getattr(cls, name)))
+    return cls
+
+
+@_skip_setting
+class TestIndexing1D(uhi.testing.indexing.Indexing1D[IRHistogram]):
+    @classmethod
+    def make_histogram(cls) -> IRHistogram:
+        return IRHistogram(cls.get_uhi())
+
+
+@_skip_setting
+class TestIndexing2D(uhi.testing.indexing.Indexing2D[IRHistogram]):
+    @classmethod
+    def make_histogram(cls) -> IRHistogram:
+        return IRHistogram(cls.get_uhi())
+
+
+@_skip_setting
+class TestIndexing3D(uhi.testing.indexing.Indexing3D[IRHistogram]):
+    @classmethod
+    def make_histogram(cls) -> IRHistogram:
+        return IRHistogram(cls.get_uhi())
+
+
+def test_getitem_sparse() -> None:
+    hist = uhi.testing.indexing.Indexing2D.get_uhi()
+    sparse = to_sparse(hist)
+    assert getitem(sparse, np.s_[1, ::sum]) == {"values": 25}
+    result: Any = getitem(sparse, np.s_[:2:sum, 1:3])
+    np.testing.assert_array_equal(result["storage"]["values"], [1, 5, 9, 30])
+
+
+def test_project() -> None:
+    h = bh.Histogram(
+        bh.axis.Regular(4, 0, 1),
+        bh.axis.Integer(0, 3),
+        bh.axis.Boolean(),
+        storage=bh.storage.Weight(),
+    )
+    rng = np.random.default_rng(1)
+    h.fill(rng.random(100), rng.integers(-1, 4, 100), rng.random(100) < 0.5)
+    hist = h._to_uhi_()
+    for axes in [(0,), (1, 0), (2, 0, 1)]:
+        result: Any = project(hist, *axes)
+        expected = h.project(*axes)._to_uhi_()
+        assert [a["type"] for a in result["axes"]] == [
+            a["type"] for a in expected["axes"]
+        ]
+        np.testing.assert_array_equal(
+            result["storage"]["values"], expected["storage"]["values"]
+        )
+        np.testing.assert_array_equal(
+            result["storage"]["variances"], expected["storage"]["variances"]
+        )
+
+    with pytest.raises(ValueError, match="Invalid axes"):
+        project(hist, 0, 0)
+
+
+def test_hdf5_reads_only_selection(tmp_path: Path) -> None:
+    h5py = pytest.importorskip("h5py")
+    hist = uhi.testing.indexing.Indexing3D.get_uhi()
+    with h5py.File(tmp_path / "hist.h5", "w") as f:
+        f["values"] = hist["storage"]["values"]
+        lazy: Any = {**hist, "storage": {"type": "double", "values": f["values"]}}
+        key = np.s_[1, loc(1.5) : loc(3.5), ::sum]
+        result: Any = compile_plan(hist, key).apply(lazy)
+        expected: Any = getitem(hist, key)
+    np.testing.assert_array_equal(
+        result["storage"]["values"], expected["storage"]["values"]
+    )
+
+
+@pytest.mark.parametrize(
+    ("step", "expected", "axis_type"),
+    [
+        # Bins left over by the groups go to the overflow bin
+        (rebin(groups=[2, 3]), [3, 2, 18, 71], "variable"),
+        # Bins outside the edges go to the flow bins
+        (rebin(edges=[0.1, 0.3, 0.8]), [3, 6, 50, 35], "variable"),
+        (rebin(edges=[0, 0.5, 1]), [3, 20, 70, 1], "regular"),
+    ],
+)
+def test_rebin_groups_edges(step: Any, expected: list[int], axis_type: str) -> None:
+    hist = make_1d()
+    result: Any = getitem(hist, np.s_[::step])
+    np.testing.assert_array_equal(result["storage"]["values"], expected)
+    assert result["axes"][0]["type"] == axis_type
+
+
+def test_rebin_groups_regular() -> None:
+    result: Any = getitem(make_1d(), np.s_[2 :: rebin(groups=[4, 4])])
+    assert result["axes"][0]["type"] == "regular"
+    assert result["axes"][0]["bins"] == 2
+    np.testing.assert_allclose(
+        [result["axes"][0]["lower"], result["axes"][0]["upper"]], [0.2, 1.0]
+    )
+
+
+@pytest.mark.parametrize("storage", ["Weight", "Mean", "WeightedMean"])
+def test_rebin_matches_filling(storage: str) -> None:
+    rng = np.random.default_rng(42)
+    n = 1000
+    x = rng.normal(0.5, 0.4, n)
+    kwargs: dict[str, Any] = {
+        "Weight": {"weight": rng.random(n)},
+        "Mean": {"sample": rng.random(n)},
+        "WeightedMean": {"sample": rng.random(n), "weight": rng.random(n)},
+    }[storage]
+
+    h = bh.Histogram(bh.axis.Regular(10, 0, 1), storage=getattr(bh.storage, storage)())
+    h.fill(x, **kwargs)
+    edges = [0, 0.1, 0.3, 0.6, 1]
+    expected = bh.Histogram(
+        bh.axis.Variable(edges), storage=getattr(bh.storage, storage)()
+    )
+    expected.fill(x, **kwargs)
+
+    for step in (rebin(groups=[1, 2, 3, 4]), rebin(edges=edges)):
+        result: Any = getitem(h, np.s_[::step])
+        np.testing.assert_allclose(result["axes"][0]["edges"], edges)
+        for k, v in expected._to_uhi_()["storage"].items():
+            if k != "type":
+                np.testing.assert_allclose(result["storage"][k], v, err_msg=k)
+
+
+def test_rebin_errors() -> None:
+    hist = make_1d()
+    with pytest.raises(ValueError, match="subset"):
+        getitem(hist, np.s_[:: rebin(edges=[0, 0.25, 1])])
+    with pytest.raises(ValueError, match="groups cover"):
+        getitem(hist, np.s_[5 :: rebin(groups=[3, 3])])
+    with pytest.raises(ValueError, match="start or stop"):
+        getitem(hist, np.s_[2 :: rebin(edges=[0.2, 1])])
+    with pytest.raises(ValueError, match="selects no bins"):
+        getitem(hist, np.s_[:: rebin(100)])
+    with pytest.raises(ValueError, match="selects no bins"):
+        getitem(hist, np.s_[8 :: rebin(3)])
+    categories: Any = {
+        "uhi_schema": 1,
+        "axes": [{"type": "category_int", "categories": [1, 2], "flow": False}],
+        "storage": {"type": "int", "values": np.array([1, 2])},
+    }
+    with pytest.raises(ValueError, match="Cannot rebin"):
+        getitem(categories, np.s_[:: rebin(groups=[2])])
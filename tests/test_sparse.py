@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 import json
+import math
 from pathlib import Path
+from typing import Any
 
 import numpy as np
 import pytest
 
 import uhi.io.json
-from uhi.io import from_sparse, to_sparse
+import uhi.schema
+from uhi.io import from_sparse, layout_cost, merge_sparse, to_sparse
 from uhi.typing.serialization import HistogramIR, WeightedStorageIR
 
 
@@ -114,3 +117,525 @@ def test_mean(resources: Path, name: str) -> None:
 
     assert len(sparse_hist["storage"]["values"]) == 2
     assert sparse_hist["storage"]["index"].shape == (1, 2)
+
+
+@pytest.mark.parametrize(
+    ("bins", "dtype"), [(3, np.uint8), (10, np.uint16), (60, np.uint32)]
+)
+def test_linear_roundtrip(bins: int, dtype: type[np.unsignedinteger]) -> None:
+    rng = np.random.default_rng(42)
+    axis = {
+        "type": "regular",
+        "bins": bins,
+        "underflow": True,
+        "overflow": True,
+        "lower": 0,
+        "upper": 1,
+        "circular": False,
+    }
+    shape = (bins + 2,) * 3
+    values = rng.integers(0, 2, shape) * rng.random(shape)
+    hist: dict[str, Any] = {
+        "uhi_schema": 1,
+        "axes": [axis] * 3,
+        "storage": {"type": "double", "values": values},
+    }
+
+    shist = to_sparse(hist, linear=True)
+    index = shist["storage"]["index"]
+    assert index.ndim == 1
+    assert index.dtype == dtype
+    assert len(index) == np.count_nonzero(values)
+    np.testing.assert_array_equal(
+        index, np.ravel_multi_index(to_sparse(hist)["storage"]["index"], shape)
+    )
+
+    dense = from_sparse(shist)
+    np.testing.assert_array_equal(dense["storage"]["values"], values)
+
+    # Round trip through JSON
+    data = json.dumps(shist, default=uhi.io.json.default)
+    rehist = json.loads(data, object_hook=uhi.io.json.object_hook)
+    uhi.schema.validate({"hist": json.loads(data)})
+    np.testing.assert_array_equal(from_sparse(rehist)["storage"]["values"], values)
+
+
+def test_linear_empty() -> None:
+    hist: dict[str, Any] = {
+        "uhi_schema": 1,
+        "axes": [{"type": "boolean"}],
+        "storage": {"type": "int", "values": np.zeros(2, dtype=int)},
+    }
+    shist = to_sparse(hist, linear=True)
+    assert shist["storage"]["index"].shape == (0,)
+    data = json.dumps({"hist": shist}, default=uhi.io.json.default)
+    uhi.schema.validate(json.loads(data))
+    np.testing.assert_array_equal(from_sparse(shist)["storage"]["values"], [0, 0])
+
+
+@pytest.mark.parametrize("linear", [False, True])
+@pytest.mark.parametrize("block_size", [1, 3, 100])
+def test_blocked(resources: Path, block_size: int, linear: bool) -> None:
+    data = resources.joinpath("valid/mean.json").read_text()
+    for hist in json.loads(data, object_hook=uhi.io.json.object_hook).values():
+        expected = to_sparse(hist, linear=linear)
+        blocked = to_sparse(hist, linear=linear, block_size=block_size)
+        assert expected["storage"].keys() == blocked["storage"].keys()
+        for key, value in expected["storage"].items():
+            if key == "type":
+                assert blocked["storage"][key] == value
+            else:
+                np.testing.assert_array_equal(blocked["storage"][key], value)
+                assert blocked["storage"][key].dtype == value.dtype
+
+
+def test_blocked_memmap(tmp_path: Path) -> None:
+    rng = np.random.default_rng(42)
+    shape = (40, 12, 7)
+    counts = np.lib.format.open_memmap(
+        tmp_path / "counts.npy", mode="w+", dtype=np.int64, shape=shape
+    )
+    counts[...] = rng.integers(0, 2, shape) * rng.integers(1, 10, shape)
+    hist: dict[str, Any] = {
+        "uhi_schema": 1,
+        "axes": [
+            {"type": "category_int", "categories": list(range(40)), "flow": False},
+            {"type": "category_int", "categories": list(range(11)), "flow": True},
+            {"type": "category_str", "categories": list("abcdef"), "flow": True},
+        ],
+        "storage": {"type": "int", "values": counts},
+    }
+
+    for block_size in (None, 7):
+        shist = to_sparse(hist, block_size=block_size)
+        assert shist["storage"]["index"].shape == (3, np.count_nonzero(counts))
+        dense = from_sparse(shist)
+        np.testing.assert_array_equal(dense["storage"]["values"], counts)
+
+    with pytest.raises(ValueError, match="block_size"):
+        to_sparse(hist, block_size=0)
+
+
+def _weighted_hist(fraction: float) -> dict[str, Any]:
+    rng = np.random.default_rng(42)
+    shape = (30, 20)
+    values = rng.random(shape) * (rng.random(shape) < fraction)
+    return {
+        "uhi_schema": 1,
+        "axes": [
+            {"type": "category_int", "categories": list(range(30)), "flow": False},
+            {"type": "category_int", "categories": list(range(20)), "flow": False},
+        ],
+        "storage": {"type": "weighted", "values": values, "variances": values**2},
+    }
+
+
+@pytest.mark.parametrize("fraction", [0.0, 0.05, 0.5, 1.0])
+def test_layout_cost(fraction: float) -> None:
+    hist = _weighted_hist(fraction)
+    nnz = np.count_nonzero(hist["storage"]["values"])
+
+    for h in (hist, to_sparse(hist), to_sparse(hist, linear=True)):
+        cost = layout_cost(h)
+        assert cost["nnz"] == nnz
+        assert cost["dense"] == {"values": 4800, "variances": 4800}
+        # Plain ints, so the costs can be written as JSON
+        assert type(cost["nnz"]) is int
+        for sizes in (cost["dense"], cost["sparse"], cost["index"]):
+            assert all(type(v) is int for v in sizes.values())
+        json.dumps(cost)
+
+        # The reported sizes match the actual arrays
+        for linear, encoding in ((False, "2d"), (True, "linear")):
+            storage = to_sparse(hist, linear=linear)["storage"]
+            assert cost["index"][encoding] == storage["index"].nbytes
+            assert cost["sparse"] == {
+                "values": storage["values"].nbytes,
+                "variances": storage["variances"].nbytes,
+            }
+
+    # 600 bins: 8 bytes per field when dense, 18 when sparse with a 2-byte index
+    expected = "linear" if nnz * 18 < 600 * 16 else "dense"
+    assert layout_cost(hist)["best"] == expected
+
+
+def test_layout_cost_scalar() -> None:
+    hist: dict[str, Any] = {
+        "uhi_schema": 1,
+        "axes": [],
+        "storage": {"type": "double", "values": np.float64(3)},
+    }
+    cost = layout_cost(hist)
+    assert cost["best"] == "dense"
+    assert cost["dense"] == {"values": 8}
+    assert type(cost["nnz"]) is int
+    assert type(cost["dense"]["values"]) is int
+    assert cost["sparse"] == {}
+
+
+@pytest.mark.parametrize("linear", [False, True])
+def test_to_sparse_min_savings(linear: bool) -> None:
+    sparse_hist = _weighted_hist(0.05)
+    full_hist = _weighted_hist(0.95)
+
+    assert "index" in to_sparse(sparse_hist, linear=linear, min_savings=0.5)["storage"]
+    assert to_sparse(full_hist, linear=linear, min_savings=0.0) is full_hist
+    assert to_sparse(full_hist, linear=linear, min_savings=-1.0) is not full_hist
+    assert "index" in to_sparse(full_hist, linear=linear)["storage"]
+
+
+@pytest.mark.parametrize("linear", [False, True])
+@pytest.mark.parametrize(
+    "storage", ["Int64", "Double", "Weight", "Mean", "WeightedMean"]
+)
+def test_merge_sparse(storage: str, linear: bool) -> None:
+    import boost_histogram as bh
+
+    rng = np.random.default_rng(42)
+    hists = []
+    for _ in range(3):
+        h = bh.Histogram(
+            bh.axis.Regular(20, 0, 1),
+            bh.axis.Integer(0, 4),
+            storage=getattr(bh.storage, storage)(),
+        )
+        kwargs: dict[str, Any] = {}
+        if storage in {"Weight", "WeightedMean"}:
+            kwargs["weight"] = rng.random(30)
+        if storage in {"Mean", "WeightedMean"}:
+            kwargs["sample"] = rng.normal(size=30)
+        h.fill(rng.random(30), rng.integers(-1, 5, 30), **kwargs)
+        hists.append(h)
+
+    sparse_hists = [to_sparse(h._to_uhi_(), linear=linear) for h in hists]
+    merged = merge_sparse(*sparse_hists)
+    assert np.ndim(merged["storage"]["index"]) == (1 if linear else 2)
+
+    expected = sum(hists[1:], start=hists[0])._to_uhi_()
+    dense = from_sparse(merged)
+    for key, value in expected["storage"].items():
+        if key == "type":
+            assert dense["storage"][key] == value
+        else:
+            # Variances of single entries are undefined (NaN or +-inf)
+            np.testing.assert_allclose(
+                np.where(
+                    np.isfinite(dense["storage"][key]), dense["storage"][key], np.nan
+                ),
+                np.where(np.isfinite(value), value, np.nan),
+                atol=1e-12,
+            )
+
+    # Dense inputs and the other index format work too
+    mixed = merge_sparse(hists[0]._to_uhi_(), *sparse_hists[1:], linear=not linear)
+    assert np.ndim(mixed["storage"]["index"]) == (2 if linear else 1)
+    np.testing.assert_allclose(
+        from_sparse(mixed)["storage"]["values"], expected["storage"]["values"]
+    )
+
+
+def test_merge_sparse_errors() -> None:
+    axis = {
+        "type": "regular",
+        "bins": 3,
+        "underflow": False,
+        "overflow": False,
+        "lower": 0,
+        "upper": 1,
+        "circular": False,
+    }
+    h1: dict[str, Any] = {
+        "uhi_schema": 1,
+        "axes": [axis],
+        "storage": {"type": "int", "values": np.array([1, 0, 2])},
+    }
+    h2: dict[str, Any] = {
+        "uhi_schema": 1,
+        "axes": [{**axis, "bins": 4}],
+        "storage": {"type": "int", "values": np.array([1, 0, 2, 0])},
+    }
+    with pytest.raises(ValueError, match="shapes"):
+        merge_sparse(h1, h2)
+    with pytest.raises(ValueError, match="Storage types"):
+        merge_sparse(h1, {**h1, "storage": {"type": "double", "values": np.ones(3)}})
+
+    merged = merge_sparse(h1, h1, {**h1, "storage": {"type": "int"}})
+    assert merged["storage"]["index"].tolist() == [[0, 2]]
+    assert merged["storage"]["values"].tolist() == [2, 4]
+    assert merged["storage"]["values"].dtype == h1["storage"]["values"].dtype
+
+
+@pytest.mark.parametrize("linear", [False, True])
+def test_from_sparse_out(tmp_path: Path, linear: bool) -> None:
+    import boost_histogram as bh
+
+    rng = np.random.default_rng(42)
+    hists = []
+    for _ in range(3):
+        h = bh.Histogram(
+            bh.axis.Regular(10, 0, 1),
+            bh.axis.Integer(0, 3),
+            storage=bh.storage.WeightedMean(),
+        )
+        h.fill(
+            rng.random(20),
+            rng.integers(0, 3, 20),
+            weight=rng.random(20),
+            sample=rng.random(20),
+        )
+        hists.append(h)
+    sparse_hists = [to_sparse(h._to_uhi_(), linear=linear) for h in hists]
+
+    out = {
+        k: np.lib.format.open_memmap(
+            tmp_path / f"{k}.npy", mode="w+", dtype=np.float64, shape=(12, 5)
+        )
+        for k in ("sum_of_weights", "sum_of_weights_squared", "values", "variances")
+    }
+    out["values"][...] = 42.0
+
+    dense = from_sparse(sparse_hists[0], out=out)
+    assert dense["storage"]["values"] is out["values"]
+    expected = hists[0]._to_uhi_()["storage"]
+    np.testing.assert_allclose(out["values"], expected["values"])
+    np.testing.assert_array_equal(
+        np.isnan(out["variances"]), np.isnan(expected["variances"])
+    )
+
+    for shist in sparse_hists[1:]:
+        from_sparse(shist, out=out, accumulate=True)
+    merged = from_sparse(merge_sparse(*sparse_hists))
+    for key, arr in out.items():
+        np.testing.assert_allclose(arr, merged["storage"][key])
+
+    # Dense input
+    from_sparse(merged, out=out, accumulate=True)
+    np.testing.assert_allclose(
+        out["sum_of_weights"], 2 * merged["storage"]["sum_of_weights"]
+    )
+    np.testing.assert_allclose(out["values"], merged["storage"]["values"])
+
+
+def test_from_sparse_out_errors() -> None:
+    hist: dict[str, Any] = {
+        "uhi_schema": 1,
+        "axes": [{"type": "boolean"}],
+        "storage": {"type": "int", "index": np.array([[1]]), "values": np.array([3])},
+    }
+    out = {"values": np.ones(2, dtype=int)}
+    from_sparse(hist, out=out, accumulate=True)
+    assert out["values"].tolist() == [1, 4]
+    from_sparse(hist, out=out)
+    assert out["values"].tolist() == [0, 3]
+
+    with pytest.raises(ValueError, match="requires out"):
+        from_sparse(hist, accumulate=True)
+    with pytest.raises(ValueError, match="keys"):
+        from_sparse(hist, out={"variances": np.ones(2)})
+    with pytest.raises(ValueError, match="shape"):
+        from_sparse(hist, out={"values": np.ones(3)})
+
+
+def _view_histograms(storage: str) -> Any:
+    import boost_histogram as bh
+
+    rng = np.random.default_rng(7)
+    h = bh.Histogram(
+        bh.axis.Regular(8, 0, 1),
+        bh.axis.Variable([0, 1, 3, 6], underflow=False),
+        bh.axis.StrCategory(["a", "b"], growth=True),
+        storage=getattr(bh.storage, storage)(),
+    )
+    kwargs: dict[str, Any] = {}
+    if storage in {"Weight", "WeightedMean"}:
+        kwargs["weight"] = rng.random(200)
+    if storage in {"Mean", "WeightedMean"}:
+        kwargs["sample"] = rng.normal(size=200)
+    h.fill(
+        rng.random(200) * 1.2 - 0.1,
+        rng.random(200) * 7,
+        rng.choice(["a", "b", "c"], 200),
+        **kwargs,
+    )
+    return h
+
+
+def _assert_fields(actual: Any, expected: Any) -> None:
+    for key, value in actual.items():
+        np.testing.assert_allclose(
+            value if np.isfinite(value) else np.nan,
+            expected[key] if np.isfinite(expected[key]) else np.nan,
+            atol=1e-12,
+        )
+
+
+@pytest.mark.parametrize("storage", ["Int64", "Weight", "Mean", "WeightedMean"])
+def test_sparse_view_lookup(storage: str) -> None:
+    import uhi.tag
+    from uhi.sparse import SparseView
+
+    h = _view_histograms(storage)
+    dense = h._to_uhi_()["storage"]
+    view = SparseView(h)
+    assert view.shape == (10, 4, 3)
+    assert view.nnz < math.prod(view.shape)
+
+    fields = [k for k in dense if k != "type"]
+    for i, j, k in np.ndindex(8, 3, 3):
+        _assert_fields(view[i, j, k], {f: dense[f][i + 1, j, k] for f in fields})
+
+    bin_value = view[uhi.tag.underflow, -1, -1]
+    _assert_fields(bin_value, {f: dense[f][0, 2, 2] for f in fields})
+    bin_value = view[uhi.tag.loc(0.3), uhi.tag.loc(4.5), uhi.tag.loc("c")]
+    _assert_fields(bin_value, {f: dense[f][3, 2, 2] for f in fields})
+    bin_value = view[{2: uhi.tag.loc("b"), 0: uhi.tag.overflow, 1: 0}]
+    _assert_fields(bin_value, {f: dense[f][9, 0, 1] for f in fields})
+
+
+@pytest.mark.parametrize("storage", ["Int64", "Weight", "Mean", "WeightedMean"])
+def test_sparse_view_sums(storage: str) -> None:
+    import boost_histogram as bh
+
+    import uhi.tag
+    from uhi.sparse import SparseView
+
+    h = _view_histograms(storage)
+    view = SparseView(h)
+    fields = [k for k in h._to_uhi_()["storage"] if k != "type"]
+
+    def check(result: Any, expected: Any) -> None:
+        if isinstance(result, SparseView):
+            data = json.dumps(result.to_ir(), default=uhi.io.json.default)
+            uhi.schema.validate({"hist": json.loads(data)})
+            result = from_sparse(result.to_ir())["storage"]
+            expected_storage = expected._to_uhi_()["storage"]
+            for key in fields:
+                np.testing.assert_allclose(
+                    np.where(np.isfinite(result[key]), result[key], np.nan),
+                    np.where(
+                        np.isfinite(expected_storage[key]),
+                        expected_storage[key],
+                        np.nan,
+                    ),
+                    atol=1e-12,
+                )
+        elif storage == "Int64":
+            _assert_fields(result, {"values": expected})
+        else:
+            names = {"values": "value", "variances": "variance", "counts": "count"}
+            _assert_fields(
+                result, {k: getattr(expected, names.get(k, k)) for k in fields}
+            )
+
+    check(view[2:5:sum, 1, uhi.tag.loc("a")], h[2:5:sum, 1, bh.loc("a")])
+    check(view[::sum, ::sum, ::sum], h[::sum, ::sum, ::sum])
+    check(view[:, ::sum, 0], h[:, ::sum, 0])
+    check(view[3, ...], h[3, ...])
+    check(view[:, 1:len:sum, :], h[:, 1:len:sum, :])
+    check(view[uhi.tag.loc(0.5) :: sum, :, ::sum], h[bh.loc(0.5) :: sum, :, ::sum])
+
+    # Views of views
+    sub = view[:, :, 1]
+    assert isinstance(sub, SparseView)
+    check(sub[::sum, :], h[::sum, :, 1])
+
+
+def test_sparse_view_roundtrip() -> None:
+    from uhi.sparse import SparseView
+
+    h = _view_histograms("Weight")
+    view = SparseView(to_sparse(h._to_uhi_()))
+    for linear in (False, True):
+        ir = view.to_ir(linear=linear)
+        assert np.ndim(ir["storage"]["index"]) == (1 if linear else 2)
+        np.testing.assert_array_equal(
+            from_sparse(ir)["storage"]["values"], h.view(flow=True).value
+        )
+
+
+def test_sparse_view_errors() -> None:
+    import uhi.tag
+    from uhi.sparse import SparseView
+
+    view = SparseView(_view_histograms("Double"))
+    with pytest.raises(IndexError):
+        view[8, 0, 0]
+    with pytest.raises(IndexError):
+        view[0, 0, 0, 0]
+    with pytest.raises(IndexError):
+        view[0, uhi.tag.underflow, 0]
+    with pytest.raises(IndexError):
+        view[..., 0, ...]
+    with pytest.raises(NotImplementedError):
+        view[2:5, 0, 0]
+
+
+@pytest.mark.parametrize("tile_shape", [(1, 1, 1), (4, 2, 3), (10, 5, 3)])
+@pytest.mark.parametrize("storage", ["Int64", "Weight", "WeightedMean"])
+def test_tiled_roundtrip(storage: str, tile_shape: tuple[int, ...]) -> None:
+    from uhi.sparse import from_tiled, to_tiled
+
+    hist = _view_histograms(storage)._to_uhi_()
+    fields = [k for k in hist["storage"] if k != "type"]
+
+    for source in (hist, to_sparse(hist), to_sparse(hist, linear=True)):
+        tiled = to_tiled(source, tile_shape)
+        tiles = tiled["storage"]["tiles"]
+        assert tiles.shape[0] == 3
+        for key in fields:
+            assert tiled["storage"][key].shape == (tiles.shape[1], *tile_shape)
+        # Tiles are sorted in C order
+        grid = [-(-n // t) for n, t in zip((10, 4, 3), tile_shape, strict=True)]
+        flat = np.ravel_multi_index(tuple(tiles), grid)
+        assert np.all(np.diff(flat) > 0)
+
+        dense: Any = from_tiled(tiled)["storage"]
+        for key in fields:
+            np.testing.assert_array_equal(dense[key], hist["storage"][key])
+
+        for linear in (False, True):
+            sparse = from_tiled(tiled, sparse=True, linear=linear)
+            assert np.ndim(sparse["storage"]["index"]) == (1 if linear else 2)
+            restored: Any = from_sparse(sparse)["storage"]
+            for key in fields:
+                np.testing.assert_array_equal(restored[key], hist["storage"][key])
+
+    # One-bin tiles are the same as a sparse histogram
+    if tile_shape == (1, 1, 1):
+        nnz = to_sparse(hist)["storage"]["index"].shape[1]
+        assert to_tiled(hist, tile_shape)["storage"]["tiles"].shape == (3, nnz)
+
+
+def test_tiled_clustered() -> None:
+    from uhi.sparse import from_tiled, to_tiled
+
+    values = np.zeros((64, 64))
+    values[8:16, 40:48] = 1.0
+    values[50:54, 0:8] = 2.0
+    axis = {"type": "category_int", "categories": list(range(64)), "flow": False}
+    hist: dict[str, Any] = {
+        "uhi_schema": 1,
+        "axes": [axis, axis],
+        "storage": {"type": "double", "values": values},
+    }
+
+    tiled = to_tiled(hist, (8, 8))
+    np.testing.assert_array_equal(tiled["storage"]["tiles"], [[1, 6], [5, 0]])
+    assert (
+        tiled["storage"]["values"].nbytes < to_sparse(hist)["storage"]["index"].nbytes
+    )
+    np.testing.assert_array_equal(from_tiled(tiled)["storage"]["values"], values)
+
+    # Scalar, empty, and non-tiled histograms pass through
+    assert from_tiled(hist) is hist
+    empty: dict[str, Any] = {
+        "uhi_schema": 1,
+        "axes": [axis],
+        "storage": {"type": "int"},
+    }
+    assert to_tiled(empty, (8,)) is empty
+
+    with pytest.raises(ValueError, match="tile_shape"):
+        to_tiled(hist, (8,))
+    with pytest.raises(ValueError, match="tile_shape"):
+        to_tiled(hist, (8, 0))
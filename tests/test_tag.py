@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+import pytest
+
+from uhi.tag import at, loc, overflow, rebin, underflow
+
+
+class ScalarAxis:
+    """
+    An axis that only supports looking up one value at a time.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __len__(self) -> int:
+        return 10
+
+    def index(self, value: Any) -> int:
+        self.calls += 1
+        if isinstance(value, np.ndarray):
+            msg = "only scalars are supported"
+            raise TypeError(msg)
+        return min(max(int(value * 10), -1), 10)
+
+
+def test_loc_scalar() -> None:
+    import boost_histogram as bh
+
+    axis: Any = bh.axis.Regular(10, 0, 1)
+    assert loc(0.55)(axis) == 5
+    assert (loc(0.55) + 2)(axis) == 7
+    assert (loc(0.55) - 2)(axis) == 3
+    assert underflow(axis) == -1
+    assert overflow(axis) == 10
+    assert at(3)(axis) == 3
+
+
+def test_loc_array() -> None:
+    import boost_histogram as bh
+
+    axis = bh.axis.Regular(10, 0, 1)
+    values = np.array([[0.05, 0.55], [-1.0, 2.0]])
+    np.testing.assert_array_equal(loc(values)(axis), [[0, 5], [-1, 10]])
+    np.testing.assert_array_equal((loc(values) + 1)(axis), [[1, 6], [0, 11]])
+    np.testing.assert_array_equal(loc([0.05, 0.95])(axis), [0, 9])
+
+    categories = bh.axis.StrCategory(["a", "b", "c"])
+    np.testing.assert_array_equal(loc(["c", "a"])(categories), [2, 0])
+    with pytest.raises(KeyError):
+        loc(["a", "z"])(categories)
+
+
+def test_loc_array_fallback() -> None:
+    axis = ScalarAxis()
+    result = loc(np.array([0.05, 0.55, 2.0]))(axis)
+    assert isinstance(result, np.ndarray)
+    np.testing.assert_array_equal(result, [0, 5, 10])
+    # One failed vectorized call, then one call per value
+    assert axis.calls == 4
+
+
+def test_at_array() -> None:
+    axis: Any = ScalarAxis()
+    result = at([1, 3])(axis)
+    assert isinstance(result, np.ndarray)
+    assert result.dtype == np.intp
+    np.testing.assert_array_equal(result, [1, 3])
+
+
+def test_rebin() -> None:
+    assert rebin(2).factor == 2
+    assert repr(rebin(2)) == "rebin(2)"
+    groups = rebin(groups=[1, 2])
+    assert groups.factor is None
+    assert groups.groups is not None
+    np.testing.assert_array_equal(groups.groups, [1, 2])
+    assert repr(rebin(edges=[0, 0.5, 2])) == "rebin(edges=[0.0, 0.5, 2.0])"
+
+    with pytest.raises(ValueError, match="Exactly one"):
+        rebin()
+    with pytest.raises(ValueError, match="Exactly one"):
+        rebin(2, groups=[2])
+    with pytest.raises(ValueError, match="positive"):
+        rebin(groups=[1, 0])
+    with pytest.raises(ValueError, match="non-empty"):
+        rebin(groups=[])
+    with pytest.raises(ValueError, match="increasing"):
+        rebin(edges=[0, 2, 1])
+
+
+@pytest.mark.parametrize(
+    ("kwargs", "expected"),
+    [
+        ({"groups": [2, 3, 5]}, [2, 3, 5]),
+        ({"edges": [0, 0.2, 0.5, 1]}, [2, 3, 5]),
+        ({"factor": 3}, [3, 3, 3]),
+    ],
+)
+def test_rebin_boost_histogram(kwargs: dict[str, Any], expected: list[int]) -> None:
+    bh = pytest.importorskip("boost_histogram")
+    hist = bh.Histogram(bh.axis.Regular(10, 0, 1))
+    hist.fill(np.random.default_rng(42).uniform(-0.1, 1.1, 1000))
+    step = rebin(**kwargs)
+    assert step.group_mapping(hist.axes[0]) == expected
+    assert step.axis_mapping(hist.axes[0]) == (expected, None)
+
+    result = hist[:: rebin(**kwargs)]
+    reference = hist[:: bh.tag.rebin(**kwargs)]
+    assert result.axes[0] == reference.axes[0]
+    np.testing.assert_array_equal(result.view(flow=True), reference.view(flow=True))
+
+
+def test_rebin_group_mapping_errors() -> None:
+    bh = pytest.importorskip("boost_histogram")
+    axis = bh.axis.Variable([0, 1, 3, 4, 7])
+    assert rebin(edges=[0, 3, 7]).group_mapping(axis) == [2, 2]
+    with pytest.raises(ValueError, match="sum of the groups"):
+        rebin(groups=[1, 2]).group_mapping(axis)
+    with pytest.raises(ValueError, match="start at first bin"):
+        rebin(edges=[1, 3, 7]).group_mapping(axis)
+    with pytest.raises(ValueError, match="end at last bin"):
+        rebin(edges=[0, 3, 4]).group_mapping(axis)
+    with pytest.raises(ValueError, match=r"Edge\(s\) 2.0 not found"):
+        rebin(edges=[0, 2, 7]).group_mapping(axis)